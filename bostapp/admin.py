@@ -1,3 +1,31 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import FetchRun, OrderRecord, OrderSummary, ReportJob
+
+
+@admin.register(OrderRecord)
+class OrderRecordAdmin(admin.ModelAdmin):
+    list_display = ('order_number', 'order_date', 'product', 'volume', 'price', 'brv_number', 'bdc', 'depot')
+    list_filter = ('depot', 'product', 'order_date')
+    search_fields = ('order_number', 'brv_number', 'bdc')
+    date_hierarchy = 'order_date'
+
+
+@admin.register(OrderSummary)
+class OrderSummaryAdmin(admin.ModelAdmin):
+    list_display = ('depot', 'order_date', 'product', 'bdc', 'volume', 'orders')
+    list_filter = ('depot', 'product', 'order_date')
+    search_fields = ('bdc',)
+    date_hierarchy = 'order_date'
+
+
+@admin.register(FetchRun)
+class FetchRunAdmin(admin.ModelAdmin):
+    list_display = ('started_at', 'succeeded', 'fetch_seconds', 'process_seconds', 'rows_in', 'rows_out')
+    list_filter = ('succeeded',)
+
+
+@admin.register(ReportJob)
+class ReportJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'format', 'depot', 'start_date', 'end_date', 'status', 'progress', 'created_at', 'finished_at')
+    list_filter = ('status', 'format', 'depot')
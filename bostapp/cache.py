@@ -0,0 +1,310 @@
+import asyncio
+from collections import OrderedDict
+import contextvars
+import hashlib
+import logging
+import os
+import threading
+import time
+import weakref
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# How long a content fingerprint's first-seen time is remembered, for Last-Modified
+FIRST_SEEN_TTL = 7 * 24 * 3600
+# Part of every report key; bump when the cached PreparedReport changes shape or keys
+REPORT_KEY_VERSION = 5
+
+
+class _Flight:
+    """A fetch in progress that other threads can wait on"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+
+
+class ReportCache:
+    """Caches processed reports and collapses concurrent misses into one fetch"""
+
+    def __init__(self, alias='default', meta_alias='meta', ttl=None, lock_timeout=None, poll_interval=0.25):
+        self.alias = alias
+        # First-seen times are many small keys; kept apart so they never cull reports
+        self.meta_alias = meta_alias
+        self._ttl = ttl
+        self._lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+        self._flights = {}
+        self._flights_lock = threading.Lock()
+        # Event loop -> {key: future}; only touched from the loop's own thread
+        self._async_flights = weakref.WeakKeyDictionary()
+        # Background refreshes started while a last good copy was served
+        self.refreshes = set()
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @property
+    def meta_cache(self):
+        return caches[self.meta_alias]
+
+    @property
+    def ttl(self):
+        return self._ttl if self._ttl is not None else settings.REPORT_CACHE_TTL
+
+    @property
+    def stale_ttl(self):
+        return settings.REPORT_STALE_TTL
+
+    @property
+    def lock_timeout(self):
+        # Long enough to cover one upstream round trip plus parsing
+        if self._lock_timeout is not None:
+            return self._lock_timeout
+        return settings.REQUEST_TIMEOUT * 2
+
+    def make_key(self, *parts):
+        """Build a cache key that is safe for every cache backend"""
+        digest = hashlib.sha1('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+        return f"bost:report:v{REPORT_KEY_VERSION}:{digest}"
+
+    def last_good_key(self, key):
+        return f"{key}:last-good"
+
+    def get_or_load(self, key, loader, last_good_key=None):
+        """Return (value, error) for key, calling loader at most once per key at a time
+
+        loader must return a (value, error) tuple; only error-free values are
+        cached, together with a long-lived last good copy for aget_or_stale.
+        """
+        value = self.cache.get(key)
+        if value is not None:
+            metrics.observe_cache('hit')
+            return value, None
+
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            # Another thread in this worker is already fetching this report
+            metrics.observe_cache('shared')
+            if flight.event.wait(self.lock_timeout) and flight.result is not None:
+                return flight.result
+            logger.warning(f"Timed out waiting for in-flight report {key}")
+            return None, "Timed out waiting for report"
+
+        try:
+            flight.result = self._load_shared(key, loader, last_good_key)
+            return flight.result
+        finally:
+            with self._flights_lock:
+                self._flights.pop(key, None)
+            flight.event.set()
+
+    def _load_shared(self, key, loader, last_good_key):
+        """Load key while holding a cache-wide lock so other workers wait too
+
+        The lock is cache.add(), which is only atomic on some backends; on
+        FileBasedCache two workers can both take it and fetch the same
+        report, so it saves upstream calls rather than guaranteeing one.
+        """
+        lock_key = f"{key}:lock"
+        deadline = time.monotonic() + self.lock_timeout
+        while True:
+            if self.cache.add(lock_key, os.getpid(), self.lock_timeout):
+                try:
+                    # Another worker may have filled the key while we waited
+                    value = self.cache.get(key)
+                    if value is not None:
+                        metrics.observe_cache('shared')
+                        return value, None
+                    metrics.observe_cache('miss')
+                    value, error = loader()
+                    if error is None:
+                        self._store(key, value, self.ttl, last_good_key)
+                    return value, error
+                finally:
+                    self.cache.delete(lock_key)
+
+            time.sleep(self.poll_interval)
+            value = self.cache.get(key)
+            if value is not None:
+                metrics.observe_cache('shared')
+                return value, None
+            if time.monotonic() >= deadline:
+                logger.warning(f"Report lock {lock_key} held too long, fetching directly")
+                metrics.observe_cache('miss')
+                return loader()
+
+    async def aget_or_load(self, key, loader, last_good_key=None):
+        """Async get_or_load; loader is a coroutine function returning (value, error)"""
+        value = await self.cache.aget(key)
+        if value is not None:
+            metrics.observe_cache('hit')
+            return value, None
+
+        loop = asyncio.get_running_loop()
+        flights = self._async_flights.setdefault(loop, {})
+        flight = flights.get(key)
+        if flight is not None:
+            metrics.observe_cache('shared')
+            try:
+                return await asyncio.wait_for(asyncio.shield(flight), self.lock_timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Timed out waiting for in-flight report {key}")
+                return None, "Timed out waiting for report"
+
+        flight = flights[key] = loop.create_future()
+        try:
+            result = await self._aload_shared(key, loader, last_good_key)
+            flight.set_result(result)
+            return result
+        finally:
+            flights.pop(key, None)
+            if not flight.done():
+                flight.set_result((None, "Report load failed"))
+
+    async def _aload_shared(self, key, loader, last_good_key):
+        """Async _load_shared, polling the cache-wide lock without blocking the loop; best-effort likewise"""
+        lock_key = f"{key}:lock"
+        deadline = time.monotonic() + self.lock_timeout
+        while True:
+            if await self.cache.aadd(lock_key, os.getpid(), self.lock_timeout):
+                try:
+                    value = await self.cache.aget(key)
+                    if value is not None:
+                        metrics.observe_cache('shared')
+                        return value, None
+                    metrics.observe_cache('miss')
+                    value, error = await loader()
+                    if error is None:
+                        await self._astore(key, value, self.ttl, last_good_key)
+                    return value, error
+                finally:
+                    await self.cache.adelete(lock_key)
+
+            await asyncio.sleep(self.poll_interval)
+            value = await self.cache.aget(key)
+            if value is not None:
+                metrics.observe_cache('shared')
+                return value, None
+            if time.monotonic() >= deadline:
+                logger.warning(f"Report lock {lock_key} held too long, fetching directly")
+                metrics.observe_cache('miss')
+                return await loader()
+
+    async def aget_or_stale(self, key, loader, last_good_key=None):
+        """Return (value, error, age), serving the last good value while it is refreshed
+
+        A cached value comes back with age 0. On a miss the last good copy is
+        returned with its age in seconds and loader runs as a task on the
+        current event loop; only when there is no such copy does this wait
+        like aget_or_load.
+        """
+        value = await self.cache.aget(key)
+        if value is not None:
+            metrics.observe_cache('hit')
+            return value, None, 0
+        last_good = await self.cache.aget(last_good_key or self.last_good_key(key))
+        if last_good is None:
+            return (*await self.aget_or_load(key, loader, last_good_key), 0)
+
+        loop = asyncio.get_running_loop()
+        if key not in self._async_flights.get(loop, {}):
+            # A fresh context, so the refresh is not timed as part of this request
+            refresh = contextvars.Context().run(loop.create_task, self.aget_or_load(key, loader, last_good_key))
+            self.refreshes.add(refresh)
+            refresh.add_done_callback(self.refreshes.discard)
+        value, loaded_at = last_good
+        metrics.observe_cache('stale')
+        return value, None, max(time.time() - loaded_at, 0)
+
+    def loaded_at_key(self, last_good_key):
+        # The load time on its own, so reading an age does not unpickle the report
+        return f"{last_good_key}:at"
+
+    def _store(self, key, value, ttl, last_good_key=None):
+        last_good_key = last_good_key or self.last_good_key(key)
+        now = time.time()
+        self.cache.set(key, value, ttl)
+        self.cache.set(last_good_key, (value, now), self.stale_ttl)
+        self.cache.set(self.loaded_at_key(last_good_key), now, self.stale_ttl)
+
+    async def _astore(self, key, value, ttl, last_good_key=None):
+        last_good_key = last_good_key or self.last_good_key(key)
+        now = time.time()
+        await self.cache.aset(key, value, ttl)
+        await self.cache.aset(last_good_key, (value, now), self.stale_ttl)
+        await self.cache.aset(self.loaded_at_key(last_good_key), now, self.stale_ttl)
+
+    def put(self, key, value, ttl=None, last_good_key=None):
+        """Store a freshly loaded value, e.g. from the prefetch worker"""
+        self._store(key, value, self.ttl if ttl is None else ttl, last_good_key)
+
+    def age(self, last_good_key):
+        """Seconds since the last good value under last_good_key was loaded, or None"""
+        loaded_at = self.cache.get(self.loaded_at_key(last_good_key))
+        return None if loaded_at is None else max(time.time() - loaded_at, 0)
+
+    def invalidate(self, key):
+        self.cache.delete(key)
+
+    async def afirst_seen(self, fingerprint):
+        """Unix time the given content fingerprint was first seen by any worker"""
+        key = f"bost:seen:{fingerprint}"
+        now = int(time.time())
+        # add() keeps the earliest time; the entry outlives any report that matches it
+        await self.meta_cache.aadd(key, now, FIRST_SEEN_TTL)
+        return await self.meta_cache.aget(key) or now
+
+
+class ArtifactCache:
+    """In-process LRU of rendered report bytes, bounded by their total size"""
+
+    def __init__(self, max_bytes=None):
+        self._max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @property
+    def max_bytes(self):
+        return self._max_bytes if self._max_bytes is not None else settings.ARTIFACT_CACHE_MAX_BYTES
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._items.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._items[key] = value
+            self._size += len(value)
+            while self._size > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self._size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._size = 0
+
+
+report_cache = ReportCache()
+artifact_cache = ArtifactCache()
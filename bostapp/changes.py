@@ -0,0 +1,174 @@
+"""Feed of the orders that are new, changed or removed at each report refresh
+
+When the latest report is refreshed, each depot's orders are reduced to
+ORDER NUMBER -> row fingerprint and compared with the fingerprints kept
+from the previous refresh. The comparison is a vectorized hash join, and
+only the orders that differ are turned into an event.
+
+A refresh that brings the same report back, the common case between
+NPA updates, is recognised from the report version recorded with the
+feed and costs a cache read; nothing is hashed. NPA only sends whole
+reports, so a refresh that did change still hashes each of the depot's
+rows once, off the request path.
+
+Events carry a sequence number; clients ask for the events after the
+last one they saw, through /api/changes/ or as server-sent events from
+/api/changes/stream/, instead of polling the whole report.
+"""
+import os
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+import numpy as np
+import pandas as pd
+
+# Part of every feed key; bump when the stored fingerprints or events change shape
+FEED_KEY_VERSION = 1
+# Longest a worker may hold a depot's feed while recording one refresh
+RECORD_LOCK_TIMEOUT = 60
+
+
+def row_fingerprints(rows):
+    """uint64 hash of each row of an OrderIndex rows array"""
+    # Number columns hash as floats, much faster than as Python objects
+    return pd.util.hash_pandas_object(pd.DataFrame(rows).infer_objects(), index=False).to_numpy()
+
+
+def diff_fingerprints(previous, current):
+    """(new, changed, removed) order numbers between two fingerprint Series"""
+    found = previous.index.get_indexer(current.index)
+    new = found < 0
+    changed = np.zeros(len(current), dtype=bool)
+    changed[~new] = previous.to_numpy()[found[~new]] != current.to_numpy()[~new]
+    removed = current.index.get_indexer(previous.index) < 0
+    return current.index[new], current.index[changed], previous.index[removed]
+
+
+def events_since(feed, since):
+    """(events, reset) of a feed after sequence number since
+
+    reset means events the client has not seen are no longer kept (or the
+    feed restarted), so it should reload the full report instead.
+    """
+    events = [event for event in feed['events'] if event['seq'] > since]
+    oldest = feed['events'][0]['seq'] if feed['events'] else feed['seq'] + 1
+    return events, since > feed['seq'] or since < oldest - 1
+
+
+class ChangeFeed:
+    """Per-depot fingerprints of the last refresh and the most recent change events"""
+
+    def __init__(self, alias='meta', max_events=None):
+        self.alias = alias
+        self._max_events = max_events
+        # Depot -> when this worker last asked for a refresh on the feed's behalf
+        self._checked = {}
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @property
+    def max_events(self):
+        return self._max_events if self._max_events is not None else settings.CHANGE_FEED_EVENTS
+
+    @property
+    def ttl(self):
+        return settings.REPORT_STALE_TTL
+
+    def key(self, depot, part):
+        # Depot names can hold spaces ('ACCRA PLAINS'), which memcached keys cannot
+        return f"bost:changes:v{FEED_KEY_VERSION}:{depot.replace(' ', '_')}:{part}"
+
+    def empty(self):
+        return {'seq': 0, 'refreshed_at': None, 'version': None, 'fields': [], 'events': []}
+
+    def read(self, depot):
+        return self.cache.get(self.key(depot, 'events')) or self.empty()
+
+    async def aread(self, depot):
+        return await self.cache.aget(self.key(depot, 'events')) or self.empty()
+
+    def due(self, depot, feed):
+        """Whether the feed has missed a refresh, checked at most once per cache TTL per worker"""
+        now = time.time()
+        ttl = settings.REPORT_CACHE_TTL
+        if feed['refreshed_at'] is not None and now - feed['refreshed_at'] <= ttl:
+            return False
+        if now - self._checked.get(depot, 0) <= ttl:
+            return False
+        self._checked[depot] = now
+        return True
+
+    def unchanged(self, depot, version):
+        """Whether version is the report the feed recorded last, which then counts as a refresh
+
+        True as well while another worker is recording the depot.
+        """
+        if version is None:
+            return False
+        lock_key = self.key(depot, 'lock')
+        if not self.cache.add(lock_key, os.getpid(), RECORD_LOCK_TIMEOUT):
+            return True
+        try:
+            feed = self.read(depot)
+            if feed.get('version') != version:
+                return False
+            feed['refreshed_at'] = time.time()
+            self.cache.touch(self.key(depot, 'index'), self.ttl)
+            self.cache.set(self.key(depot, 'events'), feed, self.ttl)
+            return True
+        finally:
+            self.cache.delete(lock_key)
+
+    def record(self, depot, index, version=None):
+        """Compare a refreshed depot's OrderIndex with the previous refresh and log the difference
+
+        version identifies the report the index was built from, for
+        unchanged(). Returns the new event, or None when nothing changed,
+        on the first refresh of a depot, or when another worker is recording
+        the same refresh (its changes then show up in the next event). The
+        lock is best-effort where cache.add() is not atomic, as on
+        FileBasedCache.
+        """
+        lock_key = self.key(depot, 'lock')
+        if not self.cache.add(lock_key, os.getpid(), RECORD_LOCK_TIMEOUT):
+            return None
+        try:
+            numbers = pd.Index(list(index.order_positions), dtype=object)
+            positions = np.fromiter(index.order_positions.values(), dtype=np.intp, count=len(numbers))
+            current = pd.Series(row_fingerprints(index.rows[positions]), index=numbers)
+
+            index_key = self.key(depot, 'index')
+            previous = self.cache.get(index_key)
+            feed = self.read(depot)
+            feed['refreshed_at'] = time.time()
+            feed['version'] = version
+            feed['fields'] = index.fields
+
+            event = None
+            if previous is not None:
+                new, changed, removed = diff_fingerprints(previous, current)
+                if len(new) or len(changed) or len(removed):
+                    feed['seq'] += 1
+                    event = {
+                        'seq': feed['seq'],
+                        'at': feed['refreshed_at'],
+                        'new': [index.rows[index.order_positions[number]].tolist() for number in new],
+                        'changed': [index.rows[index.order_positions[number]].tolist() for number in changed],
+                        'removed': removed.tolist(),
+                    }
+                    feed['events'] = (feed['events'] + [event])[-self.max_events:]
+
+            if previous is None or event is not None:
+                self.cache.set(index_key, current, self.ttl)
+            else:
+                self.cache.touch(index_key, self.ttl)
+            self.cache.set(self.key(depot, 'events'), feed, self.ttl)
+            return event
+        finally:
+            self.cache.delete(lock_key)
+
+
+change_feed = ChangeFeed()
@@ -0,0 +1,108 @@
+"""Stand-in for NPA's ExportDailyOrderReport endpoint, for load tests
+
+Serves make_report_workbook() exports over HTTP with configurable size
+(orders per report), latency and error rate, so the app can be driven
+hard without touching the real NPA service. Point NPA_EXPORT_URL at
+server.url to use it.
+"""
+import datetime
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import random
+import threading
+import time
+from urllib.parse import parse_qs, urlsplit
+
+from .sample_data import make_report_workbook
+from .xlsx import XLSX_CONTENT_TYPE
+
+EXPORT_PATH = '/NPAAPILIVE/Home/ExportDailyOrderReport'
+
+
+class FakeNPAHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path != EXPORT_PATH:
+            self.reply(HTTPStatus.NOT_FOUND, b"Not found", 'text/plain')
+            return
+
+        server = self.server
+        delay, failed = server.draw()
+        time.sleep(delay)
+        if failed:
+            self.reply(HTTPStatus.SERVICE_UNAVAILABLE, b"Service unavailable", 'text/plain')
+            return
+        params = parse_qs(url.query)
+        self.reply(HTTPStatus.OK, server.workbook(params.get('strQuery2', [''])[0]), XLSX_CONTENT_TYPE)
+
+    def reply(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class FakeNPAServer(ThreadingHTTPServer):
+    """Threaded HTTP server answering export requests with generated workbooks
+
+    rows sets the orders per report, latency the mean seconds before each
+    answer (spread by +/- jitter as a fraction), and error_rate the share
+    of requests answered 503. Each report window's workbook is generated
+    once and then served from memory.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, rows=1000, latency=0.0, jitter=0.0, error_rate=0.0,
+                 seed=0, verbose=False):
+        super().__init__((host, port), FakeNPAHandler)
+        self.rows = rows
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.seed = seed
+        self.verbose = verbose
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._workbooks = {}
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}{EXPORT_PATH}"
+
+    def draw(self):
+        """(delay, failed) for one request"""
+        with self._lock:
+            delay = self.latency * (1 + self._random.uniform(-self.jitter, self.jitter))
+            return max(delay, 0.0), self._random.random() < self.error_rate
+
+    def workbook(self, start):
+        """Export bytes for a window starting on start (DD-MM-YYYY), generated on first use"""
+        with self._lock:
+            content = self._workbooks.get(start)
+            if content is None:
+                try:
+                    start_date = datetime.datetime.strptime(start, '%d-%m-%Y')
+                except ValueError:
+                    start_date = None
+                content = self._workbooks[start] = make_report_workbook(
+                    rows=self.rows, seed=self.seed, start_date=start_date)
+            return content
+
+    def start(self):
+        """Serve from a daemon thread; returns the thread"""
+        thread = threading.Thread(target=self.serve_forever, name='fake-npa', daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,284 @@
+"""Streaming reader for the NPA ExportDailyOrderReport workbook
+
+pd.read_excel builds an openpyxl cell object for every cell in the sheet
+and then lets pandas infer a dtype per column, only for prepare_data to
+drop the title block and cast everything back to str. read_report walks
+the worksheet XML row by row instead, drops the title rows before any
+frame is built, and returns the cleaned string frame prepare_data starts
+from.
+
+Only the columns type_report reads (REPORT_COLUMNS) have their numbers
+and dates decoded; every other column is kept as its cell text, since
+prepare_data only checks those for blanks, depot names and totals. Cells
+are rendered with str() and no per-column dtype inference: type_report
+parses dates and numbers from text either way.
+"""
+from io import BytesIO
+import posixpath
+from xml.etree.ElementTree import fromstring, iterparse
+import zipfile
+
+import numpy as np
+import pandas as pd
+from openpyxl.cell.text import Text
+from openpyxl.reader.strings import read_string_table
+from openpyxl.styles.numbers import builtin_format_code, is_date_format, is_timedelta_format
+from openpyxl.utils.cell import column_index_from_string
+from openpyxl.utils.datetime import MAC_EPOCH, WINDOWS_EPOCH, from_excel, from_ISO8601
+from openpyxl.xml.constants import PKG_REL_NS, REL_NS, SHEET_MAIN_NS
+
+from .schema import REPORT_COLUMNS
+
+# Title block above the data; prepare_data skips the same rows of a read_excel frame
+HEADER_ROWS = 7
+# Set on frames that are already cleaned so prepare_data does not clean them twice
+CLEANED_ATTR = 'bost_cleaned'
+# Cell text read as missing, as read_excel's default na_values do
+NA_VALUES = frozenset([
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+])
+
+# The report columns have no header caption, so they read as 'Unnamed: N'
+_REPORT_WIDTH = 1 + max(int(name.rpartition(' ')[2]) for name in REPORT_COLUMNS)
+
+_MAIN = f"{{{SHEET_MAIN_NS}}}"
+_ROW = f"{_MAIN}row"
+_VALUE = f"{_MAIN}v"
+_INLINE = f"{_MAIN}is"
+_TEXT = f"{_MAIN}t"
+
+
+def read_report(content, skip_rows=HEADER_ROWS):
+    """Parse an NPA export into cleaned str cells, or None if the sheet is empty
+
+    Like pd.read_excel(content).iloc[skip_rows:].astype(str) with the
+    missing cells blanked, which is where prepare_data starts, except
+    that cells are not rendered through an inferred column dtype.
+    """
+    with zipfile.ZipFile(BytesIO(content)) as archive:
+        sheet_path, strings_path, styles_path, epoch = _workbook_parts(archive)
+        strings = []
+        if strings_path:
+            with archive.open(strings_path) as source:
+                strings = read_string_table(source)
+        date_styles, timedelta_styles = _date_styles(archive, styles_path)
+
+        with archive.open(sheet_path) as source:
+            rows = _SheetReader(strings, date_styles, timedelta_styles, epoch).read(source)
+
+    return _to_frame(rows, skip_rows)
+
+
+def _root(archive, path):
+    return fromstring(archive.read(path))
+
+
+def _resolve(base, target):
+    # Relationship targets are either package-absolute or relative to their part
+    if target.startswith('/'):
+        return target.lstrip('/')
+    return posixpath.normpath(posixpath.join(posixpath.dirname(base), target))
+
+
+def _relationships(archive, part):
+    rels_path = posixpath.join(posixpath.dirname(part), '_rels', f"{posixpath.basename(part)}.rels")
+    if rels_path not in archive.namelist():
+        return {}
+    root = _root(archive, rels_path)
+    return {
+        rel.get('Id'): (rel.get('Type', '').rsplit('/', 1)[-1], _resolve(part, rel.get('Target')))
+        for rel in root.iter(f"{{{PKG_REL_NS}}}Relationship")
+    }
+
+
+def _workbook_parts(archive):
+    """Locate the first worksheet, shared strings and styles like openpyxl does"""
+    workbook_path = next(
+        (path for kind, path in _relationships(archive, '').values() if kind == 'officeDocument'),
+        'xl/workbook.xml',
+    )
+    workbook = _root(archive, workbook_path)
+    relationships = _relationships(archive, workbook_path)
+
+    properties = workbook.find(f"{_MAIN}workbookPr")
+    date1904 = properties is not None and properties.get('date1904') in ('1', 'true')
+
+    sheet = workbook.find(f"{_MAIN}sheets/{_MAIN}sheet")
+    if sheet is None:
+        raise ValueError("Workbook has no worksheets")
+    sheet_path = relationships[sheet.get(f"{{{REL_NS}}}id")][1]
+
+    parts = {kind: path for kind, path in relationships.values()}
+    return sheet_path, parts.get('sharedStrings'), parts.get('styles'), MAC_EPOCH if date1904 else WINDOWS_EPOCH
+
+
+def _date_styles(archive, styles_path):
+    """Indexes of cell styles whose number format makes a number a date or duration"""
+    if not styles_path:
+        return set(), set()
+    root = _root(archive, styles_path)
+    custom = {
+        int(fmt.get('numFmtId')): fmt.get('formatCode')
+        for fmt in root.iterfind(f"{_MAIN}numFmts/{_MAIN}numFmt")
+    }
+    date_styles, timedelta_styles = set(), set()
+    for index, xf in enumerate(root.iterfind(f"{_MAIN}cellXfs/{_MAIN}xf")):
+        fmt_id = int(xf.get('numFmtId', 0))
+        fmt = custom[fmt_id] if fmt_id in custom else builtin_format_code(fmt_id)
+        if is_date_format(fmt):
+            date_styles.add(index)
+        if is_timedelta_format(fmt):
+            timedelta_styles.add(index)
+    return date_styles, timedelta_styles
+
+
+class _SheetReader:
+    """Reads sheet rows as lists of python values
+
+    Values follow pandas' openpyxl reader: whole numbers become int, blank
+    cells and empty strings become None and error cells are missing. Below
+    the header row, cells outside the report columns stay text.
+    """
+
+    def __init__(self, strings, date_styles, timedelta_styles, epoch):
+        self.strings = strings
+        self.date_styles = date_styles
+        self.timedelta_styles = timedelta_styles
+        self.epoch = epoch
+        self.columns = {}
+        # 1-based indexes of the report columns, known once the header row is read
+        self.typed = None
+
+    def read(self, source):
+        """Every row of the sheet from the first, without trailing blank rows"""
+        rows = []
+        last_data_row = 0
+        for _, element in iterparse(source, events=('end',)):
+            if element.tag != _ROW:
+                continue
+            number = element.get('r')
+            number = int(float(number)) if number else len(rows) + 1
+            # Rows missing from the XML are blank rows
+            rows.extend([] for _ in range(number - 1 - len(rows)))
+            if rows and self.typed is None:
+                self.typed = _report_columns(rows[0])
+            values = self.parse_row(element)
+            element.clear()
+            rows.append(values)
+            if values:
+                last_data_row = len(rows)
+        del rows[last_data_row:]
+        return rows
+
+    def parse_row(self, element):
+        values = []
+        column = 0
+        for cell in element:
+            reference = cell.get('r')
+            column = self.column_index(reference) if reference else column + 1
+            if self.typed is None or column in self.typed:
+                value = self.parse_cell(cell)
+            else:
+                value = self.cell_text(cell)
+            if value is not None:
+                if len(values) < column:
+                    values.extend([None] * (column - len(values)))
+                values[column - 1] = value
+        return values
+
+    def column_index(self, reference):
+        letters = reference.rstrip('0123456789')
+        index = self.columns.get(letters)
+        if index is None:
+            index = self.columns[letters] = column_index_from_string(letters)
+        return index
+
+    def cell_text(self, cell):
+        """A cell's text as stored, without decoding numbers, dates or booleans"""
+        data_type = cell.get('t', 'n')
+        if data_type == 'inlineStr':
+            child = cell.find(_INLINE)
+            if child is None:
+                return None
+            text = child.find(_TEXT)
+            value = text.text if text is not None and len(child) == 1 else Text.from_tree(child).content
+            return value or None
+        if data_type == 'e':
+            return None
+        value = cell.findtext(_VALUE) or None
+        if value is not None and data_type == 's':
+            return self.strings[int(value)] or None
+        return value
+
+    def parse_cell(self, cell):
+        data_type = cell.get('t', 'n')
+        if data_type not in ('n', 'b', 'd'):
+            return self.cell_text(cell)
+
+        value = cell.findtext(_VALUE) or None
+        if value is None:
+            return None
+        if data_type == 'b':
+            return bool(int(value))
+        if data_type == 'd':
+            return from_ISO8601(value)
+        value = float(value) if '.' in value or 'E' in value or 'e' in value else int(value)
+        style = cell.get('s')
+        if style and int(style) in self.date_styles:
+            style = int(style)
+            try:
+                return from_excel(value, self.epoch, timedelta=style in self.timedelta_styles)
+            except (OverflowError, ValueError):
+                return None
+        as_int = int(value)
+        return as_int if as_int == value else float(value)
+
+
+def _report_columns(header):
+    """1-based indexes of the columns named in REPORT_COLUMNS"""
+    names = _column_names(header, max(len(header), _REPORT_WIDTH))
+    return {index + 1 for index, name in enumerate(names) if name in REPORT_COLUMNS}
+
+
+def _to_frame(rows, skip_rows):
+    """Build the cleaned frame from the header row and the rows below it"""
+    width = max(map(len, rows), default=0)
+    if len(rows) < 2 or width == 0:
+        return None
+    header, data = rows[0], rows[1:]
+    frame = {}
+    for index, name in enumerate(_column_names(header, width)):
+        frame[name] = _render([row[index] if index < len(row) else None for row in data], skip_rows)
+    df = pd.DataFrame(frame, index=pd.RangeIndex(skip_rows, max(len(data), skip_rows)))
+    df.attrs[CLEANED_ATTR] = True
+    return df
+
+
+def _column_names(header, width):
+    names = []
+    seen = {}
+    for index in range(width):
+        value = header[index] if index < len(header) else None
+        name = f"Unnamed: {index}" if value is None else value
+        # Duplicate captions get pandas' '.1', '.2' suffixes
+        count = seen.get(name, 0)
+        seen[name] = count + 1
+        names.append(name if count == 0 else f"{name}.{count}")
+    return names
+
+
+def _render(column, skip_rows):
+    """A column's cells below skip_rows as text, '' for missing ones
+
+    A column of numbers with a float or a gap anywhere, title rows
+    included, is a float column to read_excel, so its whole numbers
+    render as '54000.0' there; they do here too.
+    """
+    values = pd.Series(column, dtype=object)
+    missing = values.isna() | values.isin(NA_VALUES)
+    numbers = values[~missing]
+    is_number = numbers.map(lambda value: isinstance(value, (int, float)) and not isinstance(value, bool))
+    if len(numbers) and is_number.all() and (missing.any() or numbers.map(type).eq(float).any()):
+        values = values.mask(~missing, numbers.astype(float))
+    return values.mask(missing, '').iloc[skip_rows:].map(str).to_numpy(dtype=object)
@@ -0,0 +1,91 @@
+"""Rendering of background report jobs, run in run_report_jobs' process pool
+
+Each pool process loads the report through the shared report cache, the
+same way the views do, renders it and writes the file under
+REPORT_JOB_DIR, reporting progress on the ReportJob row as it goes.
+"""
+from io import BytesIO
+import logging
+import os
+from pathlib import Path
+import tempfile
+import traceback
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .cache import report_cache
+from .models import ReportJob
+from .views import PDFGenerator, _csv_text, _fetch_and_process, _parquet_bytes, fetcher_for
+from .xlsx import write_report
+
+logger = logging.getLogger(__name__)
+
+
+def run_job(job_id):
+    """Render one claimed job to its file; returns the job's final status"""
+    close_old_connections()
+    job = ReportJob.objects.get(pk=job_id)
+    try:
+        content, error = render_job(job)
+        if error:
+            job.fail(error)
+        else:
+            job.report_progress(0.9, 'saving')
+            job.complete(*save_artifact(job, content))
+    except Exception as e:
+        logger.error(f"Report job {job_id} error: {str(e)}")
+        logger.error(f"Report job {job_id} traceback: {traceback.format_exc()}")
+        job.fail(str(e))
+    finally:
+        close_old_connections()
+    return job.status
+
+
+def render_job(job):
+    """Return (content, error) for a job's report in its format"""
+    job.report_progress(0.1, 'fetching')
+    fetcher, error = fetcher_for({
+        'start': job.start_date.strftime('%d-%m-%Y'),
+        'end': job.end_date.strftime('%d-%m-%Y'),
+        'chunk': job.chunk,
+    })
+    if error:
+        return None, error
+    prepared, error = report_cache.get_or_load(
+        fetcher.cache_key(), lambda: _fetch_and_process(fetcher), fetcher.last_good_key())
+    if error:
+        return None, error if isinstance(error, str) else error[1]
+
+    job.report_progress(0.5, 'processing')
+    df, error = fetcher.finalize_data(prepared, job.depot)
+    if error:
+        return None, error
+
+    job.report_progress(0.6, 'rendering')
+    if job.format == 'pdf':
+        return PDFGenerator().generate(df, f"DEPOT: BOST - {job.depot}")
+    if job.format == 'csv':
+        return _csv_text(df).encode('utf-8'), None
+    if job.format == 'xlsx':
+        workbook = BytesIO()
+        write_report(df, workbook)
+        return workbook.getvalue(), None
+    return _parquet_bytes(df), None
+
+
+def save_artifact(job, content):
+    """Write a job's file into REPORT_JOB_DIR; returns (path, size)"""
+    directory = Path(settings.REPORT_JOB_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"{job.id}.{job.extension}"
+    # Written aside and renamed into place, so a download never sees half a file
+    fd, staging = tempfile.mkstemp(prefix=f".{job.id}-", dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        os.replace(staging, path)
+    except OSError:
+        Path(staging).unlink(missing_ok=True)
+        raise
+    return path, len(content)
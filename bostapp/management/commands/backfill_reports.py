@@ -0,0 +1,63 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from bostapp.views import RangeFetcher, _csv_text, normalize_depot, parse_report_date, store_orders
+
+
+class Command(BaseCommand):
+    help = "Fetch a date range from NPA in parallel chunks and store the orders"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', required=True, help="First day, DD-MM-YYYY")
+        parser.add_argument('--end', required=True, help="Last day, DD-MM-YYYY")
+        parser.add_argument('--chunk', choices=sorted(RangeFetcher.chunk_days), default='day',
+                            help="Size of each upstream request")
+        parser.add_argument('--workers', type=int, default=settings.BACKFILL_WORKERS,
+                            help="Chunks fetched at the same time")
+        parser.add_argument('--retries', type=int, default=settings.BACKFILL_RETRIES,
+                            help="Retries per chunk after an upstream failure")
+        parser.add_argument('--output', help="Also write one depot's report to this CSV file")
+        parser.add_argument('--depot', default='KUMASI', help="Depot for --output")
+
+    def handle(self, *args, **options):
+        try:
+            start_date = parse_report_date(options['start'])
+            end_date = parse_report_date(options['end'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        if end_date < start_date:
+            raise CommandError("--start is after --end")
+
+        fetcher = RangeFetcher(
+            start_date, end_date,
+            chunk=options['chunk'],
+            max_workers=options['workers'],
+            retries=options['retries'],
+        )
+        chunks = len(list(fetcher.chunks()))
+        self.stdout.write(f"Fetching {chunks} {options['chunk']} chunks with {options['workers']} workers")
+
+        started = time.perf_counter()
+        prepared, error = fetcher.load_prepared()
+        if error:
+            raise CommandError(error[1])
+        self.stdout.write(
+            f"Merged {len(prepared.df)} rows for depots {', '.join(prepared.depots())} "
+            f"in {time.perf_counter() - started:.1f}s"
+        )
+
+        store_orders(fetcher, prepared)
+
+        if options['output']:
+            depot = normalize_depot(options['depot'])
+            df, error = fetcher.finalize_data(prepared, depot)
+            if error:
+                raise CommandError(error)
+            # The same columns and formatting as /export-csv/
+            with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+                output.write(_csv_text(df))
+            self.stdout.write(f"Wrote {len(df)} BOST-{depot} rows to {options['output']}")
+
+        self.stdout.write(self.style.SUCCESS("Backfill complete"))
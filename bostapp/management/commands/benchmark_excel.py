@@ -0,0 +1,76 @@
+import multiprocessing
+import resource
+import time
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+
+from bostapp.sample_data import make_report_workbook
+
+READERS = ('pandas', 'streaming')
+
+
+def _measure(reader, content, repeat, results):
+    """Parse and prepare content with one reader, in a fresh process so peak RSS is its own"""
+    django.setup()
+    from django.test.utils import override_settings
+    from bostapp.views import DataFetcher
+
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    parse_times, prepare_times = [], []
+    with override_settings(REPORT_EXCEL_READER=reader):
+        for _ in range(repeat):
+            fetcher = DataFetcher()
+            start = time.perf_counter()
+            df, error = fetcher.parse_content(content)
+            parsed = time.perf_counter()
+            if not error:
+                prepared, error = fetcher.prepare_data(df)
+            if error:
+                results.put((reader, error))
+                return
+            parse_times.append(parsed - start)
+            prepare_times.append(time.perf_counter() - parsed)
+            del df, prepared
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux
+    results.put((reader, (min(parse_times), min(prepare_times), peak / 1024, (peak - baseline) / 1024)))
+
+
+class Command(BaseCommand):
+    help = "Benchmark Excel parsing of an NPA export: pd.read_excel against the streaming reader"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', help="Recorded ExportDailyOrderReport .xlsx; a synthetic one is used if omitted")
+        parser.add_argument('--rows', type=int, default=50000, help="Orders in the synthetic workbook")
+        parser.add_argument('--repeat', type=int, default=3, help="Runs per reader; the best is reported")
+
+    def handle(self, *args, **options):
+        if options['file']:
+            with open(options['file'], 'rb') as f:
+                content = f.read()
+        else:
+            content = make_report_workbook(rows=options['rows'])
+        self.stdout.write(f"Workbook: {len(content) / 1024 / 1024:.1f} MB")
+
+        context = multiprocessing.get_context('spawn')
+        results = {}
+        for reader in READERS:
+            queue = context.Queue()
+            process = context.Process(target=_measure, args=(reader, content, options['repeat'], queue))
+            process.start()
+            name, result = queue.get()
+            process.join()
+            if isinstance(result, str):
+                raise CommandError(f"{name} reader failed: {result}")
+            results[name] = result
+            parse, prepare, peak, growth = result
+            self.stdout.write(
+                f"{name:>10}: parse {parse:7.2f}s  prepare {prepare:6.2f}s  "
+                f"peak RSS {peak:7.1f} MB (+{growth:.1f} MB while parsing)"
+            )
+
+        speedup = results['pandas'][0] / results['streaming'][0]
+        saved = results['pandas'][3] - results['streaming'][3]
+        self.stdout.write(self.style.SUCCESS(f"Parse speed-up: {speedup:.1f}x, {saved:.1f} MB less peak growth"))
@@ -0,0 +1,85 @@
+import time
+import warnings
+
+from django.core.management.base import BaseCommand
+from fpdf import FPDF
+
+from bostapp.sample_data import make_report_frame
+from bostapp.schema import display_frame
+from bostapp.views import DataFetcher, PDFGenerator, truncate_text
+
+
+class IterrowsPDFGenerator(PDFGenerator):
+    """The original iterrows()/cell() renderer, kept as the benchmark baseline"""
+
+    def generate(self, df, title):
+        df = display_frame(df)
+        pdf = FPDF(orientation='L', unit='mm', format='A4')
+        pdf.set_auto_page_break(auto=True, margin=15)
+        pdf.add_page()
+        pdf.set_font(self.font, 'B', 16)
+        pdf.cell(0, 10, title, ln=True, align='C')
+        pdf.ln(10)
+        pdf.set_font(self.font, size=8)
+        col_widths = [min((pdf.w - 20) / len(df.columns), 40) for _ in df.columns]
+        self._legacy_header(pdf, df, col_widths)
+        for _, row in df.iterrows():
+            if pdf.get_y() + 8 > pdf.h - 15:
+                pdf.add_page()
+                self._legacy_header(pdf, df, col_widths)
+            for col, width in zip(df.columns, col_widths):
+                pdf.cell(width, 8, truncate_text(str(row[col]), 20), border=1)
+            pdf.ln()
+        return bytes(pdf.output()), None
+
+    def _legacy_header(self, pdf, df, col_widths):
+        pdf.set_font(self.font, 'B', 8)
+        for col, width in zip(df.columns, col_widths):
+            pdf.cell(width, 8, truncate_text(str(col), 15), border=1, align='C')
+        pdf.ln()
+        pdf.set_font(self.font, size=7)
+
+
+class Command(BaseCommand):
+    help = "Benchmark PDF rendering of a synthetic report, before and after the fast renderer"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help="Report rows to render")
+        parser.add_argument('--repeat', type=int, default=3, help="Runs per renderer; the best is reported")
+        parser.add_argument('--skip-baseline', action='store_true', help="Only time the current renderer")
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        df = self._report(rows)
+        self.stdout.write(f"Rendering {len(df)} rows x {len(df.columns)} columns")
+
+        renderers = [('current', PDFGenerator())]
+        if not options['skip_baseline']:
+            renderers.insert(0, ('iterrows baseline', IterrowsPDFGenerator()))
+
+        results = {}
+        for name, generator in renderers:
+            best = min(self._time(generator, df) for _ in range(options['repeat']))
+            results[name] = best
+            self.stdout.write(f"{name:>18}: {best:8.3f}s  {len(df) / best:10.0f} rows/s")
+
+        if len(results) == 2:
+            speedup = results['iterrows baseline'] / results['current']
+            self.stdout.write(self.style.SUCCESS(f"Speed-up: {speedup:.1f}x"))
+
+    def _report(self, rows):
+        # Processing drops other depots and subtotals, so generate extra raw rows
+        df, error = DataFetcher().process_data(make_report_frame(rows=rows * 3))
+        if error:
+            raise RuntimeError(error)
+        return df.iloc[:rows]
+
+    def _time(self, generator, df):
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            start = time.perf_counter()
+            content, error = generator.generate(df, "DEPOT: BOST - KUMASI")
+            elapsed = time.perf_counter() - start
+        if error:
+            raise RuntimeError(error)
+        return elapsed
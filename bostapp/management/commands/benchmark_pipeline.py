@@ -0,0 +1,201 @@
+import asyncio
+from contextlib import contextmanager
+import json
+import logging
+from pathlib import Path
+import tempfile
+import time
+import tracemalloc
+from unittest import mock
+import warnings
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, override_settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import setup_test_environment, teardown_test_environment
+import httpx
+
+from bostapp.cache import artifact_cache
+from bostapp.sample_data import make_report_workbook
+from bostapp.snapshots import SnapshotStore, content_digest
+from bostapp.views import DataFetcher, PDFGenerator, _csv_text
+
+STAGES = ['parse', 'snapshot', 'process', 'pdf', 'csv', 'view-csv', 'view-pdf']
+VIEW_PATHS = {'view-csv': '/export-csv/', 'view-pdf': '/download-pdf/'}
+TITLE = "DEPOT: BOST - KUMASI"
+
+
+class FakeNPAClient:
+    """Stands in for the pooled httpx client, answering every export with one workbook"""
+
+    def __init__(self, content):
+        self.content = content
+
+    async def get(self, url, params=None):
+        return httpx.Response(200, content=self.content, request=httpx.Request('GET', url, params=params))
+
+
+class Command(BaseCommand):
+    help = "Benchmark each stage of the report pipeline on NPA-shaped workbooks"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='100,10000,100000',
+                            help="Comma-separated order counts for synthetic workbooks")
+        parser.add_argument('--fixture', action='append', default=[],
+                            help="Recorded ExportDailyOrderReport .xlsx to benchmark as well; repeatable")
+        parser.add_argument('--fixtures-dir', default=str(settings.BASE_DIR / '.cache' / 'benchmarks'),
+                            help="Where generated workbooks are kept between runs")
+        parser.add_argument('--stages', default=','.join(STAGES), help=f"Comma-separated subset of {STAGES}")
+        parser.add_argument('--repeat', type=int, default=3, help="Timed runs per stage; the best is reported")
+        parser.add_argument('--skip-memory', action='store_true', help="Skip the traced run that measures peak memory")
+        parser.add_argument('--json', help="Write the results to this file")
+        parser.add_argument('--baseline', help="Results file from an earlier run to compare against")
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help="Slow-down over the baseline that counts as a regression")
+
+    def handle(self, *args, **options):
+        stages = [stage for stage in options['stages'].split(',') if stage]
+        unknown = set(stages) - set(STAGES)
+        if unknown:
+            raise CommandError(f"Unknown stages: {', '.join(sorted(unknown))}")
+
+        workbooks = [(f"{int(size)} rows", self._workbook(int(size), options['fixtures_dir']))
+                     for size in options['sizes'].split(',') if size]
+        for path in options['fixture']:
+            workbooks.append((Path(path).name, Path(path).read_bytes()))
+
+        self.repeat = options['repeat']
+        self.trace_memory = not options['skip_memory']
+        results = []
+        # Every request logs the orders it stores; keep the table readable
+        logging.disable(logging.INFO)
+        try:
+            # Stored snapshots would turn every parse after the first into a snapshot read
+            with warnings.catch_warnings(), override_settings(REPORT_SNAPSHOT_DIR=''), \
+                    tempfile.TemporaryDirectory() as snapshot_dir, \
+                    self._isolated_database(any(s in VIEW_PATHS for s in stages)):
+                warnings.simplefilter('ignore')
+                self.snapshots = SnapshotStore(snapshot_dir)
+                for label, content in workbooks:
+                    self.stdout.write(f"\n{label} ({len(content) / 1024 / 1024:.1f} MB)")
+                    self.stdout.write(f"{'stage':>10} {'best s':>9} {'rows':>8} {'rows/s':>10} {'peak MB':>9}")
+                    for result in self._run_workbook(label, content, stages):
+                        results.append(result)
+                        peak = '-' if result['peak_mb'] is None else f"{result['peak_mb']:.1f}"
+                        self.stdout.write(
+                            f"{result['stage']:>10} {result['seconds']:9.3f} {result['rows']:8d} "
+                            f"{result['rows_per_second']:10.0f} {peak:>9}"
+                        )
+        finally:
+            logging.disable(logging.NOTSET)
+
+        if options['json']:
+            Path(options['json']).write_text(json.dumps(results, indent=2))
+            self.stdout.write(f"\nWrote {len(results)} results to {options['json']}")
+        if options['baseline']:
+            self._compare(results, json.loads(Path(options['baseline']).read_text()), options['tolerance'])
+
+    def _workbook(self, rows, directory):
+        """Synthetic workbook for rows orders, generated once and then reused"""
+        path = Path(directory) / f"npa-report-{rows}.xlsx"
+        if not path.exists():
+            self.stdout.write(f"Generating {path}")
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(make_report_workbook(rows=rows))
+        return path.read_bytes()
+
+    def _run_workbook(self, label, content, stages):
+        fetcher = DataFetcher()
+        raw, error = fetcher.parse_content(content)
+        if error:
+            raise CommandError(f"{label}: {error}")
+        df, error = fetcher.process_data(raw)
+        if error:
+            raise CommandError(f"{label}: {error}")
+        digest = content_digest(content)
+        self.snapshots.save(content, raw, digest)
+
+        runs = {
+            'parse': (lambda: fetcher.parse_content(content), len(raw)),
+            'snapshot': (lambda: self.snapshots.load(digest), len(raw)),
+            'process': (lambda: fetcher.process_data(raw), len(raw)),
+            'pdf': (lambda: PDFGenerator().generate(df, TITLE), len(df)),
+            'csv': (lambda: _csv_text(df), len(df)),
+        }
+        for stage, path in VIEW_PATHS.items():
+            runs[stage] = (lambda path=path: self._round_trip(content, path), len(df))
+
+        for stage in stages:
+            func, rows = runs[stage]
+            seconds = min(self._time(func) for _ in range(self.repeat))
+            yield {
+                'workbook': label,
+                'stage': stage,
+                'rows': rows,
+                'seconds': seconds,
+                'rows_per_second': rows / seconds if seconds else 0.0,
+                'peak_mb': self._peak_memory(func) if self.trace_memory else None,
+            }
+
+    def _time(self, func):
+        start = time.perf_counter()
+        func()
+        return time.perf_counter() - start
+
+    def _peak_memory(self, func):
+        # Separate from the timed runs: tracing allocations slows everything down
+        tracemalloc.start()
+        try:
+            func()
+            return tracemalloc.get_traced_memory()[1] / 1024 / 1024
+        finally:
+            tracemalloc.stop()
+
+    def _round_trip(self, content, path):
+        """GET path through the ASGI handler, with NPA answered by content"""
+        async def request():
+            response = await AsyncClient().get(path, secure=True)
+            if response.status_code != 200:
+                raise CommandError(f"{path} returned {response.status_code}")
+            if response.streaming:
+                return b''.join([chunk async for chunk in response.streaming_content])
+            return response.content
+
+        # A dummy cache makes every request go upstream, so each run is a full miss
+        artifact_cache.clear()
+        dummy_cache = {alias: {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'} for alias in ('default', 'meta')}
+        with override_settings(CACHES=dummy_cache), \
+                mock.patch('bostapp.views.get_async_client', return_value=FakeNPAClient(content)):
+            return asyncio.run(request())
+
+    @contextmanager
+    def _isolated_database(self, needed):
+        """Run the views against a throwaway test database, never the configured one"""
+        if not needed:
+            yield
+            return
+        setup_test_environment()
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        old_config = runner.setup_databases()
+        try:
+            yield
+        finally:
+            runner.teardown_databases(old_config)
+            teardown_test_environment()
+
+    def _compare(self, results, baseline, tolerance):
+        """Report stages that got slower than the baseline by more than tolerance"""
+        previous = {(result['workbook'], result['stage']): result for result in baseline}
+        regressions = []
+        for result in results:
+            before = previous.get((result['workbook'], result['stage']))
+            if before is None or not before['seconds']:
+                continue
+            change = result['seconds'] / before['seconds'] - 1
+            if change > tolerance:
+                regressions.append(f"{result['workbook']} {result['stage']}: "
+                                   f"{before['seconds']:.3f}s -> {result['seconds']:.3f}s (+{change:.0%})")
+        if regressions:
+            raise CommandError("Regressions against the baseline:\n" + "\n".join(regressions))
+        self.stdout.write(self.style.SUCCESS(f"No stage slower than the baseline by more than {tolerance:.0%}"))
@@ -0,0 +1,159 @@
+import asyncio
+import json
+import logging
+import os
+from pathlib import Path
+import shlex
+import statistics
+import subprocess
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+import httpx
+
+from bostapp.management.commands.load_test import process_rss
+
+
+def process_pss(pid):
+    """Proportional set size in bytes, shared pages split between their users; None if unreadable"""
+    try:
+        for line in Path(f"/proc/{pid}/smaps_rollup").read_text().splitlines():
+            if line.startswith('Pss:'):
+                return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+class Command(BaseCommand):
+    help = "Start gunicorn with and without preloading and report time to first response and worker memory"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bind', default='127.0.0.1:8055', help="Address the started servers listen on")
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--runs', type=int, default=3, help="Cold starts per configuration")
+        parser.add_argument('--path', default='/simple-health/', help="Path timed to its first response")
+        parser.add_argument('--warm-requests', type=int, default=50,
+                            help="Concurrent requests sent after the first, so every worker has served one "
+                                 "before its memory is read")
+        parser.add_argument('--settle', type=float, default=1.0, help="Seconds to wait before reading memory")
+        parser.add_argument('--server', action='append', default=[], metavar='LABEL=COMMAND',
+                            help="Compare these server commands instead of gunicorn with and without preload")
+        parser.add_argument('--startup-timeout', type=float, default=60.0)
+        parser.add_argument('--json', help="Write the results to this file")
+
+    def handle(self, *args, **options):
+        self.options = options
+        # httpx logs every request, which would bury the table
+        logging.getLogger('httpx').setLevel(logging.WARNING)
+        if options['server']:
+            servers = [self._parse_server(server) for server in options['server']]
+        else:
+            command = f"gunicorn config.asgi:application --bind {options['bind']} --workers {options['workers']}"
+            servers = [
+                ('no-preload', command, {'GUNICORN_PRELOAD': 'false'}),
+                ('preload', command, {'GUNICORN_PRELOAD': 'true'}),
+            ]
+
+        self.stdout.write(f"{'server':<16} {'run':>4} {'first ms':>9} {'master MB':>10} {'worker RSS MB':>14} "
+                          f"{'worker PSS MB':>14} {'total PSS MB':>13}")
+        results = []
+        for label, command, env in servers:
+            runs = []
+            for run in range(1, options['runs'] + 1):
+                result = self._cold_start(command, env)
+                result.update(server=label, run=run)
+                runs.append(result)
+                self._write_row(result)
+            results += runs
+            self._write_row({
+                'server': label, 'run': 'med',
+                **{key: self._median(runs, key) for key in
+                   ('first_response_ms', 'master_rss_mb', 'worker_rss_mb', 'worker_pss_mb', 'total_pss_mb')},
+            })
+
+        if options['json']:
+            Path(options['json']).write_text(json.dumps(results, indent=2))
+            self.stdout.write(f"\nWrote {len(results)} results to {options['json']}")
+
+    def _parse_server(self, value):
+        label, separator, command = value.partition('=')
+        if not separator or not command.strip():
+            raise CommandError(f"--server takes LABEL=COMMAND, got '{value}'")
+        return label.strip(), command, {}
+
+    def _cold_start(self, command, env):
+        """Start one server, time its first response, read its memory and stop it"""
+        url = f"http://{self.options['bind']}{self.options['path']}"
+        started = time.perf_counter()
+        process = subprocess.Popen(shlex.split(command), env={**os.environ, **env},
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            self._wait_for_response(process, url)
+            first_response = time.perf_counter() - started
+            asyncio.run(self._warm(url))
+            time.sleep(self.options['settle'])
+            return self._memory(process.pid, first_response)
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+
+    def _wait_for_response(self, process, url):
+        deadline = time.monotonic() + self.options['startup_timeout']
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise CommandError(f"Server exited with status {process.returncode} before answering")
+            try:
+                if httpx.get(url, timeout=1).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.02)
+        raise CommandError(f"Server did not answer {url} within {self.options['startup_timeout']:.0f}s")
+
+    async def _warm(self, url):
+        async with httpx.AsyncClient(timeout=30) as client:
+            await asyncio.gather(*(client.get(url) for _ in range(self.options['warm_requests'])),
+                                 return_exceptions=True)
+
+    def _memory(self, pid, first_response):
+        try:
+            master_rss, workers = process_rss(pid)
+        except OSError:
+            raise CommandError("Server exited while its memory was read")
+        worker_rss, worker_pss = [], []
+        for worker in workers:
+            try:
+                worker_rss.append(process_rss(worker)[0])
+            except OSError:
+                continue
+            worker_pss.append(process_pss(worker))
+        pss = [value for value in [process_pss(pid), *worker_pss] if value is not None]
+        megabytes = 1024 * 1024
+        return {
+            'first_response_ms': first_response * 1000,
+            'workers': len(worker_rss),
+            'master_rss_mb': master_rss / megabytes,
+            'worker_rss_mb': statistics.mean(worker_rss) / megabytes if worker_rss else None,
+            'worker_pss_mb': (statistics.mean(worker_pss) / megabytes
+                              if worker_pss and None not in worker_pss else None),
+            'total_pss_mb': sum(pss) / megabytes if pss else None,
+        }
+
+    def _median(self, runs, key):
+        values = [run[key] for run in runs if run[key] is not None]
+        return statistics.median(values) if values else None
+
+    def _write_row(self, result):
+        def number(value, digits=1):
+            return '-' if value is None else f"{value:.{digits}f}"
+
+        self.stdout.write(
+            f"{result['server'][:16]:<16} {result['run']:>4} {number(result['first_response_ms'], 0):>9} "
+            f"{number(result['master_rss_mb']):>10} {number(result['worker_rss_mb']):>14} "
+            f"{number(result['worker_pss_mb']):>14} {number(result['total_pss_mb']):>13}"
+        )
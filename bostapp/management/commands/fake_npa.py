@@ -0,0 +1,39 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from bostapp.fake_npa import FakeNPAServer
+
+
+class Command(BaseCommand):
+    help = "Serve generated NPA exports locally, for load tests with NPA_EXPORT_URL pointed at it"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--rows', type=int, default=1000, help="Orders in every served report")
+        parser.add_argument('--latency', type=float, default=0.5, help="Mean seconds before each answer")
+        parser.add_argument('--jitter', type=float, default=0.5,
+                            help="Random +/- fraction applied to the latency")
+        parser.add_argument('--error-rate', type=float, default=0.0, help="Share of requests answered 503")
+        parser.add_argument('--seed', type=int, default=0, help="Seed for the generated orders and the draws")
+        parser.add_argument('--verbose', action='store_true', help="Log every request")
+
+    def handle(self, *args, **options):
+        server = FakeNPAServer(
+            options['host'], options['port'], rows=options['rows'], latency=options['latency'],
+            jitter=options['jitter'], error_rate=options['error_rate'], seed=options['seed'],
+            verbose=options['verbose'],
+        )
+        # Generate the default yesterday -> today report before the first request asks for it
+        yesterday = datetime.datetime.now() - datetime.timedelta(days=1)
+        content = server.workbook(yesterday.strftime('%d-%m-%Y'))
+        self.stdout.write(f"Serving {options['rows']}-order exports ({len(content) / 1024 / 1024:.1f} MB) "
+                          f"with {options['latency']}s latency and {options['error_rate']:.0%} errors")
+        self.stdout.write(f"NPA_EXPORT_URL={server.url}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
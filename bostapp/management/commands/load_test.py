@@ -0,0 +1,243 @@
+import asyncio
+from contextlib import contextmanager
+import json
+import os
+from pathlib import Path
+import shlex
+import subprocess
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+import httpx
+import numpy as np
+
+from bostapp.fake_npa import FakeNPAServer
+
+DEFAULT_ENDPOINTS = '/preview-pdf/,/export-csv/,/api/orders/?limit=100'
+
+
+def process_rss(pid):
+    """(resident bytes, child pids) of one process from /proc; raises OSError once it is gone"""
+    rss = 0
+    for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+        if line.startswith('VmRSS:'):
+            rss = int(line.split()[1]) * 1024
+    children = []
+    for task in Path(f"/proc/{pid}/task").iterdir():
+        children += [int(child) for child in (task / 'children').read_text().split()]
+    return rss, children
+
+
+def process_tree_rss(pid):
+    """Resident memory in bytes of pid and all its descendants; None without /proc or once pid exits"""
+    try:
+        total, pending = process_rss(pid)
+    except OSError:
+        return None
+    while pending:
+        try:
+            rss, children = process_rss(pending.pop())
+        except OSError:
+            # A worker exiting between reads
+            continue
+        total += rss
+        pending += children
+    return total
+
+
+class RSSSampler:
+    """Peak resident memory of a process tree, sampled from a background thread"""
+
+    def __init__(self, pid, interval=0.25):
+        self.pid = pid
+        self.interval = interval
+        self.peak = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        if self.pid is not None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while True:
+            rss = process_tree_rss(self.pid)
+            if rss is not None:
+                self.peak = max(self.peak or 0, rss)
+            if self._stop.wait(self.interval):
+                return
+
+
+class Command(BaseCommand):
+    help = "Drive the app's endpoints at set concurrency levels and report latency, throughput and memory"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help="Base URL of the app")
+        parser.add_argument('--endpoints', default=DEFAULT_ENDPOINTS, help="Comma-separated paths to drive")
+        parser.add_argument('--concurrency', default='1,4,16', help="Comma-separated concurrent client counts")
+        parser.add_argument('--duration', type=float, default=10.0, help="Seconds to run each level")
+        parser.add_argument('--requests', type=int, help="Requests per level instead of a duration")
+        parser.add_argument('--timeout', type=float, default=60.0, help="Seconds before a request counts as failed")
+        parser.add_argument('--server', action='append', default=[], metavar='LABEL=COMMAND',
+                            help="Start COMMAND (e.g. a gunicorn line) and test it as LABEL; repeatable to "
+                                 "compare worker models. Without it the app already at --url is tested")
+        parser.add_argument('--pid', type=int, help="Process whose tree's memory to sample for an external app")
+        parser.add_argument('--startup-timeout', type=float, default=60.0,
+                            help="Seconds to wait for a started server to answer")
+        parser.add_argument('--fake-npa', action='store_true',
+                            help="Serve NPA exports from an in-process fake and point started servers at it")
+        parser.add_argument('--npa-rows', type=int, default=1000)
+        parser.add_argument('--npa-latency', type=float, default=0.5)
+        parser.add_argument('--npa-jitter', type=float, default=0.5)
+        parser.add_argument('--npa-error-rate', type=float, default=0.0)
+        parser.add_argument('--json', help="Write the results to this file")
+
+    def handle(self, *args, **options):
+        endpoints = [endpoint for endpoint in options['endpoints'].split(',') if endpoint]
+        levels = [int(level) for level in options['concurrency'].split(',') if level]
+        if not endpoints or not levels or min(levels) < 1:
+            raise CommandError("Give at least one endpoint and positive concurrency levels")
+        servers = [self._parse_server(server) for server in options['server']] or [('external', None)]
+        self.options = options
+
+        results = []
+        with self._fake_npa() as npa_url:
+            for label, command in servers:
+                with self._server(command, npa_url) as pid:
+                    pid = pid or options['pid']
+                    self.stdout.write(f"\n{label}")
+                    self.stdout.write(f"{'endpoint':<32} {'conc':>5} {'ok':>6} {'err':>5} {'p50 ms':>8} "
+                                      f"{'p95 ms':>8} {'p99 ms':>8} {'req/s':>8} {'RSS MB':>8}")
+                    for endpoint in endpoints:
+                        for concurrency in levels:
+                            with RSSSampler(pid) as sampler:
+                                result = asyncio.run(self._run_level(endpoint, concurrency))
+                            rss_mb = None if sampler.peak is None else sampler.peak / 1024 / 1024
+                            result.update(server=label, rss_mb=rss_mb)
+                            results.append(result)
+                            self._write_row(result)
+
+        if options['json']:
+            Path(options['json']).write_text(json.dumps(results, indent=2))
+            self.stdout.write(f"\nWrote {len(results)} results to {options['json']}")
+
+    def _parse_server(self, value):
+        label, separator, command = value.partition('=')
+        if not separator or not command.strip():
+            raise CommandError(f"--server takes LABEL=COMMAND, got '{value}'")
+        return label.strip(), command
+
+    async def _run_level(self, endpoint, concurrency):
+        """Drive one endpoint with concurrency clients in a closed loop"""
+        url = self.options['url'].rstrip('/') + endpoint
+        duration, budget = self.options['duration'], self.options['requests']
+        latencies, errors = [], 0
+        remaining = budget
+
+        async def client_loop(client):
+            nonlocal errors, remaining
+            while True:
+                if budget is not None:
+                    if remaining <= 0:
+                        return
+                    remaining -= 1
+                elif time.perf_counter() >= deadline:
+                    return
+                start = time.perf_counter()
+                try:
+                    response = await client.get(url)
+                    ok = response.status_code < 400
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    latencies.append(time.perf_counter() - start)
+                else:
+                    errors += 1
+
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(timeout=self.options['timeout'], limits=limits) as client:
+            started = time.perf_counter()
+            deadline = started + duration
+            await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+            elapsed = time.perf_counter() - started
+
+        percentiles = (np.percentile(latencies, [50, 95, 99]) * 1000).tolist() if latencies else [None] * 3
+        return {
+            'endpoint': endpoint,
+            'concurrency': concurrency,
+            'requests': len(latencies),
+            'errors': errors,
+            **dict(zip(['p50_ms', 'p95_ms', 'p99_ms'], percentiles)),
+            'requests_per_second': len(latencies) / elapsed if elapsed else 0.0,
+        }
+
+    def _write_row(self, result):
+        def number(value, digits=1):
+            return '-' if value is None else f"{value:.{digits}f}"
+
+        self.stdout.write(
+            f"{result['endpoint'][:32]:<32} {result['concurrency']:5d} {result['requests']:6d} "
+            f"{result['errors']:5d} {number(result['p50_ms']):>8} {number(result['p95_ms']):>8} "
+            f"{number(result['p99_ms']):>8} {number(result['requests_per_second']):>8} "
+            f"{number(result['rss_mb']):>8}"
+        )
+
+    @contextmanager
+    def _fake_npa(self):
+        """URL of an in-process fake NPA while the load test runs, if asked for"""
+        if not self.options['fake_npa']:
+            yield None
+            return
+        server = FakeNPAServer(
+            rows=self.options['npa_rows'], latency=self.options['npa_latency'],
+            jitter=self.options['npa_jitter'], error_rate=self.options['npa_error_rate'],
+        )
+        server.start()
+        self.stdout.write(f"Fake NPA at {server.url}")
+        try:
+            yield server.url
+        finally:
+            server.stop()
+
+    @contextmanager
+    def _server(self, command, npa_url):
+        """Start command, wait until the app answers, and stop it afterwards; yields its pid"""
+        if command is None:
+            yield None
+            return
+        env = dict(os.environ)
+        if npa_url:
+            env['NPA_EXPORT_URL'] = npa_url
+        process = subprocess.Popen(shlex.split(command), env=env)
+        try:
+            self._wait_until_up(process)
+            yield process.pid
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+
+    def _wait_until_up(self, process):
+        url = self.options['url'].rstrip('/') + '/simple-health/'
+        deadline = time.monotonic() + self.options['startup_timeout']
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise CommandError(f"Server exited with status {process.returncode} before answering")
+            try:
+                if httpx.get(url, timeout=1).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.25)
+        raise CommandError(f"Server did not answer {url} within {self.options['startup_timeout']:.0f}s")
@@ -0,0 +1,97 @@
+import random
+import signal
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from bostapp.cache import report_cache
+from bostapp.models import FetchRun
+from bostapp.snapshots import snapshot_store
+from bostapp.views import DataFetcher, PreparedReport, fingerprint_prepared, record_changes, store_orders
+
+
+class Command(BaseCommand):
+    help = "Keep the latest NPA report warm in the shared report cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=int, default=settings.PREFETCH_INTERVAL,
+                            help="Seconds between successful fetches")
+        parser.add_argument('--jitter', type=float, default=settings.PREFETCH_JITTER,
+                            help="Random +/- fraction applied to every wait")
+        parser.add_argument('--max-backoff', type=int, default=settings.PREFETCH_MAX_BACKOFF,
+                            help="Longest wait in seconds after repeated failures")
+        parser.add_argument('--once', action='store_true', help="Fetch once and exit")
+
+    def handle(self, *args, **options):
+        self.stopping = threading.Event()
+        if not options['once']:
+            signal.signal(signal.SIGTERM, lambda *_: self.stopping.set())
+            signal.signal(signal.SIGINT, lambda *_: self.stopping.set())
+
+        interval = options['interval']
+        # Cached reports must outlive the gap between fetches, or users hit a miss
+        ttl = max(report_cache.ttl, interval * 2)
+        failures = 0
+        while not self.stopping.is_set():
+            close_old_connections()
+            succeeded = self.prefetch(ttl)
+            self.prune_snapshots()
+            if options['once']:
+                break
+
+            failures = 0 if succeeded else failures + 1
+            delay = min(interval * 2 ** failures, options['max_backoff']) if failures else interval
+            delay *= 1 + random.uniform(-options['jitter'], options['jitter'])
+            self.stdout.write(f"Next fetch in {delay:.0f}s")
+            self.stopping.wait(delay)
+
+    def prefetch(self, ttl):
+        """Fetch, process and cache one report, recording how it went"""
+        fetcher = DataFetcher()
+        run = FetchRun(started_at=timezone.now())
+
+        start = time.perf_counter()
+        raw, error = fetcher.fetch_data()
+        run.fetch_seconds = time.perf_counter() - start
+        if not error:
+            # A download prepared before is restored whole from its snapshot
+            run.rows_in = len(raw.df if isinstance(raw, PreparedReport) else raw)
+            start = time.perf_counter()
+            prepared, error = fetcher.prepare_data(raw)
+            run.process_seconds = time.perf_counter() - start
+
+        if error:
+            run.error = error
+            self.stderr.write(f"Prefetch failed: {error}")
+        else:
+            run.succeeded = True
+            run.rows_out = len(prepared.df)
+            fingerprint_prepared(prepared)
+            report_cache.put(fetcher.cache_key(), prepared, ttl=ttl, last_good_key=fetcher.last_good_key())
+            store_orders(fetcher, prepared)
+            record_changes(fetcher, prepared)
+            self.stdout.write(
+                f"Prefetched {run.rows_out}/{run.rows_in} rows "
+                f"(fetch {run.fetch_seconds:.2f}s, process {run.process_seconds:.2f}s)"
+            )
+
+        try:
+            run.save()
+        except Exception as e:
+            self.stderr.write(f"Could not record fetch run: {str(e)}")
+        return run.succeeded
+
+    def prune_snapshots(self):
+        """Apply the snapshot retention and size budget here rather than in requests"""
+        if not snapshot_store.enabled:
+            return
+        try:
+            removed = snapshot_store.prune()
+            if removed:
+                self.stdout.write(f"Pruned {removed} snapshots")
+        except Exception as e:
+            self.stderr.write(f"Snapshot prune failed: {str(e)}")
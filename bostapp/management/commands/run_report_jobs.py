@@ -0,0 +1,94 @@
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import signal
+import threading
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+
+from bostapp.jobs import run_job
+from bostapp.models import ReportJob
+
+
+class Command(BaseCommand):
+    help = "Render queued report jobs in a pool of worker processes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.REPORT_JOB_WORKERS,
+                            help="Jobs rendered at the same time, one process each")
+        parser.add_argument('--poll', type=float, default=settings.REPORT_JOB_POLL_SECONDS,
+                            help="Seconds between checks of an idle queue")
+        parser.add_argument('--once', action='store_true', help="Render the queued jobs and exit")
+
+    def handle(self, *args, **options):
+        self.stopping = threading.Event()
+        if not options['once']:
+            signal.signal(signal.SIGTERM, lambda *_: self.stopping.set())
+            signal.signal(signal.SIGINT, lambda *_: self.stopping.set())
+
+        workers = max(options['workers'], 1)
+        while not self.stopping.is_set():
+            # A job that kills its process breaks the pool; start a new one and carry on
+            try:
+                self.serve(workers, options['poll'], options['once'])
+                break
+            except BrokenProcessPool:
+                self.stderr.write("Worker process died; restarting the pool")
+
+    def make_pool(self, workers):
+        # Processes start fresh rather than forking this one's connections and threads
+        connections.close_all()
+        return ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context('spawn'), initializer=django.setup,
+        )
+
+    def serve(self, workers, poll, once):
+        running = {}
+        with self.make_pool(workers) as pool:
+            try:
+                while not self.stopping.is_set():
+                    close_old_connections()
+                    expired, timed_out = ReportJob.objects.expire()
+                    if expired or timed_out:
+                        self.stdout.write(f"Expired {expired} finished jobs, gave up on {timed_out} running ones")
+
+                    while len(running) < workers:
+                        job = ReportJob.objects.claim()
+                        if job is None:
+                            break
+                        self.stdout.write(f"Rendering job {job.id}: {job}")
+                        running[pool.submit(run_job, job.pk)] = job.pk
+
+                    if not running:
+                        if once:
+                            return
+                        self.stopping.wait(poll)
+                        continue
+                    done, _ = wait(running, timeout=poll, return_when=FIRST_COMPLETED)
+                    broken = [self.finished(running.pop(future), future) for future in done]
+                    if any(broken):
+                        raise BrokenProcessPool("A worker process died")
+            finally:
+                # Jobs already rendering finish and record themselves as the pool shuts down
+                for future, job_id in running.items():
+                    if future.done() or future.cancel():
+                        self.finished(job_id, future)
+
+    def finished(self, job_id, future):
+        """Report a job's outcome, failing it if its process could not; True if the pool broke"""
+        if future.cancelled():
+            # Stopped before it started: back in the queue for the next worker
+            ReportJob.objects.filter(pk=job_id, status=ReportJob.RUNNING).update(status=ReportJob.QUEUED)
+            return False
+        error = future.exception()
+        if error is None:
+            self.stdout.write(f"Job {job_id} {future.result()}")
+            return False
+        job = ReportJob.objects.filter(pk=job_id).first()
+        if job is not None:
+            job.fail(f"Worker process failed: {error}")
+        self.stderr.write(f"Job {job_id} failed: {error}")
+        return isinstance(error, BrokenProcessPool)
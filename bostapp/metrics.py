@@ -0,0 +1,140 @@
+"""Pipeline timings for Server-Timing headers and Prometheus metrics
+
+Every stage of fetch -> parse -> prepare -> finalize -> render is timed
+with stage(). The duration goes into a process-wide histogram and, while
+a request is being served, into that request's RequestTimings so the
+middleware can report it in a Server-Timing header.
+
+With PROMETHEUS_MULTIPROC_DIR set (gunicorn.conf.py does this), every
+worker writes its samples to files in that directory and /metrics adds
+them up, so counts are the same whichever worker answers the scrape.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+import os
+import threading
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client import REGISTRY, multiprocess
+
+STAGE_SECONDS = Histogram(
+    'bost_stage_seconds', "Time spent in each report pipeline stage", ['stage'],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60),
+)
+UPSTREAM_BYTES = Histogram(
+    'bost_upstream_bytes', "Size of NPA export downloads",
+    buckets=(1e4, 5e4, 1e5, 5e5, 1e6, 5e6, 2e7),
+)
+UPSTREAM_REQUESTS = Counter('bost_upstream_requests_total', "NPA export requests by outcome", ['outcome'])
+UPSTREAM_BREAKER_OPEN = Gauge(
+    'bost_upstream_breaker_open', "1 while any live worker's NPA circuit breaker is open", multiprocess_mode='livemax',
+)
+REPORT_ROWS = Histogram(
+    'bost_report_rows', "Rows entering preparation (in) and leaving finalization (out)", ['direction'],
+    buckets=(10, 100, 1000, 5000, 10000, 50000, 100000),
+)
+CACHE_LOOKUPS = Counter(
+    'bost_report_cache_lookups_total',
+    "Report cache lookups: hit, miss, stale (last good copy served), or shared with an in-flight load", ['result'],
+)
+SNAPSHOT_LOOKUPS = Counter(
+    'bost_snapshot_lookups_total', "Downloads read back from a stored snapshot (hit) or parsed (miss)", ['result'],
+)
+ARTIFACT_LOOKUPS = Counter(
+    'bost_artifact_cache_lookups_total', "Rendered report lookups: not_modified (304), hit or miss",
+    ['format', 'result'],
+)
+
+_current = ContextVar('bost_request_timings', default=None)
+
+
+class RequestTimings:
+    """Stage durations for one request, filled in from any thread serving it"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.durations = {}
+        self.notes = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds):
+        # Parallel chunks of a range report add up under one name
+        with self._lock:
+            self.durations[name] = self.durations.get(name, 0.0) + seconds
+
+    def note(self, name, description):
+        self.notes[name] = description
+
+    def header(self):
+        """Server-Timing value: each stage in milliseconds, then the total"""
+        parts = [f'{name};desc="{description}"' for name, description in self.notes.items()]
+        parts += [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.durations.items()]
+        parts.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ', '.join(parts)
+
+
+@contextmanager
+def track_request():
+    """Collect stage timings for the request being served in this context"""
+    timings = RequestTimings()
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def stage(name):
+    """Time a pipeline stage into the histogram and the current request's timings"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.labels(name).observe(elapsed)
+        timings = _current.get()
+        if timings is not None:
+            timings.add(name, elapsed)
+
+
+def observe_upstream(outcome, content=None):
+    UPSTREAM_REQUESTS.labels(outcome).inc()
+    if content is not None:
+        UPSTREAM_BYTES.observe(len(content))
+
+
+def observe_rows(direction, count):
+    REPORT_ROWS.labels(direction).observe(count)
+
+
+def observe_cache(result):
+    CACHE_LOOKUPS.labels(result).inc()
+    timings = _current.get()
+    if timings is not None:
+        timings.note('cache', result)
+
+
+def observe_snapshot(result):
+    SNAPSHOT_LOOKUPS.labels(result).inc()
+    timings = _current.get()
+    if timings is not None:
+        timings.note('snapshot', result)
+
+
+def observe_artifact(format, result):
+    ARTIFACT_LOOKUPS.labels(format, result).inc()
+    timings = _current.get()
+    if timings is not None:
+        timings.note('artifact', result)
+
+
+def render():
+    """(body, content type) for a scrape, summed over every worker when multiprocess"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
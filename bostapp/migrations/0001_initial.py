@@ -0,0 +1,35 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order_number', models.CharField(max_length=64, unique=True)),
+                ('order_date', models.DateField(blank=True, null=True)),
+                ('product', models.CharField(blank=True, max_length=64)),
+                ('volume', models.DecimalField(blank=True, decimal_places=2, max_digits=14, null=True)),
+                ('price', models.DecimalField(blank=True, decimal_places=4, max_digits=14, null=True)),
+                ('brv_number', models.CharField(blank=True, max_length=64)),
+                ('bdc', models.CharField(blank=True, max_length=255)),
+                ('depot', models.CharField(max_length=64)),
+                ('fingerprint', models.CharField(max_length=40)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['order_date', 'order_number'],
+                'indexes': [models.Index(fields=['order_date'], name='bostapp_order_date_idx'), models.Index(fields=['depot'], name='bostapp_order_depot_idx')],
+            },
+        ),
+    ]
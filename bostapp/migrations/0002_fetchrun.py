@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bostapp', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FetchRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField(db_index=True)),
+                ('succeeded', models.BooleanField(default=False)),
+                ('fetch_seconds', models.FloatField(blank=True, null=True)),
+                ('process_seconds', models.FloatField(blank=True, null=True)),
+                ('rows_in', models.PositiveIntegerField(default=0)),
+                ('rows_out', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+            ],
+            options={
+                'ordering': ['-started_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:43
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def summarize_stored_orders(apps, schema_editor):
+    """Build the summary for orders stored before it existed"""
+    OrderRecord = apps.get_model('bostapp', 'OrderRecord')
+    OrderSummary = apps.get_model('bostapp', 'OrderSummary')
+    groups = OrderRecord.objects.values('depot', 'order_date', 'product', 'bdc').annotate(
+        total_volume=Sum('volume'), total_orders=Count('id')).order_by()
+    OrderSummary.objects.bulk_create([
+        OrderSummary(
+            depot=group['depot'], order_date=group['order_date'], product=group['product'], bdc=group['bdc'],
+            volume=group['total_volume'] or 0, orders=group['total_orders'],
+        )
+        for group in groups
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bostapp', '0002_fetchrun'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depot', models.CharField(max_length=64)),
+                ('order_date', models.DateField(blank=True, null=True)),
+                ('product', models.CharField(blank=True, max_length=64)),
+                ('bdc', models.CharField(blank=True, max_length=255)),
+                ('volume', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('orders', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['depot', 'order_date', 'product', 'bdc'],
+                'indexes': [models.Index(fields=['depot', 'order_date'], name='bostapp_summary_date_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='ordersummary',
+            constraint=models.UniqueConstraint(fields=('depot', 'order_date', 'product', 'bdc'), name='bostapp_summary_key'),
+        ),
+        migrations.RunPython(summarize_stored_orders, migrations.RunPython.noop),
+    ]
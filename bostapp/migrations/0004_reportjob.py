@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:49
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bostapp', '0003_ordersummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('params_hash', models.CharField(db_index=True, max_length=40)),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField()),
+                ('depot', models.CharField(max_length=64)),
+                ('format', models.CharField(choices=[('pdf', 'pdf'), ('csv', 'csv'), ('parquet', 'parquet')], max_length=16)),
+                ('chunk', models.CharField(blank=True, max_length=8)),
+                ('status', models.CharField(choices=[('queued', 'queued'), ('running', 'running'), ('done', 'done'), ('failed', 'failed'), ('expired', 'expired')], db_index=True, default='queued', max_length=16)),
+                ('progress', models.FloatField(default=0.0)),
+                ('message', models.CharField(blank=True, max_length=255)),
+                ('error', models.TextField(blank=True)),
+                ('artifact', models.CharField(blank=True, max_length=512)),
+                ('artifact_bytes', models.PositiveBigIntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
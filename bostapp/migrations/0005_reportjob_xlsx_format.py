@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bostapp', '0004_reportjob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='reportjob',
+            name='format',
+            field=models.CharField(choices=[('pdf', 'pdf'), ('csv', 'csv'), ('parquet', 'parquet'), ('xlsx', 'xlsx')], max_length=16),
+        ),
+    ]
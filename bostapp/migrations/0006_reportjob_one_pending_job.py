@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:46
+
+from django.db import migrations, models
+
+
+def fail_duplicate_pending_jobs(apps, schema_editor):
+    """Keep only the newest queued or running job per parameters"""
+    ReportJob = apps.get_model('bostapp', 'ReportJob')
+    seen = set()
+    duplicates = []
+    pending = ReportJob.objects.filter(status__in=['queued', 'running']).order_by('-created_at')
+    for job_id, params_hash in pending.values_list('id', 'params_hash'):
+        if params_hash in seen:
+            duplicates.append(job_id)
+        seen.add(params_hash)
+    ReportJob.objects.filter(id__in=duplicates).update(status='failed', error='Superseded by a duplicate job')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bostapp', '0005_reportjob_xlsx_format'),
+    ]
+
+    operations = [
+        migrations.RunPython(fail_duplicate_pending_jobs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='reportjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['queued', 'running'])), fields=('params_hash',), name='one_pending_job'),
+        ),
+    ]
@@ -1,3 +1,411 @@
-from django.db import models
+from collections import defaultdict
+import datetime
+from decimal import Decimal, InvalidOperation
+import hashlib
+import json
+from pathlib import Path
+import uuid
 
-# Create your models here.
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
+from django.db.models import Q, Sum
+from django.utils import timezone
+import pandas as pd
+
+from .schema import NUMBER_COLUMNS, conform, format_number
+from .summary import SUMMARY_KEYS
+
+# Processed report column -> OrderRecord field
+REPORT_FIELDS = {
+    'ORDER DATE': 'order_date',
+    'ORDER NUMBER': 'order_number',
+    'PRODUCTS': 'product',
+    'VOLUME': 'volume',
+    'EX REF PRICE': 'price',
+    'BRV NUMBER': 'brv_number',
+    'BDC': 'bdc',
+}
+
+
+def _to_decimal(value):
+    if value is None or pd.isna(value):
+        return None
+    try:
+        return Decimal(format_number(value))
+    except InvalidOperation:
+        return None
+
+
+def _to_text(value):
+    return '' if value is None or pd.isna(value) else str(value)
+
+
+class OrderRecordQuerySet(models.QuerySet):
+    """Bulk ingestion helpers for processed report snapshots"""
+
+    batch_size = 500
+
+    def upsert_frame(self, df, depot):
+        """Insert new and update changed orders from a processed report
+
+        Rows are keyed on ORDER NUMBER; rows without one (group headings)
+        are skipped. Returns a (created, updated) tuple of row counts.
+        """
+        records = self._records_from_frame(df, depot)
+        if not records:
+            return 0, 0
+
+        existing = {}
+        numbers = list(records)
+        for start in range(0, len(numbers), self.batch_size):
+            batch = numbers[start:start + self.batch_size]
+            existing.update(
+                (record.order_number, record)
+                for record in self.filter(order_number__in=batch).only(
+                    'id', 'order_number', 'fingerprint', 'volume', *OrderSummary.KEY_FIELDS)
+            )
+
+        now = timezone.now()
+        to_create = []
+        to_update = []
+        replaced = []
+        for number, record in records.items():
+            current = existing.get(number)
+            if current is None:
+                to_create.append(record)
+            elif current.fingerprint != record.fingerprint:
+                record.pk = current.pk
+                record.updated_at = now
+                to_update.append(record)
+                replaced.append(current)
+
+        with transaction.atomic(using=self.db):
+            self.bulk_create(to_create, batch_size=self.batch_size)
+            self.bulk_update(to_update, OrderRecord.UPSERT_FIELDS, batch_size=self.batch_size)
+            OrderSummary.objects.using(self.db).apply(added=to_create + to_update, removed=replaced)
+        return len(to_create), len(to_update)
+
+    def _records_from_frame(self, df, depot):
+        columns = [column for column in REPORT_FIELDS if column in df.columns]
+        df = df[columns]
+        if 'ORDER NUMBER' not in df.columns:
+            return {}
+        df = df[df['ORDER NUMBER'].notna()]
+
+        records = {}
+        for row in df.itertuples(index=False, name=None):
+            values = dict(zip((REPORT_FIELDS[column] for column in columns), row))
+            order_date = values.get('order_date', pd.NaT)
+            record = OrderRecord(
+                order_number=values['order_number'],
+                order_date=None if pd.isna(order_date) else order_date.date(),
+                product=_to_text(values.get('product')),
+                volume=_to_decimal(values.get('volume')),
+                price=_to_decimal(values.get('price')),
+                brv_number=_to_text(values.get('brv_number')),
+                bdc=_to_text(values.get('bdc')),
+                depot=depot,
+            )
+            record.fingerprint = record.compute_fingerprint()
+            # Later rows win if the report repeats an order number
+            records[record.order_number] = record
+        return records
+
+    def to_report_frame(self):
+        """The stored orders as a processed report, in the typed schema
+
+        Stored reports have no group heading rows.
+        """
+        fields = list(REPORT_FIELDS.values())
+        rows = list(self.order_by('order_date', 'order_number').values_list(*fields))
+        df = pd.DataFrame(rows, columns=list(REPORT_FIELDS.keys()), dtype=object)
+        df = df.where(df.ne(''), None)
+        df['ORDER DATE'] = pd.to_datetime(df['ORDER DATE'])
+        for column in NUMBER_COLUMNS:
+            df[column] = df[column].astype('float64')
+        return conform(df)
+
+
+class OrderRecord(models.Model):
+    """One order from the NPA daily order report"""
+
+    UPSERT_FIELDS = ['order_date', 'product', 'volume', 'price', 'brv_number', 'bdc', 'depot', 'fingerprint', 'updated_at']
+
+    order_number = models.CharField(max_length=64, unique=True)
+    order_date = models.DateField(null=True, blank=True)
+    product = models.CharField(max_length=64, blank=True)
+    volume = models.DecimalField(max_digits=14, decimal_places=2, null=True, blank=True)
+    price = models.DecimalField(max_digits=14, decimal_places=4, null=True, blank=True)
+    brv_number = models.CharField(max_length=64, blank=True)
+    bdc = models.CharField(max_length=255, blank=True)
+    depot = models.CharField(max_length=64)
+    fingerprint = models.CharField(max_length=40)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = OrderRecordQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['order_date', 'order_number']
+        indexes = [
+            models.Index(fields=['order_date'], name='bostapp_order_date_idx'),
+            models.Index(fields=['depot'], name='bostapp_order_depot_idx'),
+        ]
+
+    def __str__(self):
+        return self.order_number
+
+    def compute_fingerprint(self):
+        """Hash of the reported values, used to skip unchanged rows on upsert"""
+        values = [self.order_date, self.product, self.volume, self.price, self.brv_number, self.bdc, self.depot]
+        return hashlib.sha1('|'.join('' if value is None else str(value) for value in values).encode('utf-8')).hexdigest()
+
+
+class OrderSummaryQuerySet(models.QuerySet):
+    """Incremental upkeep and roll-ups of the order summary"""
+
+    def apply(self, added=(), removed=()):
+        """Count added OrderRecords into their summary rows and take removed ones out
+
+        Called inside upsert_frame's transaction, with the stored versions of
+        changed orders as removed, so totals always match OrderRecord.
+        """
+        deltas = defaultdict(lambda: [Decimal(0), 0])
+        for records, sign in ((added, 1), (removed, -1)):
+            for record in records:
+                delta = deltas[OrderSummary.key_of(record)]
+                delta[0] += sign * OrderSummary.volume_of(record)
+                delta[1] += sign
+        deltas = {key: delta for key, delta in deltas.items() if any(delta)}
+        if not deltas:
+            return
+
+        dates = {order_date for _, order_date, _, _ in deltas if order_date is not None}
+        on_dates = Q(order_date__in=dates)
+        if any(order_date is None for _, order_date, _, _ in deltas):
+            on_dates |= Q(order_date__isnull=True)
+        rows = self.select_for_update().filter(on_dates, depot__in={depot for depot, _, _, _ in deltas})
+        existing = {OrderSummary.key_of(row): row for row in rows}
+
+        to_create, to_update, to_delete = [], [], []
+        for key, (volume, orders) in deltas.items():
+            row = existing.get(key)
+            if row is None:
+                to_create.append(OrderSummary(**dict(zip(OrderSummary.KEY_FIELDS, key)), volume=volume, orders=orders))
+                continue
+            row.volume += volume
+            row.orders += orders
+            (to_update if row.orders > 0 else to_delete).append(row)
+        self.bulk_create(to_create)
+        self.bulk_update(to_update, ['volume', 'orders'])
+        self.filter(pk__in=[row.pk for row in to_delete]).delete()
+
+    def totals(self, by):
+        """(volume, orders) totals per combination of the fields in by, in field order"""
+        return self.values(*by).annotate(total_volume=Sum('volume'), total_orders=Sum('orders')).order_by(*by)
+
+    def to_summary_frame(self):
+        """The summary rows as a summarize() frame, with VOLUME and ORDERS per ORDER DATE, PRODUCTS and BDC"""
+        fields = ['order_date', 'product', 'bdc', 'volume', 'orders']
+        rows = list(self.order_by(*fields[:3]).values_list(*fields))
+        df = pd.DataFrame(rows, columns=[*SUMMARY_KEYS, 'VOLUME', 'ORDERS'], dtype=object)
+        df[SUMMARY_KEYS[1:]] = df[SUMMARY_KEYS[1:]].where(df[SUMMARY_KEYS[1:]].ne(''), None)
+        df['ORDER DATE'] = pd.to_datetime(df['ORDER DATE'])
+        return df.astype({'VOLUME': 'float64', 'ORDERS': 'int64'})
+
+
+class OrderSummary(models.Model):
+    """Volume and order count of one depot's orders per order date, product and BDC
+
+    Kept in step with OrderRecord by upsert_frame rather than recomputed.
+    """
+
+    KEY_FIELDS = ['depot', 'order_date', 'product', 'bdc']
+    VOLUME_STEP = Decimal('0.01')
+
+    depot = models.CharField(max_length=64)
+    order_date = models.DateField(null=True, blank=True)
+    product = models.CharField(max_length=64, blank=True)
+    bdc = models.CharField(max_length=255, blank=True)
+    volume = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    orders = models.PositiveIntegerField(default=0)
+
+    objects = OrderSummaryQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['depot', 'order_date', 'product', 'bdc']
+        constraints = [
+            models.UniqueConstraint(fields=['depot', 'order_date', 'product', 'bdc'], name='bostapp_summary_key'),
+        ]
+        indexes = [
+            models.Index(fields=['depot', 'order_date'], name='bostapp_summary_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.depot} {self.order_date} {self.product} {self.bdc}"
+
+    @classmethod
+    def key_of(cls, record):
+        return tuple(getattr(record, field) for field in cls.KEY_FIELDS)
+
+    @classmethod
+    def volume_of(cls, record):
+        # Rounded as the volume column stores it, so adding and removing an order cancel out
+        return (record.volume or Decimal(0)).quantize(cls.VOLUME_STEP)
+
+
+class FetchRun(models.Model):
+    """One upstream fetch made by the prefetch worker"""
+
+    started_at = models.DateTimeField(db_index=True)
+    succeeded = models.BooleanField(default=False)
+    fetch_seconds = models.FloatField(null=True, blank=True)
+    process_seconds = models.FloatField(null=True, blank=True)
+    rows_in = models.PositiveIntegerField(default=0)
+    rows_out = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['-started_at']
+
+    def __str__(self):
+        status = 'ok' if self.succeeded else 'failed'
+        return f"{self.started_at:%Y-%m-%d %H:%M:%S} {status}"
+
+
+class ReportJobQuerySet(models.QuerySet):
+    """Submitting, claiming and expiring background report jobs"""
+
+    def submit(self, start_date, end_date, depot, format, chunk=''):
+        """(job, created): the queued, running or fresh finished job for these parameters, or a new one
+
+        The one_pending_job constraint decides between simultaneous submits:
+        the insert that loses finds the winner's job on its next lookup.
+        """
+        params_hash = ReportJob.hash_params(start_date, end_date, depot, format, chunk)
+        fresh = timezone.now() - datetime.timedelta(seconds=settings.REPORT_JOB_RESULT_TTL)
+        live = Q(status__in=ReportJob.PENDING) | Q(status=ReportJob.DONE, finished_at__gte=fresh)
+        for attempt in range(3):
+            job = self.filter(live, params_hash=params_hash).order_by('-created_at').first()
+            if job is not None:
+                return job, False
+            try:
+                with transaction.atomic(using=self.db):
+                    return self.create(
+                        params_hash=params_hash, start_date=start_date, end_date=end_date,
+                        depot=depot, format=format, chunk=chunk,
+                    ), True
+            except IntegrityError:
+                if attempt == 2:
+                    raise
+
+    def claim(self):
+        """Mark the oldest queued job running and return it, or None when the queue is empty
+
+        The conditional update lets several workers share one queue without
+        running a job twice.
+        """
+        for job in self.filter(status=ReportJob.QUEUED).order_by('created_at')[:10]:
+            now = timezone.now()
+            if self.filter(pk=job.pk, status=ReportJob.QUEUED).update(status=ReportJob.RUNNING, started_at=now):
+                job.status, job.started_at = ReportJob.RUNNING, now
+                return job
+        return None
+
+    def expire(self):
+        """Remove finished files past REPORT_JOB_RESULT_TTL and fail jobs running past REPORT_JOB_TIMEOUT
+
+        Returns (expired, timed_out) job counts.
+        """
+        now = timezone.now()
+        finished = self.filter(
+            status=ReportJob.DONE,
+            finished_at__lt=now - datetime.timedelta(seconds=settings.REPORT_JOB_RESULT_TTL),
+        )
+        expired = 0
+        for job in finished:
+            if job.artifact:
+                Path(job.artifact).unlink(missing_ok=True)
+            expired += self.filter(pk=job.pk, status=ReportJob.DONE).update(status=ReportJob.EXPIRED, artifact='')
+        # A worker that died mid-job never finishes it
+        timed_out = self.filter(
+            status=ReportJob.RUNNING,
+            started_at__lt=now - datetime.timedelta(seconds=settings.REPORT_JOB_TIMEOUT),
+        ).update(status=ReportJob.FAILED, error="Timed out", finished_at=now)
+        return expired, timed_out
+
+
+class ReportJob(models.Model):
+    """A report rendered to a file in the background by manage.py run_report_jobs"""
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    EXPIRED = 'expired'
+    STATUS_CHOICES = [(status, status) for status in (QUEUED, RUNNING, DONE, FAILED, EXPIRED)]
+    # At most one job per parameters may be in these states
+    PENDING = (QUEUED, RUNNING)
+    # Format -> (file extension, content type)
+    FORMATS = {
+        'pdf': ('pdf', 'application/pdf'),
+        'csv': ('csv', 'text/csv'),
+        'parquet': ('parquet', 'application/vnd.apache.parquet'),
+        'xlsx': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    }
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    params_hash = models.CharField(max_length=40, db_index=True)
+    start_date = models.DateField()
+    end_date = models.DateField()
+    depot = models.CharField(max_length=64)
+    format = models.CharField(max_length=16, choices=[(name, name) for name in FORMATS])
+    chunk = models.CharField(max_length=8, blank=True)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=QUEUED, db_index=True)
+    progress = models.FloatField(default=0.0)
+    message = models.CharField(max_length=255, blank=True)
+    error = models.TextField(blank=True)
+    artifact = models.CharField(max_length=512, blank=True)
+    artifact_bytes = models.PositiveBigIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    objects = ReportJobQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['params_hash'], condition=Q(status__in=['queued', 'running']), name='one_pending_job',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.format} {self.depot} {self.start_date}..{self.end_date} {self.status}"
+
+    @staticmethod
+    def hash_params(start_date, end_date, depot, format, chunk=''):
+        params = [start_date.isoformat(), end_date.isoformat(), depot, format, chunk]
+        return hashlib.sha1(json.dumps(params).encode('utf-8')).hexdigest()
+
+    @property
+    def extension(self):
+        return self.FORMATS[self.format][0]
+
+    @property
+    def content_type(self):
+        return self.FORMATS[self.format][1]
+
+    def report_progress(self, progress, message):
+        self.progress, self.message = progress, message
+        ReportJob.objects.filter(pk=self.pk).update(progress=progress, message=message)
+
+    def complete(self, artifact, size):
+        self.status, self.progress, self.message = ReportJob.DONE, 1.0, ''
+        self.artifact, self.artifact_bytes, self.finished_at = str(artifact), size, timezone.now()
+        self.save(update_fields=['status', 'progress', 'message', 'artifact', 'artifact_bytes', 'finished_at'])
+
+    def fail(self, error):
+        self.status, self.error, self.finished_at = ReportJob.FAILED, error, timezone.now()
+        self.save(update_fields=['status', 'error', 'finished_at'])
@@ -0,0 +1,172 @@
+"""Column indexes over one depot's processed orders, for the JSON orders API
+
+An OrderIndex is built once per depot and report content in each worker
+and kept in an in-process LRU, so filtering a page of orders is a handful
+of lookups and sorted array intersections instead of a scan of the report
+per request. Indexes stay out of the shared report cache: pickled, they
+are several times the size of the report itself.
+"""
+import base64
+import binascii
+from collections import OrderedDict
+import threading
+
+from django.conf import settings
+import numpy as np
+import pandas as pd
+
+from .models import REPORT_FIELDS
+from .schema import DATE_FORMAT
+
+# Query parameter -> processed report column answered from a value index
+FILTER_COLUMNS = {
+    'product': 'PRODUCTS',
+    'bdc': 'BDC',
+    'brv': 'BRV NUMBER',
+}
+
+_EMPTY = np.empty(0, dtype=np.intp)
+
+
+def normalize_value(value):
+    return ' '.join(str(value).split()).upper()
+
+
+def encode_cursor(order_number):
+    return base64.urlsafe_b64encode(order_number.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Order number a cursor points after; ValueError if it is malformed"""
+    try:
+        return base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+    except (binascii.Error, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+
+
+class OrderIndex:
+    """One depot's orders as rows of API fields, with per-column indexes
+
+    Rows without an ORDER NUMBER (group headings) are left out. Positions
+    follow the report's order, so every index maps to sorted arrays. Row
+    values are ready for JSON: ISO dates, numbers, and None for blanks.
+    """
+
+    def __init__(self, df):
+        columns = [column for column in REPORT_FIELDS if column in df.columns]
+        if 'ORDER NUMBER' in columns:
+            df = df[df['ORDER NUMBER'].notna()]
+        else:
+            df = df.iloc[:0]
+        df = df[columns]
+
+        self.fields = [REPORT_FIELDS[column] for column in columns]
+        dates = pd.Series(pd.NaT, index=df.index, dtype='datetime64[ns]')
+        if 'ORDER DATE' in df.columns:
+            dates = df['ORDER DATE']
+            df = df.assign(**{'ORDER DATE': dates.dt.strftime(DATE_FORMAT)})
+        df = df.astype(object)
+        self.rows = df.where(df.notna(), None).to_numpy(dtype=object)
+        self.order_positions = {number: position for position, number in enumerate(df.get('ORDER NUMBER', []))}
+
+        self.values = {}
+        for name, column in FILTER_COLUMNS.items():
+            if column not in df.columns:
+                continue
+            codes, uniques = pd.factorize(df[column].map(normalize_value))
+            order = np.argsort(codes, kind='stable')
+            bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+            self.values[name] = {
+                value: order[bounds[code]:bounds[code + 1]] for code, value in enumerate(uniques)
+            }
+
+        # Dated orders sorted by date for range lookups
+        day = dates.to_numpy(dtype='datetime64[D]')
+        dated = np.flatnonzero(~np.isnat(day))
+        self.date_order = dated[np.argsort(day[dated], kind='stable')]
+        self.sorted_dates = day[self.date_order]
+
+    def __len__(self):
+        return len(self.rows)
+
+    def match(self, date_from=None, date_to=None, **filters):
+        """Sorted positions of the orders matching every filter
+
+        filters maps FILTER_COLUMNS names to lists of accepted values;
+        date_from and date_to bound ORDER DATE inclusively.
+        """
+        result = None
+        for name, wanted in filters.items():
+            if not wanted:
+                continue
+            index = self.values.get(name, {})
+            postings = [index.get(normalize_value(value), _EMPTY) for value in wanted]
+            positions = np.unique(np.concatenate(postings))
+            result = positions if result is None else np.intersect1d(result, positions, assume_unique=True)
+
+        if date_from is not None or date_to is not None:
+            low, high = 0, len(self.sorted_dates)
+            if date_from is not None:
+                low = np.searchsorted(self.sorted_dates, np.datetime64(date_from, 'D'), 'left')
+            if date_to is not None:
+                high = np.searchsorted(self.sorted_dates, np.datetime64(date_to, 'D'), 'right')
+            positions = np.sort(self.date_order[low:high])
+            result = positions if result is None else np.intersect1d(result, positions, assume_unique=True)
+
+        return np.arange(len(self.rows)) if result is None else result
+
+    def page(self, positions, after=None, limit=100, fields=None):
+        """(rows, next_cursor) for up to limit matches after the order number after
+
+        rows are lists of the requested fields; next_cursor is None on the
+        last page. Raises ValueError for a cursor that is not in this snapshot.
+        """
+        start = 0
+        if after is not None:
+            if after not in self.order_positions:
+                raise ValueError("Cursor does not match the current report; start again without it")
+            start = np.searchsorted(positions, self.order_positions[after], 'right')
+        selected = positions[start:start + limit]
+        columns = [self.fields.index(field) for field in fields or self.fields]
+        rows = self.rows[np.ix_(selected, columns)].tolist()
+
+        next_cursor = None
+        if start + limit < len(positions):
+            next_cursor = encode_cursor(self.rows[selected[-1], self.fields.index('order_number')])
+        return rows, next_cursor
+
+
+class OrderIndexCache:
+    """In-process LRU of OrderIndex objects, keyed by report fingerprint and depot"""
+
+    def __init__(self, max_entries=None):
+        self._max_entries = max_entries
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def max_entries(self):
+        return self._max_entries if self._max_entries is not None else settings.ORDER_INDEX_CACHE_ENTRIES
+
+    def get_or_build(self, key, build):
+        """The index cached under key, or build()'s result, cached unless it is None"""
+        with self._lock:
+            index = self._items.get(key)
+            if index is not None:
+                self._items.move_to_end(key)
+                return index
+        # Built outside the lock; two workers' threads racing build the same index twice at worst
+        index = build()
+        if index is not None:
+            with self._lock:
+                self._items[key] = index
+                while len(self._items) > self.max_entries:
+                    self._items.popitem(last=False)
+        return index
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+order_indexes = OrderIndexCache()
@@ -0,0 +1,108 @@
+"""Synthetic NPA ExportDailyOrderReport data for tests and benchmarks"""
+import datetime
+from io import BytesIO
+import random
+
+import numpy as np
+from openpyxl import Workbook
+import pandas as pd
+
+NUM_COLUMNS = 21
+HEADER_ROWS = 7
+
+PRODUCTS = ['PREMIUM', 'GASOIL', 'LPG', 'KEROSENE', 'PREMIX']
+BDCS = [
+    'GOIL COMPANY LIMITED',
+    'STAR OIL COMPANY LIMITED',
+    'JUWEL ENERGY LIMITED',
+    'Finance Petroleum Ltd',  # holds 'nan', which must survive blanking the missing cells
+    'DOMINION ENERGY',
+]
+DEPOTS = ['BOST-KUMASI', 'BOST - KUMASI', 'BOST-ACCRA PLAINS', 'BOST - TAKORADI', 'BOST-BUIPE']
+OMC_GROUPS = ['VEROS PETROLEUM LIMITED', 'VEROS PETROLEUM LIMITED - KUMASI']
+
+
+def _header_rows():
+    rows = [[np.nan] * NUM_COLUMNS for _ in range(HEADER_ROWS)]
+    rows[0][0] = 'NATIONAL PETROLEUM AUTHORITY'
+    rows[1][0] = 'DAILY ORDER REPORT'
+    rows[3][0] = 'OMC'
+    rows[3][2] = 'VEROS PETROLEUM LIMITED'
+    captions = {
+        0: 'ORDER DATE', 2: 'ORDER NUMBER', 5: 'PRODUCTS', 6: 'OMC', 9: 'VOLUME',
+        10: 'EX REF PRICE', 12: 'BRV NUMBER', 15: 'BDC', 17: 'DEPOT', 19: 'STATUS', 20: 'REMARKS',
+    }
+    for index, caption in captions.items():
+        rows[6][index] = caption
+    return rows
+
+
+def make_report_frame(rows=100, seed=0, start_date=None, first_order=1):
+    """Build a frame shaped like pd.read_excel() output for an NPA export
+
+    Data rows are grouped per OMC and day, each group opening with a
+    heading row (only the first column filled) and closing with a
+    'Total #' subtotal row. Blank rows, other depots and rows with an
+    empty last column are mixed in the way the upstream report does.
+    """
+    rng = random.Random(seed)
+    start_date = start_date or datetime.datetime(2025, 6, 23)
+    data = _header_rows()
+    order_no = 0
+    group = 0
+    while order_no < rows:
+        day = start_date + datetime.timedelta(days=group // len(OMC_GROUPS))
+        omc = OMC_GROUPS[group % len(OMC_GROUPS)]
+        group += 1
+
+        heading = [np.nan] * NUM_COLUMNS
+        heading[0] = omc
+        data.append(heading)
+
+        group_volume = 0
+        for _ in range(min(rng.randint(3, 25), rows - order_no)):
+            order_no += 1
+            volume = rng.choice([9000, 18000, 27000, 36000, 54000])
+            group_volume += volume
+            row = [np.nan] * NUM_COLUMNS
+            row[0] = day
+            row[2] = f"VP-{first_order + order_no - 1:07d}"
+            row[5] = rng.choice(PRODUCTS)
+            row[6] = omc
+            row[9] = volume
+            row[10] = round(rng.uniform(9.5, 15.5), 4)
+            row[12] = f"GR {rng.randint(1000, 9999)}-{rng.randint(10, 25)}"
+            row[15] = rng.choice(BDCS)
+            row[17] = rng.choice(DEPOTS)
+            row[19] = 'APPROVED'
+            if rng.random() > 0.1:
+                row[20] = 'LOADED'
+            data.append(row)
+            if rng.random() < 0.03:
+                data.append([np.nan] * NUM_COLUMNS)
+
+        total = [np.nan] * NUM_COLUMNS
+        total[0] = f"Total # {omc}"
+        total[9] = group_volume
+        data.append(total)
+
+    columns = [f"Unnamed: {index}" for index in range(NUM_COLUMNS)]
+    return pd.DataFrame(data, columns=columns, dtype=object)
+
+
+def make_report_workbook(rows=100, seed=0, start_date=None, first_order=1):
+    """Excel bytes of an NPA export holding make_report_frame()'s rows
+
+    Reading it back with pd.read_excel gives the same report, so tests and
+    benchmarks can exercise the Excel parsing as well as the processing.
+    """
+    df = make_report_frame(rows, seed=seed, start_date=start_date, first_order=first_order)
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    # read_excel takes the first row as the header; left blank it yields the 'Unnamed: N' columns
+    sheet.append([])
+    for values in df.itertuples(index=False):
+        sheet.append([None if value is np.nan else value for value in values])
+    buffer = BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
@@ -0,0 +1,139 @@
+"""Typed schema of a processed report, and its text rendering for CSV and PDF
+
+A processed report keeps ORDER DATE as datetimes, VOLUME and EX REF PRICE
+as floats and PRODUCTS/BDC as categoricals; blank cells are missing values
+rather than empty strings. Group headings that NPA puts in the ORDER DATE
+column (text that is not a date) move to a HEADING column, so the date
+column stays typed.
+
+Exports show the text NPA sent. Where a typed cell would not render back
+to its source text ('54,000', '01-05-2024 13:45', 'TBD' in VOLUME), that
+text is kept in a categorical '<column> TEXT' column, which display_frame
+shows in place of the typed value. Reports whose cells all round-trip
+carry no such column.
+"""
+import numpy as np
+import pandas as pd
+
+# Raw export column -> processed report column, in report order
+REPORT_COLUMNS = {
+    'Unnamed: 0': 'ORDER DATE',
+    'Unnamed: 2': 'ORDER NUMBER',
+    'Unnamed: 5': 'PRODUCTS',
+    'Unnamed: 9': 'VOLUME',
+    'Unnamed: 10': 'EX REF PRICE',
+    'Unnamed: 12': 'BRV NUMBER',
+    'Unnamed: 15': 'BDC',
+}
+HEADING = 'HEADING'
+NUMBER_COLUMNS = ('VOLUME', 'EX REF PRICE')
+# Typed column -> column holding its source text where the two differ
+TEXT_COLUMNS = {column: f"{column} TEXT" for column in ('ORDER DATE', *NUMBER_COLUMNS)}
+# Columns that only feed the rendering of the others
+AUXILIARY_COLUMNS = (HEADING, *TEXT_COLUMNS.values())
+COLUMN_ORDER = [*REPORT_COLUMNS.values(), *AUXILIARY_COLUMNS]
+CATEGORY_COLUMNS = ('PRODUCTS', 'BDC', *AUXILIARY_COLUMNS)
+# ISO dates for the JSON API; exports render dates as str() of a datetime cell did
+DATE_FORMAT = '%Y-%m-%d'
+DISPLAY_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def parse_order_dates(values):
+    """Parse ORDER DATE strings, which arrive as ISO timestamps or dd-mm-yyyy"""
+    dates = pd.to_datetime(values, errors='coerce', format='ISO8601')
+    # Headings share the column; only text starting with a digit can be a date
+    missing = dates.isna() & values.str.match(r'\s*\d')
+    if missing.any():
+        dates[missing] = pd.to_datetime(values[missing], errors='coerce', dayfirst=True, format='mixed')
+    return dates
+
+
+def parse_numbers(values):
+    """Parse numeric text such as '54,000' or '9.6339'; anything else is NaN"""
+    return pd.to_numeric(values.str.replace(',', '', regex=False), errors='coerce').astype('float64')
+
+
+def type_report(df):
+    """Typed report from processed report text columns
+
+    Each column is typed over its distinct values and expanded back by
+    position, so repeated dates, products and volumes are parsed once.
+    """
+    typed = {}
+    for column in df.columns:
+        codes, uniques = pd.factorize(df[column])
+        text = pd.Series(uniques, dtype=object).str.strip()
+        text = text.where(text.ne(''))
+        if column == 'ORDER DATE':
+            dates = parse_order_dates(text.fillna(''))
+            typed[column] = dates.to_numpy()[codes]
+            headings = text.where(dates.isna())
+            typed[HEADING] = pd.Categorical.from_codes(*_category_codes(headings, codes))
+            # Text that is no date is a heading already
+            rendered = _render_values(dates, lambda value: value.strftime(DISPLAY_DATE_FORMAT))
+            _keep_source_text(typed, column, uniques, np.where(dates.isna(), uniques, rendered), codes)
+        elif column in NUMBER_COLUMNS:
+            numbers = parse_numbers(text)
+            typed[column] = numbers.to_numpy()[codes]
+            _keep_source_text(typed, column, uniques, _render_values(numbers, format_number), codes)
+        elif column in CATEGORY_COLUMNS:
+            typed[column] = pd.Categorical.from_codes(*_category_codes(text, codes))
+        else:
+            typed[column] = text.to_numpy(dtype=object)[codes]
+    return conform(pd.DataFrame(typed, index=df.index))
+
+
+def _keep_source_text(typed, column, uniques, rendered, codes):
+    """Add column's TEXT column if any source text differs from its rendered typed value"""
+    source = pd.Series(uniques, dtype=object).fillna('').astype(str)
+    kept = source.where(source.ne(rendered) & source.str.strip().ne(''))
+    if kept.notna().any():
+        typed[TEXT_COLUMNS[column]] = pd.Categorical.from_codes(*_category_codes(kept, codes))
+
+
+def _category_codes(uniques, codes):
+    """(codes, sorted categories) of a categorical from per-unique values, NaN meaning missing"""
+    category_codes, categories = pd.factorize(uniques, sort=True)
+    return category_codes[codes], categories
+
+
+def conform(df):
+    """Restore schema dtypes and column order, e.g. after concatenating reports"""
+    df = df.reindex(columns=[column for column in COLUMN_ORDER if column in df.columns])
+    for column in CATEGORY_COLUMNS:
+        if column in df.columns and not isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype('category')
+    return df
+
+
+def format_number(value):
+    """Shortest text that reads back as value: 9000.0 -> '9000', 9.6339 -> '9.6339'"""
+    return np.format_float_positional(value, trim='-')
+
+
+def display_frame(df):
+    """The report as text cells, '' for blanks, with source text and headings put back"""
+    columns = {}
+    for column in df.columns:
+        if column in AUXILIARY_COLUMNS:
+            continue
+        values = df[column]
+        if pd.api.types.is_datetime64_any_dtype(values):
+            columns[column] = _render_values(values, lambda value: value.strftime(DISPLAY_DATE_FORMAT))
+        elif pd.api.types.is_float_dtype(values):
+            columns[column] = _render_values(values, format_number)
+        else:
+            columns[column] = _render_values(values, str)
+        if TEXT_COLUMNS.get(column) in df.columns:
+            source = _render_values(df[TEXT_COLUMNS[column]], str)
+            columns[column] = np.where(source != '', source, columns[column])
+    if HEADING in df.columns and 'ORDER DATE' in columns:
+        headings = _render_values(df[HEADING], str)
+        columns['ORDER DATE'] = np.where(headings != '', headings, columns['ORDER DATE'])
+    return pd.DataFrame(columns, index=df.index, dtype=object)
+
+
+def _render_values(values, render):
+    # Reports repeat dates, products and volumes heavily, so render each value once
+    codes, uniques = pd.factorize(values)
+    return np.array([render(value) for value in uniques] + [''], dtype=object)[codes]
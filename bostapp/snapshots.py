@@ -0,0 +1,223 @@
+"""On-disk snapshots of NPA downloads: the raw export, its parsed frame and its prepared report
+
+Parsing and preparing the Excel export are the slowest steps of the
+pipeline, and NPA often returns the same report several fetches in a
+row. Each distinct download is saved once, keyed by content_digest:
+raw.xlsx as received, report.arrow, the cleaned frame read_report
+produced, and prepared.arrow, the typed report prepare_data built from
+it with its depot index, fallback rows and headings as extra columns.
+Both frames are uncompressed Arrow IPC files read through a memory map,
+so the file is not read into memory first and to_pandas() copies only
+what it converts: numbers, dates and category codes of the prepared
+report, and every cell of the all-text parsed frame, whose Arrow strings
+become Python str objects. A download that was seen before skips the
+parse, and the preparation too once prepared.arrow is there.
+
+A hit needs the same report data, not the same bytes: the digest leaves
+out the workbook's document properties, which carry the time the export
+was generated.
+
+Snapshots older than REPORT_SNAPSHOT_RETENTION_DAYS are removed, and the
+oldest go first once the directory grows past REPORT_SNAPSHOT_MAX_BYTES,
+when prune() runs; the prefetch_reports worker calls it after each fetch
+so the request path never walks the directory.
+"""
+import hashlib
+from io import BytesIO
+import json
+import logging
+import os
+from pathlib import Path
+import shutil
+import tempfile
+import time
+import zipfile
+
+from django.conf import settings
+import numpy as np
+import pyarrow as pa
+
+from .ingest import CLEANED_ATTR
+
+logger = logging.getLogger(__name__)
+
+# Bump when read_report's or prepare_data's output changes, so older snapshots are parsed again
+SNAPSHOT_FORMAT = 3
+RAW_FILE = 'raw.xlsx'
+FRAME_FILE = 'report.arrow'
+PREPARED_FILE = 'prepared.arrow'
+META_FILE = 'meta.json'
+# Set on frames read_snapshotted returns, so prepare_data can save its report with them
+DIGEST_ATTR = 'bost_snapshot'
+# Columns prepared.arrow holds besides the report's own; the prefixes are followed
+# by the name of the headings series and of each depot
+FALLBACK_COLUMN = '__fallback__'
+HEADING_COLUMN_PREFIX = '__heading__:'
+DEPOT_COLUMN_PREFIX = '__depot__:'
+
+
+def content_digest(content):
+    """Hash of a download's worksheets, strings and styles, leaving out its document properties
+
+    Anything that is not a readable zip is hashed whole.
+    """
+    digest = hashlib.sha256()
+    try:
+        with zipfile.ZipFile(BytesIO(content)) as archive:
+            for name in sorted(archive.namelist()):
+                if name.startswith('docProps/'):
+                    continue
+                data = archive.read(name)
+                digest.update(f"{name}\0{len(data)}\0".encode('utf-8'))
+                digest.update(data)
+    except zipfile.BadZipFile:
+        return hashlib.sha256(content).hexdigest()
+    return digest.hexdigest()
+
+
+class SnapshotStore:
+    """Content-addressed snapshot directory with retention and a size budget"""
+
+    def __init__(self, directory=None, retention_days=None, max_bytes=None):
+        self._directory = directory
+        self._retention_days = retention_days
+        self._max_bytes = max_bytes
+
+    @property
+    def directory(self):
+        directory = self._directory if self._directory is not None else settings.REPORT_SNAPSHOT_DIR
+        return Path(directory) if directory else None
+
+    @property
+    def retention_days(self):
+        if self._retention_days is not None:
+            return self._retention_days
+        return settings.REPORT_SNAPSHOT_RETENTION_DAYS
+
+    @property
+    def max_bytes(self):
+        return self._max_bytes if self._max_bytes is not None else settings.REPORT_SNAPSHOT_MAX_BYTES
+
+    @property
+    def enabled(self):
+        return self.directory is not None
+
+    def path(self, digest):
+        return self.directory / f"v{SNAPSHOT_FORMAT}" / digest[:2] / digest
+
+    def _read(self, digest, name):
+        """The Arrow table in one file of digest's snapshot, or None"""
+        try:
+            return pa.ipc.open_file(pa.memory_map(str(self.path(digest) / name))).read_all()
+        except FileNotFoundError:
+            return None
+        except (OSError, pa.ArrowInvalid) as e:
+            logger.error(f"Unreadable snapshot {digest}/{name}: {str(e)}")
+            return None
+
+    def load(self, digest):
+        """The parsed frame saved for digest, or None"""
+        table = self._read(digest, FRAME_FILE)
+        if table is None:
+            return None
+        df = table.to_pandas()
+        df.attrs[CLEANED_ATTR] = True
+        return df
+
+    def load_prepared(self, digest):
+        """(df, depot_index, fallback_rows, headings) saved for digest, or None"""
+        table = self._read(digest, PREPARED_FILE)
+        if table is None:
+            return None
+        df = table.to_pandas()
+        fallback_rows = df.pop(FALLBACK_COLUMN).to_numpy(dtype=bool)
+        [heading_column] = [column for column in df.columns if column.startswith(HEADING_COLUMN_PREFIX)]
+        headings = df.pop(heading_column).rename(heading_column[len(HEADING_COLUMN_PREFIX):])
+        depot_index = {
+            column[len(DEPOT_COLUMN_PREFIX):]: np.flatnonzero(df.pop(column).to_numpy(dtype=bool))
+            for column in list(df.columns) if column.startswith(DEPOT_COLUMN_PREFIX)
+        }
+        return df, depot_index, fallback_rows, headings
+
+    def save(self, content, df, digest=None):
+        """Save a download and its parsed frame unless that download is already stored"""
+        digest = digest or content_digest(content)
+        target = self.path(digest)
+        if target.exists():
+            return target
+        target.parent.mkdir(parents=True, exist_ok=True)
+        # Written aside and renamed into place, so readers never see half a snapshot
+        staging = Path(tempfile.mkdtemp(prefix=f".{digest[:8]}-", dir=target.parent))
+        try:
+            (staging / RAW_FILE).write_bytes(content)
+            table = pa.Table.from_pandas(df, preserve_index=True)
+            with pa.OSFile(str(staging / FRAME_FILE), 'wb') as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            (staging / META_FILE).write_text(json.dumps({
+                'saved_at': time.time(),
+                'raw_bytes': len(content),
+                'rows': len(df),
+            }))
+            os.rename(staging, target)
+        except OSError as e:
+            # Another worker stored the same download first
+            if not target.exists():
+                logger.error(f"Snapshot {digest} not saved: {str(e)}")
+            shutil.rmtree(staging, ignore_errors=True)
+        return target
+
+    def save_prepared(self, digest, df, depot_index, fallback_rows, headings):
+        """Add the report prepared from a saved download to its snapshot"""
+        target = self.path(digest)
+        if not target.is_dir() or (target / PREPARED_FILE).exists():
+            return
+        columns = {FALLBACK_COLUMN: fallback_rows, f"{HEADING_COLUMN_PREFIX}{headings.name}": headings.array}
+        for depot, positions in depot_index.items():
+            rows = np.zeros(len(df), dtype=bool)
+            rows[positions] = True
+            columns[f"{DEPOT_COLUMN_PREFIX}{depot}"] = rows
+        table = pa.Table.from_pandas(df.assign(**columns), preserve_index=True)
+        fd, staging = tempfile.mkstemp(prefix=f".{PREPARED_FILE}-", dir=target)
+        try:
+            with pa.OSFile(staging, 'wb') as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            os.replace(staging, target / PREPARED_FILE)
+        except OSError as e:
+            logger.error(f"Prepared snapshot {digest} not saved: {str(e)}")
+        finally:
+            os.close(fd)
+            if os.path.exists(staging):
+                os.remove(staging)
+
+    def snapshots(self):
+        """(mtime, bytes, path) of every stored snapshot, oldest first"""
+        root = self.directory / f"v{SNAPSHOT_FORMAT}"
+        found = []
+        for path in root.glob('*/*'):
+            if path.name.startswith('.') or not path.is_dir():
+                continue
+            try:
+                size = sum(f.stat().st_size for f in path.iterdir())
+                found.append((path.stat().st_mtime, size, path))
+            except FileNotFoundError:
+                continue
+        return sorted(found)
+
+    def prune(self):
+        """Remove expired snapshots, then the oldest until the budget is met; returns how many went"""
+        snapshots = self.snapshots()
+        cutoff = time.time() - self.retention_days * 24 * 3600
+        total = sum(size for _, size, _ in snapshots)
+        removed = 0
+        for mtime, size, path in snapshots:
+            if mtime >= cutoff and total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            removed += 1
+        return removed
+
+
+snapshot_store = SnapshotStore()
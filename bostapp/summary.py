@@ -0,0 +1,32 @@
+"""Volume and order counts by order date, product and BDC
+
+Summaries are built when a report is ingested, never from raw rows per
+request: OrderSummary rows are adjusted by OrderRecord.upsert_frame as
+orders arrive or change, and both the summary API and the PDF summary
+page read them. summarize() builds the same frame from a report's rows.
+Requests only roll these small tables up further.
+"""
+# Processed report columns a summary is keyed on
+SUMMARY_KEYS = ['ORDER DATE', 'PRODUCTS', 'BDC']
+
+
+def summarize(df):
+    """VOLUME and ORDERS per ORDER DATE, PRODUCTS and BDC of a typed report's orders
+
+    Rows without an ORDER NUMBER (group headings) are not orders and are
+    left out; blank keys form their own group.
+    """
+    keys = [column for column in SUMMARY_KEYS if column in df.columns]
+    if 'ORDER NUMBER' in df.columns:
+        df = df[df['ORDER NUMBER'].notna()]
+    else:
+        df = df.iloc[:0]
+    volume = df['VOLUME'] if 'VOLUME' in df.columns else 0.0
+    orders = df[keys].assign(VOLUME=volume, ORDERS=1)
+    return rollup(orders, keys)
+
+
+def rollup(summary, by):
+    """Add a summary's VOLUME and ORDERS up to the columns in by"""
+    grouped = summary.groupby(by, observed=True, dropna=False, sort=True)
+    return grouped[['VOLUME', 'ORDERS']].sum().reset_index()
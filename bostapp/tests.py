@@ -1,3 +1,1097 @@
-from django.test import TestCase
+import asyncio
+import datetime
+from decimal import Decimal
+import io
+import json
+import os
+from pathlib import Path
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+import zlib
+from concurrent.futures import Future
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, transaction
+from django.db.models import Count, QuerySet, Sum
+from django.test import Client, TestCase, override_settings
+from openpyxl import Workbook, load_workbook
+import pandas as pd
+
+from .cache import artifact_cache, report_cache
+from .changes import change_feed
+from .fake_npa import EXPORT_PATH, FakeNPAServer
+from .ingest import read_report
+from .management.commands.benchmark_pdf import IterrowsPDFGenerator
+from .management.commands.run_report_jobs import Command as RunReportJobsCommand
+from .models import FetchRun, OrderRecord, OrderSummary, ReportJob
+from .order_index import OrderIndex, order_indexes
+from .sample_data import make_report_frame, make_report_workbook
+from .schema import AUXILIARY_COLUMNS, display_frame, type_report
+from .snapshots import SnapshotStore, content_digest
+from .summary import rollup, summarize
+from .upstream import CircuitBreaker
+from .views import (
+    DataFetcher, PDFGenerator, RangeFetcher, fingerprint_prepared, ingest_tasks, order_index_for, record_changes,
+    report_version, store_orders,
+)
+from .xlsx import XLSX_CONTENT_TYPE
+
+# Per-process caches for the tests; the meta alias gets its own store like in settings
+LOCMEM_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'default'},
+    'meta': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'meta'},
+}
+
+
+def legacy_process_data(df, depot_names=("BOST-KUMASI", "BOST - KUMASI")):
+    """Row-wise reference implementation of DataFetcher.process_data, before typing"""
+    df = df.iloc[7:]
+    df = df.astype(str).mask(df.isna(), '')
+    df = df[~df.apply(lambda row: all(val.strip() == '' for val in row), axis=1)]
+    df = df.loc[:, ~df.apply(lambda col: all(val.strip() == '' for val in col), axis=0)]
+    df = df[~df.apply(lambda row: any('Total #' in str(val) for val in row), axis=1)]
+    last_column_name = df.columns[-1]
+    mask = df.apply(lambda row: any(
+        name in val for name in depot_names
+        for val in row
+    ), axis=1)
+    mask = mask | df[last_column_name].str.strip().eq('')
+    df = df[mask]
+    if 'Unnamed: 6' in df.columns:
+        df = df.drop(columns=['Unnamed: 6'])
+    if 'Unnamed: 19' in df.columns and 'Unnamed: 20' in df.columns:
+        df = df.drop(columns=['Unnamed: 19', 'Unnamed: 20'])
+    first_col = df.columns[0]
+    mask = df.apply(lambda row: (row != '').sum() == 1 and row[first_col] != '', axis=1)
+    if mask.any():
+        special_rows = df[mask].copy()
+        special_rows = special_rows.drop_duplicates(subset=[first_col], keep='first')
+        df = pd.concat([df[~mask], special_rows]).sort_index()
+    columns = {
+        'Unnamed: 0': 'ORDER DATE',
+        'Unnamed: 2': 'ORDER NUMBER',
+        'Unnamed: 5': 'PRODUCTS',
+        'Unnamed: 9': 'VOLUME',
+        'Unnamed: 10': 'EX REF PRICE',
+        'Unnamed: 12': 'BRV NUMBER',
+        'Unnamed: 15': 'BDC'
+    }
+    available_columns = [col for col in columns.keys() if col in df.columns]
+    return df[available_columns].rename(columns=columns)
+
+
+def pdf_page_contents(content):
+    """Decompressed content stream of each page, split into tokens
+
+    The renderers break lines between drawing operators in different
+    places, so only the whitespace between tokens is ignored.
+    """
+    streams = re.finditer(rb'/Filter /FlateDecode\s*/Length (\d+)\s*>>\s*stream\r?\n', content)
+    return [zlib.decompress(content[match.end():match.end() + int(match.group(1))]).split() for match in streams]
+
+
+def legacy_typed(df, depot_names=("BOST-KUMASI", "BOST - KUMASI")):
+    return type_report(legacy_process_data(df, depot_names))
+
+
+class ProcessDataTests(TestCase):
+    """The vectorized processing must match the original row-wise output"""
+
+    def assert_matches_legacy(self, raw):
+        expected = legacy_typed(raw)
+        df, error = DataFetcher().process_data(raw)
+        self.assertIsNone(error)
+        pd.testing.assert_frame_equal(df, expected)
+
+    def test_matches_legacy_on_sample_reports(self):
+        for rows, seed in [(10, 0), (250, 1), (2000, 2)]:
+            with self.subTest(rows=rows, seed=seed):
+                self.assert_matches_legacy(make_report_frame(rows=rows, seed=seed))
+
+    def test_matches_legacy_without_optional_columns(self):
+        raw = make_report_frame(rows=300, seed=3).drop(columns=['Unnamed: 6', 'Unnamed: 20'])
+        self.assert_matches_legacy(raw)
+
+    def test_export_text_matches_legacy(self):
+        raw = make_report_frame(rows=300, seed=7)
+        orders = legacy_process_data(raw).query("`ORDER NUMBER` != ''").index[:4]
+        raw.loc[orders[0], 'Unnamed: 0'] = '01-05-2024 13:45'
+        raw.loc[orders[1], 'Unnamed: 9'] = '54,000'
+        raw.loc[orders[2], 'Unnamed: 9'] = 9000.0
+        raw.loc[orders[3], ['Unnamed: 9', 'Unnamed: 10']] = ['TBD', 'N/A']
+        df, error = DataFetcher().process_data(raw)
+        self.assertIsNone(error)
+        text = display_frame(df)
+        pd.testing.assert_frame_equal(text, legacy_process_data(raw), check_dtype=False)
+        self.assertEqual(text.loc[orders, ['ORDER DATE', 'VOLUME', 'EX REF PRICE']].values.tolist()[::3],
+                         [['01-05-2024 13:45', str(raw.loc[orders[0], 'Unnamed: 9']),
+                           str(raw.loc[orders[0], 'Unnamed: 10'])],
+                          [str(raw.loc[orders[3], 'Unnamed: 0']), 'TBD', 'N/A']])
+
+    def test_one_preparation_serves_every_depot(self):
+        raw = make_report_frame(rows=500, seed=9)
+        fetcher = DataFetcher()
+        prepared, error = fetcher.prepare_data(raw)
+        self.assertIsNone(error)
+        self.assertEqual(prepared.depots(), ['ACCRA PLAINS', 'BUIPE', 'KUMASI', 'TAKORADI'])
+        for depot, names in [
+            ('KUMASI', ("BOST-KUMASI", "BOST - KUMASI")),
+            ('bost - takoradi', ("BOST - TAKORADI",)),
+            ('BOST-ACCRA PLAINS', ("BOST-ACCRA PLAINS",)),
+            ('accra  plains', ("BOST-ACCRA PLAINS",)),
+        ]:
+            with self.subTest(depot=depot):
+                df, error = fetcher.finalize_data(prepared, depot)
+                self.assertIsNone(error)
+                pd.testing.assert_frame_equal(df, legacy_typed(raw, names))
+
+    def test_reports_missing_depot(self):
+        raw = make_report_frame(rows=50, seed=4)
+        raw = raw.replace({'BOST-KUMASI': 'BOST-TEMA', 'BOST - KUMASI': 'BOST-TEMA'})
+        raw['Unnamed: 20'] = raw['Unnamed: 20'].fillna('LOADED')
+        raw.loc[:6, 'Unnamed: 20'] = None
+        df, error = DataFetcher().process_data(raw)
+        self.assertIsNone(df)
+        self.assertEqual(error, "No BOST-KUMASI records found; depots in this report: "
+                                "BOST-ACCRA PLAINS, BOST-BUIPE, BOST-TAKORADI, BOST-TEMA")
+
+    def test_unknown_depot_is_reported(self):
+        prepared, _ = DataFetcher().prepare_data(make_report_frame(rows=50, seed=4))
+        self.assertTrue(prepared.fallback_rows.any())
+        for depot in ('TEMA', 'ACCRA'):
+            with self.subTest(depot=depot):
+                df, error = DataFetcher().finalize_data(prepared, depot)
+                self.assertIsNone(df)
+                self.assertEqual(error, f"No BOST-{depot} records found; depots in this report: "
+                                        "BOST-ACCRA PLAINS, BOST-BUIPE, BOST-KUMASI, BOST-TAKORADI")
+
+
+@override_settings(REPORT_SNAPSHOT_DIR='')
+class ExcelReaderTests(TestCase):
+    """The streaming reader yields what read_excel plus the clean-up steps did"""
+
+    def prepared_by(self, content, reader):
+        with self.settings(REPORT_EXCEL_READER=reader):
+            raw, error = DataFetcher().parse_content(content)
+        self.assertIsNone(error)
+        return DataFetcher().prepare_data(raw)[0]
+
+    def assert_prepared_alike(self, content):
+        expected, prepared = (self.prepared_by(content, reader) for reader in ('pandas', 'streaming'))
+        pd.testing.assert_frame_equal(prepared.df, expected.df)
+        pd.testing.assert_series_equal(prepared.headings, expected.headings)
+        self.assertEqual(prepared.fallback_rows.tolist(), expected.fallback_rows.tolist())
+        self.assertEqual({depot: rows.tolist() for depot, rows in prepared.depot_index.items()},
+                         {depot: rows.tolist() for depot, rows in expected.depot_index.items()})
+        return prepared
+
+    def test_matches_read_excel_on_sample_workbook(self):
+        self.assert_prepared_alike(make_report_workbook(rows=400, seed=5))
+
+    def test_matches_read_excel_on_odd_cells(self):
+        # Date and text dates, whole-number floats, NA strings, error cells and gaps
+        workbook = Workbook()
+        sheet = workbook.active
+        for _ in range(8):
+            sheet.append([])
+        sheet.append(['FUEL ORDERS'])
+        for index in range(9):
+            row = [None] * 21
+            row[0] = datetime.datetime(2025, 6, 23 + index % 2) if index % 4 else '24-06-2025'
+            row[2], row[5] = f'ORD{index}', 'N/A' if index == 3 else 'GASOIL'
+            row[9], row[10] = 5000.0 if index % 2 else 4500, None if index == 5 else 9.6339
+            row[12], row[15] = 'NA' if index == 2 else f'BRV{index}', f'Finance {index}'
+            row[17], row[20] = 'BOST-ACCRA PLAINS' if index % 3 else 'BOST - KUMASI', '#N/A' if index == 4 else index
+            row[18] = datetime.datetime(2025, 6, 23)
+            sheet.append(row)
+        sheet.append(['Total # all', None, None, None, None, None, None, None, 'late'])
+        buffer = io.BytesIO()
+        workbook.save(buffer)
+        prepared = self.assert_prepared_alike(buffer.getvalue())
+        self.assertEqual(prepared.depots(), ['ACCRA PLAINS', 'KUMASI'])
+        self.assertEqual(prepared.df['VOLUME'].tolist()[-2:], [5000.0, 4500.0])
+
+        # Columns outside the report keep their cell text; dates there are not decoded
+        df = read_report(buffer.getvalue())
+        self.assertEqual(df['Unnamed: 18'].iloc[-2:].tolist(), ['45831', ''])
+        self.assertEqual(df['Unnamed: 20'].iloc[-6:-4].tolist(), ['', '5'])
+
+    def test_both_readers_prepare_the_same_report(self):
+        content = make_report_workbook(rows=300, seed=6)
+        results = []
+        for reader in ('pandas', 'streaming'):
+            with self.settings(REPORT_EXCEL_READER=reader):
+                fetcher = DataFetcher()
+                raw, error = fetcher.parse_content(content)
+                self.assertIsNone(error)
+                results.append(fetcher.process_data(raw))
+        pd.testing.assert_frame_equal(results[0][0], results[1][0])
+        pd.testing.assert_frame_equal(results[0][0], legacy_typed(make_report_frame(rows=300, seed=6)))
+
+    def test_empty_sheet_is_reported(self):
+        buffer = io.BytesIO()
+        Workbook().save(buffer)
+        self.assertEqual(DataFetcher().parse_content(buffer.getvalue()), (None, "Received empty data from API"))
+
+
+class SnapshotStoreTests(TestCase):
+    """Each distinct download is parsed once and read back from its snapshot"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def test_repeated_download_is_read_from_snapshot(self):
+        content = make_report_workbook(rows=200, seed=10)
+        with self.settings(REPORT_SNAPSHOT_DIR=self.directory):
+            parsed, _ = DataFetcher().parse_content(content)
+            with mock.patch('bostapp.views.read_report') as read:
+                again, _ = DataFetcher().parse_content(content)
+        read.assert_not_called()
+        pd.testing.assert_frame_equal(again, parsed)
+        self.assertTrue(again.attrs['bost_cleaned'])
+        snapshot = SnapshotStore(self.directory).path(content_digest(content))
+        self.assertEqual((snapshot / 'raw.xlsx').read_bytes(), content)
+
+    def test_prepared_report_is_restored_whole(self):
+        content = make_report_workbook(rows=200, seed=11)
+        # The same report exported a minute later
+        regenerated = io.BytesIO()
+        with zipfile.ZipFile(io.BytesIO(content)) as source, zipfile.ZipFile(regenerated, 'w') as target:
+            for item in source.infolist():
+                data = source.read(item)
+                if item.filename == 'docProps/core.xml':
+                    data = re.sub(rb'(<dcterms:created[^>]*>)[^<]*', rb'\g<1>2030-01-01T00:01:00Z', data)
+                target.writestr(item, data)
+        self.assertNotEqual(regenerated.getvalue(), content)
+        self.assertEqual(content_digest(regenerated.getvalue()), content_digest(content))
+
+        with self.settings(REPORT_SNAPSHOT_DIR=self.directory):
+            fetcher = DataFetcher()
+            expected, _ = fetcher.prepare_data(fetcher.parse_content(content)[0])
+            with mock.patch('bostapp.views.read_report') as read, mock.patch('bostapp.views.type_report') as typed:
+                restored, _ = fetcher.prepare_data(fetcher.parse_content(regenerated.getvalue())[0])
+        read.assert_not_called()
+        typed.assert_not_called()
+        pd.testing.assert_frame_equal(restored.df, expected.df)
+        pd.testing.assert_series_equal(restored.headings, expected.headings)
+        self.assertEqual(restored.fallback_rows.tolist(), expected.fallback_rows.tolist())
+        self.assertEqual({depot: rows.tolist() for depot, rows in restored.depot_index.items()},
+                         {depot: rows.tolist() for depot, rows in expected.depot_index.items()})
+
+    def test_prune_applies_retention_then_size_budget(self):
+        store = SnapshotStore(self.directory, retention_days=1, max_bytes=0)
+        frame = make_report_frame(rows=10).astype(str)
+        paths = [store.save(f"download {n}".encode(), frame) for n in range(3)]
+        expired = time.time() - 2 * 24 * 3600
+        os.utime(paths[0], (expired, expired))
+
+        store._max_bytes = sum(size for _, size, _ in store.snapshots())
+        self.assertEqual(store.prune(), 1)
+        self.assertEqual([path for _, _, path in store.snapshots()], paths[1:])
+        store._max_bytes = 1
+        self.assertEqual(store.prune(), 2)
+        self.assertEqual(store.snapshots(), [])
+
+
+class PDFGeneratorTests(TestCase):
+    """The batched renderer lays pages out exactly like the iterrows() one"""
+
+    def test_page_layout_matches_iterrows_renderer(self):
+        df, _ = DataFetcher().process_data(make_report_frame(rows=600, seed=7))
+        content, error = PDFGenerator().generate(df, "DEPOT: BOST - KUMASI")
+        self.assertIsNone(error)
+        baseline, _ = IterrowsPDFGenerator().generate(df, "DEPOT: BOST - KUMASI")
+        pages = pdf_page_contents(content)
+        self.assertGreater(len(pages), 1)
+        self.assertEqual(pages, pdf_page_contents(baseline))
+
+
+class OrderRecordTests(TestCase):
+    """Processed reports are upserted into OrderRecord keyed on ORDER NUMBER"""
+
+    def test_store_orders_tags_each_depot(self):
+        fetcher = DataFetcher()
+        prepared, _ = fetcher.prepare_data(make_report_frame(rows=200, seed=10))
+        store_orders(fetcher, prepared)
+        depots = set(OrderRecord.objects.values_list('depot', flat=True))
+        self.assertEqual(depots, {'BOST-ACCRA PLAINS', 'BOST-BUIPE', 'BOST-KUMASI', 'BOST-TAKORADI'})
+        kumasi, _ = fetcher.finalize_data(prepared, 'KUMASI', strict=True)
+        self.assertEqual(OrderRecord.objects.filter(depot='BOST-KUMASI').count(), len(kumasi))
+
+    def test_upsert_only_writes_new_or_changed_rows(self):
+        df, _ = DataFetcher().process_data(make_report_frame(rows=120, seed=5))
+        orders = df[df['ORDER NUMBER'].notna()]
+
+        self.assertEqual(OrderRecord.objects.upsert_frame(df, 'BOST-KUMASI'), (len(orders), 0))
+        self.assertEqual(OrderRecord.objects.upsert_frame(df, 'BOST-KUMASI'), (0, 0))
+
+        changed = df.copy()
+        changed.loc[orders.index[0], 'VOLUME'] = 1.0
+        self.assertEqual(OrderRecord.objects.upsert_frame(changed, 'BOST-KUMASI'), (0, 1))
+        record = OrderRecord.objects.get(order_number=orders.iloc[0]['ORDER NUMBER'])
+        self.assertEqual(record.volume, 1)
+        self.assertEqual(record.order_date.isoformat(), '2025-06-23')
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ExportCsvTests(TestCase):
+    """CSV export through the view with the upstream download mocked out"""
+
+    def setUp(self):
+        patcher = mock.patch.object(
+            DataFetcher, 'fetch_data_async', return_value=(make_report_frame(rows=400, seed=6), None)
+        )
+        self.fetch_data = patcher.start()
+        self.addCleanup(patcher.stop)
+        cache.clear()
+        caches['meta'].clear()
+        artifact_cache.clear()
+
+    async def test_streamed_csv_matches_buffered_csv(self):
+        buffered = await self.async_client.get('/export-csv/?stream=0')
+        artifact_cache.clear()
+        with self.settings(CSV_STREAM_CHUNK_ROWS=7), mock.patch.object(artifact_cache, 'put') as put:
+            streamed = await self.async_client.get('/export-csv/?stream=1')
+            self.assertTrue(streamed.streaming)
+            content = b''.join([chunk async for chunk in streamed.streaming_content])
+        self.assertEqual(content, buffered.content)
+        self.assertEqual(self.fetch_data.call_count, 1)
+        # Streamed reports are not copied into the artifact cache
+        put.assert_not_called()
+
+    async def test_stored_orders_are_served_without_a_download(self):
+        fetched = await self.async_client.get('/export-csv/?stream=0')
+        await asyncio.gather(*ingest_tasks)
+        stored = await self.async_client.get('/export-csv/?source=stored&start=01-06-2025&end=31-12-2025')
+        self.assertEqual(stored.status_code, 200)
+        self.assertEqual(self.fetch_data.call_count, 1)
+
+        # Only the rows that name the depot are stored under it
+        fetcher = DataFetcher()
+        prepared, _ = fetcher.prepare_data(self.fetch_data.return_value[0])
+        expected = display_frame(fetcher.finalize_data(prepared, 'KUMASI', strict=True)[0])
+        expected = expected[expected['ORDER NUMBER'].ne('')]
+        expected = expected.sort_values(['ORDER DATE', 'ORDER NUMBER'], ignore_index=True)
+        served = pd.read_csv(io.BytesIO(stored.content), dtype=str, keep_default_na=False)
+        pd.testing.assert_frame_equal(served, expected, check_dtype=False)
+        self.assertLess(len(served), len(fetched.content.splitlines()))
+
+        empty = await self.async_client.get('/export-csv/?source=stored&start=01-01-2024&end=02-01-2024')
+        self.assertEqual(empty.status_code, 404)
+        bad = await self.async_client.get('/export-csv/?source=stored&start=02-01-2024&end=01-01-2024')
+        self.assertEqual(bad.status_code, 400)
+
+    async def test_revalidation_does_not_rehash_the_report(self):
+        first = await self.async_client.get('/export-csv/?stream=0')
+        await asyncio.gather(*ingest_tasks)
+        with mock.patch('pandas.util.hash_pandas_object') as hash_rows:
+            again = await self.async_client.get('/export-csv/?stream=0', headers={'If-None-Match': first['ETag']})
+            buipe = await self.async_client.get('/export-csv/?stream=0&depot=BUIPE')
+        self.assertEqual(again.status_code, 304)
+        hash_rows.assert_not_called()
+        self.assertNotEqual(buipe['ETag'], first['ETag'])
+
+    async def test_concurrent_misses_share_one_fetch(self):
+        responses = await asyncio.gather(*(self.async_client.get('/export-csv/') for _ in range(5)))
+        self.assertEqual({response.status_code for response in responses}, {200})
+        self.assertEqual(self.fetch_data.call_count, 1)
+
+    async def test_unknown_depot_lists_the_report_depots(self):
+        for depot in ('NOWHERE', 'ACCRA'):
+            response = await self.async_client.get(f'/export-csv/?depot={depot}')
+            self.assertEqual(response.status_code, 404, depot)
+            self.assertIn(b'depots in this report: BOST-ACCRA PLAINS, BOST-BUIPE', response.content)
+
+    async def test_multi_word_depot(self):
+        responses = [await self.async_client.get(f'/export-csv/?stream=0&depot={depot}')
+                     for depot in ('accra plains', 'BOST-ACCRA PLAINS', 'BOST - Accra Plains')]
+        self.assertEqual({response.status_code for response in responses}, {200})
+        self.assertEqual(len({response.content for response in responses}), 1)
+        kumasi = await self.async_client.get('/export-csv/?stream=0&depot=KUMASI')
+        self.assertNotEqual(responses[0].content, kumasi.content)
+
+    async def test_reports_stage_timings(self):
+        miss = await self.async_client.get('/export-csv/?stream=0')
+        hit = await self.async_client.get('/export-csv/?stream=0')
+        self.assertIn('cache;desc="miss"', miss['Server-Timing'])
+        self.assertRegex(miss['Server-Timing'], r'prepare;dur=[\d.]+, finalize;dur=[\d.]+, render_csv;dur=[\d.]+, total;dur=')
+        self.assertIn('cache;desc="hit"', hit['Server-Timing'])
+        self.assertNotIn('prepare', hit['Server-Timing'])
+
+        scrape = await self.async_client.get('/metrics/')
+        self.assertIn(b'bost_report_cache_lookups_total{result="hit"}', scrape.content)
+        self.assertIn(b'bost_stage_seconds_count{stage="render_csv"}', scrape.content)
+
+    async def test_small_keys_stay_out_of_the_report_cache(self):
+        await self.async_client.get('/export-csv/')
+        await asyncio.gather(*ingest_tasks)
+        default_keys, meta_keys = (list(caches[alias]._cache) for alias in ('default', 'meta'))
+        self.assertTrue(any('bost:report:' in key for key in default_keys))
+        self.assertFalse(any('bost:seen:' in key or 'bost:changes:' in key for key in default_keys))
+        self.assertTrue(any('bost:seen:' in key for key in meta_keys))
+        self.assertTrue(any('bost:changes:' in key for key in meta_keys))
+
+    async def test_unchanged_report_is_not_modified(self):
+        first = await self.async_client.get('/export-csv/')
+        self.assertTrue(first['ETag'].startswith('W/"'))
+        self.assertIn('no-cache', first['Cache-Control'])
+
+        again = await self.async_client.get('/export-csv/', headers={'If-None-Match': first['ETag']})
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again['ETag'], first['ETag'])
+        since = await self.async_client.get('/export-csv/', headers={'If-Modified-Since': first['Last-Modified']})
+        self.assertEqual(since.status_code, 304)
+
+        other_depot = await self.async_client.get('/export-csv/?depot=TAKORADI', headers={'If-None-Match': first['ETag']})
+        self.assertEqual(other_depot.status_code, 200)
+        self.assertNotEqual(other_depot['ETag'], first['ETag'])
+
+    async def test_pdf_is_rendered_once_per_fingerprint(self):
+        with mock.patch.object(PDFGenerator, 'generate', autospec=True, side_effect=PDFGenerator.generate) as generate:
+            preview = await self.async_client.get('/preview-pdf/')
+            download = await self.async_client.get('/download-pdf/')
+        self.assertEqual(generate.call_count, 1)
+        self.assertEqual(preview.content, download.content)
+        self.assertEqual(preview['ETag'], download['ETag'])
+        self.assertTrue(download['Content-Disposition'].startswith('attachment'))
+
+    async def test_parquet_matches_csv(self):
+        csv = await self.async_client.get('/export-csv/?stream=0')
+        parquet = await self.async_client.get('/export-parquet/')
+        self.assertEqual(parquet['Content-Type'], 'application/vnd.apache.parquet')
+        df = pd.read_parquet(io.BytesIO(parquet.content))
+        # Types survive the round trip; the CSV is the same report as text
+        expected, _ = DataFetcher().process_data(self.fetch_data.return_value[0])
+        pd.testing.assert_frame_equal(df, expected.reset_index(drop=True))
+        self.assertEqual(display_frame(df).to_csv(index=False).encode('utf-8'), csv.content)
+
+    async def test_pdf_reports_the_requested_range(self):
+        with mock.patch.object(DataFetcher, 'fetch_data', autospec=True,
+                               side_effect=lambda fetcher: (day_report(fetcher.start_date), None)) as fetch_data:
+            response = await self.async_client.get('/preview-pdf/?start=01-06-2025&end=04-06-2025')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        days = sorted(call.args[0].start_date.day for call in fetch_data.call_args_list)
+        self.assertEqual(days, [1, 2, 3, 4])
+        self.fetch_data.assert_not_called()
+
+        bad = await self.async_client.get('/preview-pdf/?start=04-06-2025&end=01-06-2025')
+        self.assertEqual(bad.status_code, 400)
+
+    async def test_xlsx_has_typed_cells_and_product_totals(self):
+        response = await self.async_client.get('/export-xlsx/')
+        self.assertTrue(response.streaming)
+        content = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(int(response['Content-Length']), len(content))
+        workbook = load_workbook(io.BytesIO(content))
+        report, totals = workbook['Report'], workbook['Product totals']
+
+        expected, _ = DataFetcher().process_data(self.fetch_data.return_value[0])
+        rows = list(report.iter_rows(values_only=True))
+        self.assertEqual(list(rows[0]), [column for column in expected.columns
+                                         if column not in AUXILIARY_COLUMNS])
+        self.assertEqual(len(rows), len(expected) + 1)
+        self.assertEqual(report.freeze_panes, 'A2')
+        self.assertTrue(report['A1'].font.b)
+
+        orders = expected[expected['ORDER NUMBER'].notna()]
+        position = expected.index.get_loc(orders.index[0]) + 2
+        self.assertEqual(report.cell(position, 1).value, orders['ORDER DATE'].iloc[0].to_pydatetime())
+        self.assertEqual(report.cell(position, 1).number_format, 'yyyy-mm-dd')
+        self.assertEqual(report.cell(position, 4).value, orders['VOLUME'].iloc[0])
+        self.assertEqual(report.cell(position, 4).number_format, '#,##0')
+        heading = expected['HEADING'].dropna()
+        self.assertEqual(report.cell(expected.index.get_loc(heading.index[0]) + 2, 1).value, heading.iloc[0])
+
+        subtotals = {product: (volume, count) for product, volume, count in totals.iter_rows(min_row=2, values_only=True)}
+        self.assertEqual(subtotals.pop('TOTAL'), (orders['VOLUME'].sum(), len(orders)))
+        volumes = orders.groupby('PRODUCTS', observed=True)['VOLUME'].agg(['sum', 'count'])
+        self.assertEqual(subtotals, {product: (row['sum'], row['count']) for product, row in volumes.iterrows()})
+
+    async def test_last_good_report_is_served_while_npa_is_down(self):
+        fresh = await self.async_client.get('/export-csv/?stream=0')
+        fetcher = DataFetcher()
+        prepared, loaded_at = cache.get(fetcher.last_good_key())
+        cache.set(fetcher.last_good_key(), (prepared, loaded_at - 3600))
+        cache.delete(fetcher.cache_key())
+        self.fetch_data.return_value = (None, "Failed to fetch data: timeout")
+
+        stale = await self.async_client.get('/export-csv/?stream=0')
+        self.assertEqual(stale.status_code, 200)
+        self.assertEqual(stale.content, fresh.content)
+        self.assertGreaterEqual(int(stale['Age']), 3600)
+        self.assertIn('cache;desc="stale"', stale['Server-Timing'])
+        # The failed background refresh leaves the last good copy in place
+        await asyncio.gather(*report_cache.refreshes)
+        self.assertEqual(self.fetch_data.call_count, 2)
+        self.assertIsNotNone(cache.get(fetcher.last_good_key()))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CircuitBreakerTests(TestCase):
+    """The NPA breaker opens on repeated failures and lets one trial call through later"""
+
+    def setUp(self):
+        cache.clear()
+        caches['meta'].clear()
+
+    def test_opens_after_threshold_and_half_opens_after_timeout(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertFalse(breaker.allow())
+        self.assertGreater(breaker.retry_after(), 0)
+
+        breaker.opened_at = time.monotonic() - 60
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        # A failed trial re-opens it straight away
+        breaker.record_failure()
+        self.assertFalse(breaker.allow())
+
+        breaker.opened_at = time.monotonic() - 60
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.status(), {'state': CircuitBreaker.CLOSED, 'failures': 0, 'retry_after': 0})
+
+    async def test_open_breaker_without_cached_report_is_unavailable(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+        breaker.record_failure()
+        # An open breaker refuses the call before anything goes over the network
+        with mock.patch('bostapp.views.npa_breaker', breaker), mock.patch('bostapp.views.get_async_client') as client:
+            response = await self.async_client.get('/export-csv/')
+            health = await self.async_client.get('/health/')
+        client.assert_not_called()
+        self.assertEqual(response.status_code, 503)
+        self.assertGreater(int(response['Retry-After']), 0)
+        self.assertEqual(health.json()['status'], 'degraded')
+        self.assertEqual(health.json()['upstream']['state'], CircuitBreaker.OPEN)
+        self.assertTrue(health.json()['report']['stale'])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class OrdersApiTests(TestCase):
+    """The JSON orders API answers filters from per-worker indexes of the cached report"""
+
+    def setUp(self):
+        self.raw = make_report_frame(rows=400, seed=9)
+        patcher = mock.patch.object(DataFetcher, 'fetch_data_async', return_value=(self.raw, None))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cache.clear()
+        caches['meta'].clear()
+        order_indexes.clear()
+
+    def expected_orders(self, **filters):
+        fetcher = DataFetcher()
+        df, _ = fetcher.process_data(self.raw)
+        df = df[df['ORDER NUMBER'].str.strip().ne('')]
+        for column, values in filters.items():
+            df = df[df[column].str.upper().isin(values)]
+        return df
+
+    async def fetch_all(self, url):
+        rows, cursor = [], None
+        while True:
+            response = await self.async_client.get(url + (f"&cursor={cursor}" if cursor else ''))
+            self.assertEqual(response.status_code, 200)
+            page = response.json()
+            rows += page['rows']
+            cursor = page['next_cursor']
+            if cursor is None:
+                return page, rows
+
+    async def test_filters_and_cursor_pagination(self):
+        page, rows = await self.fetch_all('/api/orders/?product=gasoil&product=LPG&limit=7&fields=order_number,product')
+        expected = self.expected_orders(PRODUCTS=['GASOIL', 'LPG'])
+        self.assertEqual(page['fields'], ['order_number', 'product'])
+        self.assertEqual(page['count'], len(expected))
+        self.assertEqual(rows, expected[['ORDER NUMBER', 'PRODUCTS']].values.tolist())
+
+        bdc = expected['BDC'].iloc[0]
+        response = await self.async_client.get(
+            '/api/orders/', {'product': ['GASOIL', 'LPG'], 'bdc': bdc, 'date_from': '2025-06-24'})
+        expected = expected[expected['BDC'].eq(bdc) & expected['ORDER DATE'].ge('2025-06-24')]
+        self.assertEqual([row[1] for row in response.json()['rows']], expected['ORDER NUMBER'].tolist())
+        self.assertTrue(all(row[0] >= '2025-06-24' for row in response.json()['rows']))
+
+    async def test_filter_values_may_hold_commas(self):
+        bdc = self.expected_orders()['BDC'].dropna().iloc[0]
+        self.raw['Unnamed: 15'] = self.raw['Unnamed: 15'].replace(bdc, 'Star Oil, Ltd')
+        response = await self.async_client.get('/api/orders/', {'bdc': ['star oil, ltd'], 'fields': 'bdc'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], len(self.expected_orders(BDC=['STAR OIL, LTD'])))
+        self.assertGreater(response.json()['count'], 0)
+        self.assertEqual({row[0] for row in response.json()['rows']}, {'Star Oil, Ltd'})
+
+    async def test_index_is_built_once_and_kept_out_of_the_report_cache(self):
+        with mock.patch('bostapp.views.OrderIndex', wraps=OrderIndex) as build:
+            for _ in range(3):
+                response = await self.async_client.get('/api/orders/?depot=TAKORADI&limit=5')
+                self.assertEqual(response.status_code, 200)
+            await asyncio.gather(*ingest_tasks)
+        # One per depot for the change feed when the report loads; TAKORADI's is reused after that
+        self.assertEqual(build.call_count, 4)
+        prepared = await cache.aget(DataFetcher().cache_key())
+        self.assertIsNotNone(prepared.fingerprint)
+        self.assertFalse(any(isinstance(value, OrderIndex) for value in vars(prepared).values()))
+
+    async def test_rejects_bad_queries(self):
+        for query in ('fields=colour', 'limit=0', 'date_from=yesterday', 'cursor=bm90LWFuLW9yZGVy'):
+            response = await self.async_client.get(f'/api/orders/?{query}')
+            self.assertEqual(response.status_code, 400, query)
+        response = await self.async_client.get('/api/orders/?depot=NOWHERE')
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class OrderSummaryTests(TestCase):
+    """Summaries are kept at ingest and served without touching the orders"""
+
+    def setUp(self):
+        self.raw = make_report_frame(rows=300, seed=12)
+        patcher = mock.patch.object(DataFetcher, 'fetch_data_async', return_value=(self.raw, None))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cache.clear()
+        caches['meta'].clear()
+        artifact_cache.clear()
+
+    def assert_summary_matches_orders(self):
+        expected = {
+            (row['depot'], row['order_date'], row['product'], row['bdc']): (row['total_volume'], row['total_orders'])
+            for row in OrderRecord.objects.values('depot', 'order_date', 'product', 'bdc').annotate(
+                total_volume=Sum('volume'), total_orders=Count('id')).order_by()
+        }
+        stored = {OrderSummary.key_of(row): (row.volume, row.orders) for row in OrderSummary.objects.all()}
+        self.assertEqual(stored, expected)
+
+    def test_upsert_adjusts_summary_rows(self):
+        df, _ = DataFetcher().process_data(self.raw)
+        OrderRecord.objects.upsert_frame(df, 'BOST-KUMASI')
+        self.assert_summary_matches_orders()
+
+        # One order moves to a product nobody else ordered, and its old group shrinks
+        changed = df.copy()
+        first = changed['ORDER NUMBER'].first_valid_index()
+        changed['PRODUCTS'] = changed['PRODUCTS'].cat.add_categories(['AVIATION'])
+        changed.loc[first, ['PRODUCTS', 'VOLUME']] = ['AVIATION', 1234.5]
+        self.assertEqual(OrderRecord.objects.upsert_frame(changed, 'BOST-KUMASI'), (0, 1))
+        self.assert_summary_matches_orders()
+        aviation = OrderSummary.objects.get(product='AVIATION')
+        self.assertEqual((aviation.volume, aviation.orders), (Decimal('1234.50'), 1))
+
+    def test_summary_api_rolls_up_stored_summary(self):
+        df, _ = DataFetcher().process_data(self.raw)
+        OrderRecord.objects.upsert_frame(df, 'BOST-KUMASI')
+
+        response = self.client.get('/api/summary/?by=date,product&date_from=24-06-2025')
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body['fields'], ['date', 'product', 'volume', 'orders'])
+        expected = rollup(summarize(df[df['ORDER DATE'].ge('2025-06-24')]), ['ORDER DATE', 'PRODUCTS'])
+        self.assertEqual(body['rows'], [
+            [date.strftime('%Y-%m-%d'), product, volume, orders] for date, product, volume, orders in expected.values
+        ])
+        self.assertEqual(body['total']['orders'], expected['ORDERS'].sum())
+        self.assertEqual(self.client.get('/api/summary/?by=colour').status_code, 400)
+
+    async def test_pdf_summary_page_is_optional(self):
+        plain = await self.async_client.get('/download-pdf/')
+        summarized = await self.async_client.get('/download-pdf/?summary=1')
+        self.assertEqual(summarized.status_code, 200)
+        self.assertNotEqual(plain['ETag'], summarized['ETag'])
+        # The report pages are unchanged, with the summary on pages after them
+        pages, summarized_pages = pdf_page_contents(plain.content), pdf_page_contents(summarized.content)
+        self.assertGreater(len(summarized_pages), len(pages))
+        self.assertEqual(summarized_pages[:len(pages)], pages)
+        self.assertIn(b'(SUMMARY)', summarized_pages[len(pages)])
+
+    async def test_pdf_summary_page_matches_summary_api(self):
+        summaries = []
+        add_summary_page = PDFGenerator._add_summary_page
+
+        def capture(generator, pdf, summary):
+            summaries.append(summary)
+            return add_summary_page(generator, pdf, summary)
+
+        with mock.patch.object(PDFGenerator, '_add_summary_page', capture):
+            first = await self.async_client.get('/download-pdf/?summary=1')
+        summary, = summaries
+        # The page counts the stored orders the API does for the same dates, this report's included
+        dates = summary['ORDER DATE']
+        query = f"by=product&date_from={dates.min():%d-%m-%Y}&date_to={dates.max():%d-%m-%Y}"
+        body = (await self.async_client.get(f'/api/summary/?{query}')).json()
+        by_product = rollup(summary, ['PRODUCTS'])
+        self.assertEqual(body['rows'], [[product, volume, orders] for product, volume, orders in by_product.values])
+        self.assertGreater(body['total']['orders'], 0)
+
+        # Another report storing an order in those dates changes the page, and so the ETag
+        df, _ = DataFetcher().process_data(self.raw)
+        extra = df[df['ORDER NUMBER'].notna()].head(1).assign(**{'ORDER NUMBER': 'EXTRA-1'})
+        await sync_to_async(OrderRecord.objects.upsert_frame)(extra, 'BOST-KUMASI')
+        again = await self.async_client.get('/download-pdf/?summary=1', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(again.status_code, 200)
+        self.assertNotEqual(again['ETag'], first['ETag'])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ChangeFeedTests(TestCase):
+    """Refreshes of the latest report are diffed into a feed of order changes"""
+
+    def setUp(self):
+        self.raw = make_report_frame(rows=200, seed=14)
+        patcher = mock.patch.object(DataFetcher, 'fetch_data_async', return_value=(self.raw, None))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cache.clear()
+        caches['meta'].clear()
+        change_feed._checked.clear()
+
+    async def refresh(self):
+        """Start the feed from the latest report, then record a refresh with three changes"""
+        response = await self.async_client.get('/api/changes/')
+        self.assertEqual(response.json()['seq'], 0)
+        await asyncio.gather(*ingest_tasks)
+
+        df, _ = DataFetcher().process_data(self.raw)
+        orders = df[df['ORDER NUMBER'].notna()]
+        refreshed = df.drop(orders.index[0])
+        refreshed.loc[orders.index[5], 'VOLUME'] = 1.0
+        refreshed = pd.concat([refreshed, refreshed.loc[[orders.index[1]]].assign(**{'ORDER NUMBER': 'NEW-1'})])
+        change_feed.record('KUMASI', OrderIndex(refreshed))
+        return orders
+
+    async def test_refresh_is_reported_as_new_changed_and_removed_orders(self):
+        orders = await self.refresh()
+
+        body = (await self.async_client.get('/api/changes/?since=0')).json()
+        self.assertEqual((body['seq'], body['reset']), (1, False))
+        [event] = body['events']
+        number = body['fields'].index('order_number')
+        self.assertEqual([row[number] for row in event['new']], ['NEW-1'])
+        self.assertEqual([row[number] for row in event['changed']], [orders['ORDER NUMBER'].iloc[5]])
+        self.assertEqual(event['changed'][0][body['fields'].index('volume')], 1.0)
+        self.assertEqual(event['removed'], [orders['ORDER NUMBER'].iloc[0]])
+
+        self.assertEqual((await self.async_client.get('/api/changes/?since=1')).json()['events'], [])
+        self.assertTrue((await self.async_client.get('/api/changes/?since=7')).json()['reset'])
+
+    def test_unchanged_report_is_not_indexed_again(self):
+        fetcher = DataFetcher()
+        for attempt in range(2):
+            # Each refresh downloads and prepares the same report afresh
+            prepared, _ = fetcher.prepare_data(self.raw)
+            fingerprint_prepared(prepared)
+            with mock.patch('bostapp.views.order_index_for', wraps=order_index_for) as index_for:
+                record_changes(fetcher, prepared)
+            self.assertEqual(index_for.call_count, 0 if attempt else len(prepared.depots()))
+        feed = change_feed.read('KUMASI')
+        self.assertEqual((feed['seq'], feed['version']), (0, report_version(prepared, 'KUMASI')))
+
+    @override_settings(CHANGE_FEED_STREAM_SECONDS=0)
+    async def test_stream_resumes_from_last_event_id(self):
+        await self.refresh()
+        response = await self.async_client.get('/api/changes/stream/', headers={'Last-Event-ID': '0'})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = ''.join([chunk.decode() async for chunk in response.streaming_content])
+        self.assertIn('id: 1\nevent: changes\ndata: ', body)
+        self.assertIn('"removed":[', body)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class PrefetchReportsTests(TestCase):
+    """The prefetch worker warms the cache the views read from"""
+
+    def setUp(self):
+        cache.clear()
+        caches['meta'].clear()
+
+    @mock.patch.object(DataFetcher, 'fetch_data')
+    def test_prefetch_once_fills_cache_and_records_run(self, fetch_data):
+        raw = make_report_frame(rows=80, seed=8)
+        fetch_data.return_value = (raw, None)
+        call_command('prefetch_reports', '--once', stdout=io.StringIO())
+
+        run = FetchRun.objects.get()
+        self.assertTrue(run.succeeded)
+        self.assertEqual(run.rows_in, len(raw))
+        self.assertEqual(run.rows_out, len(cache.get(DataFetcher().cache_key()).df))
+
+        # The health check reads the load time alone, not the last good report
+        last_good_key = DataFetcher().last_good_key()
+        with mock.patch.object(caches['default'], 'get', wraps=caches['default'].get) as get:
+            self.assertLess(report_cache.age(last_good_key), 60)
+        self.assertEqual([call.args[0] for call in get.call_args_list], [report_cache.loaded_at_key(last_good_key)])
+
+    @mock.patch.object(DataFetcher, 'fetch_data', return_value=(None, "Failed to fetch data: timeout"))
+    def test_failed_prefetch_is_recorded(self, fetch_data):
+        call_command('prefetch_reports', '--once', stdout=io.StringIO(), stderr=io.StringIO())
+        run = FetchRun.objects.get()
+        self.assertFalse(run.succeeded)
+        self.assertEqual(run.error, "Failed to fetch data: timeout")
+        self.assertIsNone(cache.get(DataFetcher().cache_key()))
+
+
+class InlinePool:
+    """Stands in for the worker's process pool, running each job as it is submitted"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def submit(self, func, *args):
+        future = Future()
+        future.set_result(func(*args))
+        return future
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ReportJobTests(TestCase):
+    """Report jobs are queued once per set of parameters and rendered by the worker"""
+
+    def setUp(self):
+        self.raw = make_report_frame(rows=150, seed=15)
+        patcher = mock.patch.object(DataFetcher, 'fetch_data', return_value=(self.raw, None))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cache.clear()
+        caches['meta'].clear()
+        job_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(job_dir.cleanup)
+        settings_patcher = override_settings(REPORT_JOB_DIR=job_dir.name)
+        settings_patcher.enable()
+        self.addCleanup(settings_patcher.disable)
+
+    def test_identical_jobs_are_deduplicated(self):
+        params = {'start': '23-06-2025', 'end': '24-06-2025', 'depot': 'kumasi', 'format': 'csv'}
+        first = self.client.post('/api/jobs/', params)
+        self.assertEqual(first.status_code, 202)
+        again = self.client.post('/api/jobs/', json.dumps(params), content_type='application/json')
+        self.assertEqual(again.status_code, 200)
+        self.assertEqual(again.json()['id'], first.json()['id'])
+        self.assertEqual(self.client.post('/api/jobs/', {**params, 'format': 'pdf'}).status_code, 202)
+
+        self.assertEqual(self.client.post('/api/jobs/', {**params, 'format': 'docx'}).status_code, 400)
+        self.assertEqual(self.client.post('/api/jobs/', {**params, 'start': '25-06-2025'}).status_code, 400)
+        status = self.client.get(first['Location']).json()
+        self.assertEqual((status['status'], status['depot']), ('queued', 'KUMASI'))
+
+    def test_simultaneous_submits_share_one_job(self):
+        job, created = ReportJob.objects.submit(datetime.date(2025, 6, 23), datetime.date(2025, 6, 24), 'ALL', 'csv')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ReportJob.objects.create(params_hash=job.params_hash, start_date=job.start_date,
+                end_date=job.end_date, depot=job.depot, format=job.format)
+        # The second submit looks before the first has committed, then loses the insert
+        first = QuerySet.first
+        lookups = iter([lambda queryset: None])
+        with mock.patch.object(QuerySet, 'first', lambda queryset: next(lookups, first)(queryset)):
+            again, created_again = ReportJob.objects.submit(job.start_date, job.end_date, 'ALL', 'csv')
+        self.assertEqual((created, created_again, again.pk), (True, False, job.pk))
+        self.assertEqual(ReportJob.objects.count(), 1)
+
+    def test_submit_needs_csrf_token(self):
+        client = Client(enforce_csrf_checks=True)
+        params = {'start': '23-06-2025', 'end': '24-06-2025', 'format': 'csv'}
+        self.assertEqual(client.post('/api/jobs/', params).status_code, 403)
+        token = client.get('/').cookies['csrftoken'].value
+        self.assertEqual(client.post('/api/jobs/', params, HTTP_X_CSRFTOKEN=token).status_code, 202)
+
+    @mock.patch.object(RunReportJobsCommand, 'make_pool', lambda self, workers: InlinePool())
+    def test_worker_renders_job_for_download_until_it_expires(self):
+        job = self.client.post('/api/jobs/', {'start': '23-06-2025', 'end': '24-06-2025', 'format': 'csv'}).json()
+        call_command('run_report_jobs', '--once', stdout=io.StringIO())
+
+        status = self.client.get(job['status_url']).json()
+        self.assertEqual((status['status'], status['progress']), ('done', 1.0))
+        download = self.client.get(status['download_url'])
+        self.assertEqual(download.status_code, 200)
+        export = self.client.get('/export-csv/?start=23-06-2025&end=24-06-2025&stream=0')
+        self.assertEqual(b''.join(download.streaming_content), export.content)
+
+        ReportJob.objects.update(finished_at=datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc))
+        self.assertEqual(ReportJob.objects.expire(), (1, 0))
+        self.assertEqual(self.client.get(status['download_url']).status_code, 410)
+        self.assertEqual(os.listdir(settings.REPORT_JOB_DIR), [])
+
+    @mock.patch.object(RunReportJobsCommand, 'make_pool', lambda self, workers: InlinePool())
+    def test_worker_renders_xlsx_job(self):
+        job = self.client.post('/api/jobs/', {'start': '23-06-2025', 'end': '24-06-2025', 'format': 'xlsx'}).json()
+        call_command('run_report_jobs', '--once', stdout=io.StringIO())
+
+        status = self.client.get(job['status_url']).json()
+        self.assertEqual(status['status'], 'done')
+        download = self.client.get(status['download_url'])
+        self.assertEqual(download['Content-Type'], XLSX_CONTENT_TYPE)
+        workbook = load_workbook(io.BytesIO(b''.join(download.streaming_content)))
+        self.assertEqual(workbook.sheetnames, ['Report', 'Product totals'])
+        # The same rows as the CSV export of the range, as typed cells
+        export = self.client.get('/export-csv/?start=23-06-2025&end=24-06-2025&stream=0')
+        expected = pd.read_csv(io.BytesIO(export.content), dtype=str, keep_default_na=False)
+        header, *rows = workbook['Report'].values
+        self.assertEqual(list(header), list(expected.columns))
+        self.assertEqual([row[1] or '' for row in rows], expected['ORDER NUMBER'].tolist())
+        self.assertEqual(sum(row[3] or 0 for row in rows), pd.to_numeric(expected['VOLUME']).sum())
+
+
+class FakeNPATests(TestCase):
+    """The bundled NPA stand-in and the load driver that runs against it"""
+
+    def serve(self, **options):
+        server = FakeNPAServer(**options)
+        server.start()
+        self.addCleanup(server.stop)
+        return server
+
+    def test_fetcher_reads_fake_exports(self):
+        failing = self.serve(rows=20, error_rate=1.0)
+        with override_settings(NPA_EXPORT_URL=failing.url):
+            raw, error = DataFetcher().fetch_data()
+        self.assertIsNone(raw)
+        self.assertIn('503', error)
+
+        server = self.serve(rows=60, seed=3)
+        with override_settings(NPA_EXPORT_URL=server.url):
+            raw, error = DataFetcher().fetch_data()
+        self.assertIsNone(error)
+        df, error = DataFetcher().process_data(raw)
+        self.assertIsNone(error)
+        self.assertGreater(df['ORDER NUMBER'].notna().sum(), 0)
+
+    def test_load_test_reports_latency_and_memory(self):
+        server = self.serve(rows=20, latency=0.01)
+        host, port = server.server_address[:2]
+        with tempfile.TemporaryDirectory() as tmp:
+            output = Path(tmp) / 'load.json'
+            call_command(
+                'load_test', '--url', f'http://{host}:{port}', '--endpoints', EXPORT_PATH,
+                '--concurrency', '1,3', '--requests', '6', '--pid', str(os.getpid()), '--json', str(output),
+                stdout=io.StringIO(),
+            )
+            results = json.loads(output.read_text())
+        self.assertEqual([result['concurrency'] for result in results], [1, 3])
+        for result in results:
+            self.assertEqual((result['requests'], result['errors']), (6, 0))
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+            self.assertGreater(result['rss_mb'], 0)
+
+
+class BenchmarkPipelineTests(TestCase):
+    """The benchmark suite runs offline and flags slower stages"""
+
+    def test_reports_stages_and_regressions(self):
+        with tempfile.TemporaryDirectory() as directory:
+            results_path = f"{directory}/results.json"
+            options = dict(sizes='100', stages='parse,process,csv', repeat=1, fixtures_dir=directory)
+            call_command('benchmark_pipeline', json=results_path, stdout=io.StringIO(), **options)
+            with open(results_path) as f:
+                results = json.load(f)
+            self.assertEqual([result['stage'] for result in results], ['parse', 'process', 'csv'])
+            self.assertTrue(all(result['rows'] > 0 and result['peak_mb'] > 0 for result in results))
+
+            for result in results:
+                result['seconds'] /= 100
+            with open(results_path, 'w') as f:
+                json.dump(results, f)
+            with self.assertRaisesRegex(CommandError, 'Regressions against the baseline'):
+                call_command('benchmark_pipeline', baseline=results_path, stdout=io.StringIO(), **options)
+
+
+def day_report(day):
+    """Raw report for one day with its own block of order numbers"""
+    return make_report_frame(rows=30, seed=day.toordinal(), start_date=day, first_order=day.toordinal() % 1000 * 100)
+
+
+@override_settings(BACKFILL_RETRY_DELAY=0)
+class RangeFetcherTests(TestCase):
+    """Date ranges are fetched in chunks, retried, and merged without duplicates"""
+
+    def fetch_window(self, fetcher):
+        self.calls.append(fetcher.start_date)
+        if fetcher.start_date == self.flaky_day and self.calls.count(self.flaky_day) == 1:
+            return None, "Failed to fetch data: timeout"
+        # A window holds every day from its start day to its end day
+        days = (fetcher.end_date - fetcher.start_date).days + 1
+        reports = [day_report(fetcher.start_date + datetime.timedelta(days=offset)) for offset in range(days)]
+        return pd.concat([reports[0], *(report.iloc[7:] for report in reports[1:])], ignore_index=True), None
+
+    def test_chunks_do_not_overlap(self):
+        start = datetime.datetime(2025, 6, 1)
+        for chunk, windows in (('day', 6), ('week', 1)):
+            chunks = list(RangeFetcher(start, start + datetime.timedelta(days=5), chunk=chunk).chunks())
+            self.assertEqual(len(chunks), windows)
+            self.assertEqual(chunks[0].start_date, start)
+            self.assertEqual(chunks[-1].end_date, start + datetime.timedelta(days=5))
+            for previous, following in zip(chunks, chunks[1:]):
+                self.assertEqual(following.start_date, previous.end_date + datetime.timedelta(days=1))
+
+    def test_chunks_are_retried_and_deduplicated(self):
+        start = datetime.datetime(2025, 6, 1)
+        self.calls = []
+        self.flaky_day = start + datetime.timedelta(days=2)
+        fetcher = RangeFetcher(start, start + datetime.timedelta(days=5), chunk='day', max_workers=3)
+
+        with mock.patch.object(DataFetcher, 'fetch_data', autospec=True, side_effect=self.fetch_window):
+            prepared, error = fetcher.load_prepared()
+        self.assertIsNone(error)
+        # Six days, one retried
+        self.assertEqual(len(self.calls), 7)
+
+        orders = prepared.df['ORDER NUMBER'].dropna()
+        self.assertFalse(orders.duplicated().any())
+        expected = set()
+        for offset in range(6):
+            day_orders = day_report(start + datetime.timedelta(days=offset))['Unnamed: 2'].iloc[7:]
+            expected.update(day_orders.dropna())
+        self.assertEqual(set(orders), expected)
+        self.assertTrue(orders.is_monotonic_increasing)
+
+    def test_failed_chunk_fails_the_range(self):
+        start = datetime.datetime(2025, 6, 1)
+        fetcher = RangeFetcher(start, start + datetime.timedelta(days=13), chunk='week', retries=1)
+        with mock.patch.object(DataFetcher, 'fetch_data', return_value=(None, "Failed to fetch data: 503")) as fetch_data:
+            prepared, error = fetcher.load_prepared()
+        self.assertIsNone(prepared)
+        self.assertEqual(error, ('fetch', "Chunk 01-06-2025..07-06-2025 failed: Failed to fetch data: 503"))
+        # Two weekly chunks, each tried once and retried once
+        self.assertEqual(fetch_data.call_count, 4)
+
+    @override_settings(CACHES=LOCMEM_CACHES)
+    def test_backfill_output_matches_the_csv_export(self):
+        self.calls, self.flaky_day = [], None
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch.object(DataFetcher, 'fetch_data', autospec=True, side_effect=self.fetch_window):
+            output = Path(directory) / 'kumasi.csv'
+            call_command('backfill_reports', start='01-06-2025', end='03-06-2025', output=str(output),
+                         stdout=io.StringIO())
+            cache.clear()
+            response = self.client.get('/export-csv/?start=01-06-2025&end=03-06-2025&stream=0')
+            self.assertEqual(output.read_bytes(), response.content)
+        self.assertIn(b'Finance Petroleum Ltd', response.content)
+
+
+class StartupImportTests(TestCase):
+    def test_urlconf_leaves_output_libraries_unloaded(self):
+        # A fresh interpreter, as a worker that has not been forked from a preloaded master
+        script = (
+            "import sys, django; django.setup(); import config.urls; "
+            "print(','.join(name for name in ('fpdf', 'requests') if name in sys.modules))"
+        )
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'config.settings'}
+        env.pop('PROMETHEUS_MULTIPROC_DIR', None)
+        result = subprocess.run([sys.executable, '-c', script], cwd=settings.BASE_DIR, env=env,
+                                capture_output=True, text=True, check=True)
+        self.assertEqual(result.stdout.strip(), '')
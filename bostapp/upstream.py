@@ -0,0 +1,161 @@
+"""Pooled HTTP clients for the NPA API and a bounded pool for blocking work"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+import logging
+import threading
+import time
+import weakref
+
+from django.conf import settings
+import httpx
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+NPA_HEADERS = {
+    'accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
+    'user-agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/128.0.0.0 Safari/537.36'
+}
+
+_lock = threading.Lock()
+_session = None
+_executor = None
+# One client per event loop: httpx connections cannot be shared across loops
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_session():
+    """Long-lived requests session so sync fetches reuse TLS connections"""
+    global _session
+    # Imported here: only the sync views and commands use requests
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    with _lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.UPSTREAM_POOL_SIZE)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            session.headers.update(NPA_HEADERS)
+            _session = session
+        return _session
+
+
+def get_async_client():
+    """Connection-pooled httpx client bound to the running event loop"""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(
+            headers=NPA_HEADERS,
+            timeout=settings.REQUEST_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=settings.UPSTREAM_POOL_SIZE,
+                max_keepalive_connections=settings.UPSTREAM_POOL_SIZE,
+            ),
+        )
+        _async_clients[loop] = client
+    return client
+
+
+def get_executor():
+    """Bounded thread pool for Excel parsing and PDF rendering"""
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.BLOCKING_POOL_SIZE,
+                thread_name_prefix='bost-blocking',
+            )
+        return _executor
+
+
+async def run_blocking(func, *args):
+    """Run a CPU-bound or blocking call off the event loop
+
+    The call sees the caller's context variables, e.g. the request's stage timings.
+    """
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(get_executor(), context.run, func, *args)
+
+
+class CircuitBreaker:
+    """Fails NPA calls fast after repeated failures instead of waiting out each timeout
+
+    After failure_threshold failures in a row the breaker opens and calls
+    are refused. Once reset_timeout has passed a single trial call is let
+    through (half-open); success closes the breaker, failure re-opens it.
+    State is kept per worker process.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=None, reset_timeout=None):
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def failure_threshold(self):
+        if self._failure_threshold is not None:
+            return self._failure_threshold
+        return settings.UPSTREAM_FAILURE_THRESHOLD
+
+    @property
+    def reset_timeout(self):
+        return self._reset_timeout if self._reset_timeout is not None else settings.UPSTREAM_RESET_TIMEOUT
+
+    def allow(self):
+        """Whether a call may go to NPA now"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            # A trial call that never reported back does not block the next one
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info("NPA upstream recovered, closing circuit breaker")
+            self.state = self.CLOSED
+            self.failures = 0
+        metrics.UPSTREAM_BREAKER_OPEN.set(0)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"NPA upstream failed {self.failures} times, opening circuit breaker")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+        if self.state == self.OPEN:
+            metrics.UPSTREAM_BREAKER_OPEN.set(1)
+
+    def retry_after(self):
+        """Seconds until the next trial call is allowed; 0 when closed"""
+        if self.state == self.CLOSED:
+            return 0
+        return max(self.reset_timeout - (time.monotonic() - self.opened_at), 0)
+
+    def status(self):
+        return {
+            'state': self.state,
+            'failures': self.failures,
+            'retry_after': round(self.retry_after(), 1),
+        }
+
+
+npa_breaker = CircuitBreaker()
@@ -11,8 +11,18 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('', views.home, name='home'),
     path('export-csv/', views.export_csv, name='export_csv'),
+    path('export-parquet/', views.export_parquet, name='export_parquet'),
+    path('export-xlsx/', views.export_xlsx, name='export_xlsx'),
     path('preview-pdf/', views.preview_pdf, name='preview_pdf'),
     path('download-pdf/', views.download_pdf, name='download_pdf'),
+    path('api/orders/', views.orders_api, name='orders_api'),
+    path('api/summary/', views.summary_api, name='summary_api'),
+    path('api/changes/', views.changes_api, name='changes_api'),
+    path('api/changes/stream/', views.changes_stream, name='changes_stream'),
+    path('api/jobs/', views.submit_report_job, name='submit_report_job'),
+    path('api/jobs/<uuid:job_id>/', views.report_job, name='report_job'),
+    path('api/jobs/<uuid:job_id>/download/', views.report_job_download, name='report_job_download'),
     path('health/', views.health_check, name='health_check'),
+    path('metrics/', views.metrics_view, name='metrics'),
     path('simple-health/', simple_health_check, name='simple_health'),
 ]
\ No newline at end of file
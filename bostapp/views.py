@@ -1,144 +1,309 @@
 from django.shortcuts import render
-from django.http import HttpResponse, JsonResponse
-from fpdf import FPDF
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from django.views.decorators.csrf import ensure_csrf_cookie
+from django.views.decorators.http import require_POST
+from asgiref.sync import sync_to_async
+# Only fpdf and requests are imported on first use. pandas and numpy are
+# already loaded by the models at setup, and httpx by .upstream for every fetch.
+import httpx
+import numpy as np
 import pandas as pd
-import requests
 from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+import asyncio
 import datetime
+import hashlib
+from itertools import accumulate
+import json
 import logging
+import re
+import tempfile
+import threading
+import time
 import traceback
 
+from . import metrics
+from .cache import FIRST_SEEN_TTL, artifact_cache, report_cache
+from .changes import change_feed, events_since
+from .ingest import CLEANED_ATTR, HEADER_ROWS, read_report
+from .models import OrderRecord, OrderSummary, ReportJob
+from .order_index import FILTER_COLUMNS, OrderIndex, decode_cursor, order_indexes
+from .schema import REPORT_COLUMNS, conform, display_frame, type_report
+from .snapshots import DIGEST_ATTR, content_digest, snapshot_store
+from .summary import rollup
+from .upstream import CircuitBreaker, get_async_client, get_session, npa_breaker, run_blocking
+from .xlsx import XLSX_CONTENT_TYPE, write_report
+
 logger = logging.getLogger(__name__)
 
+DEFAULT_DEPOT = 'KUMASI'
+# Depot cells read 'BOST-KUMASI', 'BOST - KUMASI' or 'BOST-ACCRA PLAINS'; the captured name is the key
+DEPOT_PATTERN = r'BOST\s*-\s*([A-Z][A-Z ]*[A-Z])'
+DEPOT_PREFIX = re.compile(r'^BOST\s*-\s*')
+ORDER_NUMBER_COLUMN = 'ORDER NUMBER'
+# Summary API ?by= group -> OrderSummary field
+SUMMARY_GROUPS = {'date': 'order_date', 'product': 'product', 'bdc': 'bdc'}
+# Block size when streaming a rendered file from disk
+FILE_CHUNK_BYTES = 64 * 1024
+
+def cell_mask(df, predicate):
+    """Evaluate a vectorized string predicate over every cell of df
+
+    The predicate runs once over the distinct cell values of the whole
+    frame; the result is a boolean array shaped like df.
+    """
+    codes, uniques = _factorize_cells(df)
+    return predicate(uniques).to_numpy(dtype=bool)[codes].reshape(df.shape)
+
+def _factorize_cells(df):
+    # Report cells repeat heavily (blanks, products, dates), so work on uniques
+    codes, uniques = pd.factorize(df.to_numpy(dtype=object).ravel())
+    return codes, pd.Series(uniques, dtype=object)
+
 class DataFetcher:
     """Handles data fetching and processing from the API"""
     
-    def __init__(self):
+    def __init__(self, start_date=None, end_date=None):
         self.today = datetime.datetime.now()
         self.yesterday = self.today - datetime.timedelta(days=1)
+        # The report window defaults to yesterday -> today
+        self.default_window = start_date is None and end_date is None
+        self.start_date = start_date or self.yesterday
+        self.end_date = end_date or self.today
         self.date_format = "%d-%m-%Y"
-        
+        self.company_id = 1
+        self.group_by = 'OMC'
+        self.omc_group = 'VEROS PETROLEUM LIMITED'
+
+    def cache_key(self):
+        """Cache key for the report this fetcher would download"""
+        return report_cache.make_key(
+            self.company_id,
+            self.group_by,
+            self.omc_group,
+            self.start_date.strftime(self.date_format),
+            self.end_date.strftime(self.date_format),
+        )
+
+    def last_good_key(self):
+        """Where the last good report is kept to serve while NPA is slow or down
+
+        The default window moves with the clock, so it keeps one copy across
+        days: yesterday's report beats an error page.
+        """
+        if self.default_window:
+            return report_cache.make_key(self.company_id, self.group_by, self.omc_group, 'latest')
+        return report_cache.last_good_key(self.cache_key())
+
+    def request_params(self):
+        """Query string for the NPA ExportDailyOrderReport endpoint"""
+        return {
+            'lngCompanyId': self.company_id,
+            'szITSfromPersol': 'persol',
+            'strGroupBy': self.group_by,
+            'strGroupBy1': self.omc_group,
+            'strQuery1': '',
+            'strQuery2': self.start_date.strftime(self.date_format),
+            'strQuery3': self.end_date.strftime(self.date_format),
+            'strQuery4': '',
+            'strPicHeight': 1,
+            'strPicWeight': 1,
+            'intPeriodID': -1,
+            'iUserId': 123290,
+            'iAppId': 4
+        }
+
     def fetch_data(self):
         """Fetch data from the API and return as DataFrame"""
-        try:
-            params = {
-                'lngCompanyId': 1,
-                'szITSfromPersol': 'persol',
-                'strGroupBy': 'OMC',
-                'strGroupBy1': 'VEROS PETROLEUM LIMITED',
-                'strQuery1': '',
-                'strQuery2': self.yesterday.strftime(self.date_format),
-                'strQuery3': self.today.strftime(self.date_format),
-                'strQuery4': '',
-                'strPicHeight': 1,
-                'strPicWeight': 1,
-                'intPeriodID': -1,
-                'iUserId': 123290,
-                'iAppId': 4
-            }
-
-            headers = {
-                'accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
-                'user-agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/128.0.0.0 Safari/537.36'
-            }
+        import requests
 
-            response = requests.get(
-                "https://iml.npa-enterprise.com/NPAAPILIVE/Home/ExportDailyOrderReport",
-                headers=headers,
-                params=params,
-                timeout=30
-            )
-            response.raise_for_status()
-            
-            df = pd.read_excel(BytesIO(response.content))
-            if df.empty:
-                return None, "Received empty data from API"
-            return df, None
+        if not npa_breaker.allow():
+            return self._short_circuit()
+        try:
+            with metrics.stage('upstream'):
+                response = get_session().get(
+                    settings.NPA_EXPORT_URL,
+                    params=self.request_params(),
+                    timeout=settings.REQUEST_TIMEOUT
+                )
+                response.raise_for_status()
+            npa_breaker.record_success()
+            metrics.observe_upstream('ok', response.content)
+            return self.parse_content(response.content)
             
         except requests.exceptions.RequestException as e:
+            npa_breaker.record_failure()
+            metrics.observe_upstream('error')
             logger.error(f"API request failed: {str(e)}")
             return None, f"Failed to fetch data: {str(e)}"
         except Exception as e:
             logger.error(f"Unexpected error fetching data: {str(e)}")
             return None, f"Unexpected error: {str(e)}"
 
-    def process_data(self, df):
+    async def fetch_data_async(self):
+        """Async fetch_data: pooled httpx download, Excel parse in the blocking pool"""
+        if not npa_breaker.allow():
+            return self._short_circuit()
+        try:
+            with metrics.stage('upstream'):
+                response = await get_async_client().get(settings.NPA_EXPORT_URL, params=self.request_params())
+                response.raise_for_status()
+            npa_breaker.record_success()
+            metrics.observe_upstream('ok', response.content)
+            return await run_blocking(self.parse_content, response.content)
+
+        except httpx.HTTPError as e:
+            npa_breaker.record_failure()
+            metrics.observe_upstream('error')
+            logger.error(f"API request failed: {str(e)}")
+            return None, f"Failed to fetch data: {str(e)}"
+        except Exception as e:
+            logger.error(f"Unexpected error fetching data: {str(e)}")
+            return None, f"Unexpected error: {str(e)}"
+
+    def _short_circuit(self):
+        metrics.observe_upstream('short_circuit')
+        return None, f"NPA is unavailable, retrying in {npa_breaker.retry_after():.0f}s"
+
+    def load_prepared(self):
+        """Download and prepare the report, returning (prepared, (stage, error))"""
+        df, error = self.fetch_data()
+        if error:
+            return None, ('fetch', error)
+        prepared, error = self.prepare_data(df)
+        if error:
+            return None, ('process', error)
+        return prepared, None
+
+    async def aload_prepared(self):
+        """Async load_prepared; parsing and processing run in the blocking pool"""
+        df, error = await self.fetch_data_async()
+        if error:
+            return None, ('fetch', error)
+        prepared, error = await run_blocking(self.prepare_data, df)
+        if error:
+            return None, ('process', error)
+        return prepared, None
+
+    @metrics.stage('parse')
+    def parse_content(self, content):
+        """Parse the downloaded Excel export into a DataFrame
+
+        With snapshots on, a download prepared before comes back as its
+        PreparedReport, which prepare_data passes through.
+        """
+        if settings.REPORT_EXCEL_READER == 'pandas':
+            df = pd.read_excel(BytesIO(content))
+        else:
+            # Already cleaned and without the title rows; see bostapp.ingest
+            df = read_snapshotted(content)
+            if isinstance(df, PreparedReport):
+                return df, None
+        if df is None or (df.empty and not df.attrs.get(CLEANED_ATTR)):
+            return None, "Received empty data from API"
+        return df, None
+
+    def process_data(self, df, depot=DEFAULT_DEPOT):
         """Process and clean the DataFrame"""
+        prepared, error = self.prepare_data(df)
+        if error:
+            return None, error
+        return self.finalize_data(prepared, depot)
+
+    @metrics.stage('prepare')
+    def prepare_data(self, df):
+        """Clean a downloaded report and index its rows by depot
+
+        Everything here is independent of the depot being reported on, so
+        one download is prepared once and finalized for any number of depots.
+        """
         try:
+            if isinstance(df, PreparedReport):
+                # Restored from the download's snapshot by parse_content
+                return df, None
             if df is None or df.empty:
                 return None, "No data to process"
-                
-            # Skip header rows
-            df = df.iloc[7:]
-            
-            # Convert all columns to string and clean
-            df = df.astype(str)
-            df = df.replace('nan', '', regex=True)
+            metrics.observe_rows('in', len(df))
+            digest = df.attrs.get(DIGEST_ATTR)
+
+            if not df.attrs.get(CLEANED_ATTR):
+                # Skip header rows
+                df = df.iloc[HEADER_ROWS:]
+
+                # Convert all columns to string, blanking the missing cells
+                df = df.astype(str).mask(df.isna(), '')
             
             # Remove empty rows and columns
-            df = df[~df.apply(lambda row: all(val.strip() == '' for val in row), axis=1)]
-            df = df.loc[:, ~df.apply(lambda col: all(val.strip() == '' for val in col), axis=0)]
+            blank = cell_mask(df, lambda values: values.str.strip().eq(''))
+            keep_rows = ~blank.all(axis=1)
+            df = df[keep_rows]
+            df = df.loc[:, ~blank[keep_rows].all(axis=0)]
 
             # Delete rows which contain #Total
-            df = df[~df.apply(lambda row: any('Total #' in str(val) for val in row), axis=1)]
+            df = df[~cell_mask(df, lambda values: values.str.contains('Total #', regex=False)).any(axis=1)]
 
-            # Get the updated last column
+            # Rows with an empty last column are kept in every depot's report
             last_column_name = df.columns[-1]
-            
-            # Filter for BOST-KUMASI records
-            mask = df.apply(lambda row: any(
-                "BOST-KUMASI" in val or "BOST - KUMASI" in val 
-                for val in row
-            ), axis=1)
-
-             # Flag rows with empty last column
-            empty_last_col_mask = df[last_column_name].str.strip().eq('')
-            # Combine masks to get rows meeting either condition
-            mask = mask | empty_last_col_mask
-            # Apply the mask to filter the DataFrame
-            if not mask.any():
-                return None, "No BOST-KUMASI records found"
-            df = df[mask]
+            fallback_rows = df[last_column_name].str.strip().eq('').to_numpy()
+            depot_index = build_depot_index(df)
 
-            
-            if df.empty:
-                return None, "No BOST-KUMASI records found"
-            
-                # Drop column if exists
+            # Columns never shown in a report
             if 'Unnamed: 6' in df.columns:
                 df = df.drop(columns=['Unnamed: 6'])
-
-            # Merge columns if they exist
             if 'Unnamed: 19' in df.columns and 'Unnamed: 20' in df.columns:
                 df = df.drop(columns=['Unnamed: 19', 'Unnamed: 20'])
 
-            # Handle rows where only first column has values
+            # Rows where only the first column has a value are headings,
+            # shown once per report; remember them by that value
+            filled = ~cell_mask(df, lambda values: values.eq(''))
             first_col = df.columns[0]
-            mask = df.apply(lambda row: (row != '').sum() == 1 and row[first_col] != '', axis=1)
-            if mask.any():
-                # Get rows where only first column has value
-                special_rows = df[mask].copy()
-                # Keep only first occurrence of each value in the first column
-                special_rows = special_rows.drop_duplicates(subset=[first_col], keep='first')
-                # Update the main dataframe
-                df = pd.concat([df[~mask], special_rows]).sort_index()
-                
+            headings = df[first_col].where((filled.sum(axis=1) == 1) & filled[:, 0]).astype('category')
 
-            
-            # Select and rename columns
-            columns = {
-                'Unnamed: 0': 'ORDER DATE',
-                'Unnamed: 2': 'ORDER NUMBER',
-                'Unnamed: 5': 'PRODUCTS',
-                'Unnamed: 9': 'VOLUME',
-                'Unnamed: 10': 'EX REF PRICE',
-                'Unnamed: 12': 'BRV NUMBER',
-                'Unnamed: 15': 'BDC'
-            }
-            
-            # Keep only columns that exist in the DataFrame
-            available_columns = [col for col in columns.keys() if col in df.columns]
-            df = df[available_columns].rename(columns=columns)
+            # Only the reported columns are kept, typed; see bostapp.schema
+            available_columns = [col for col in REPORT_COLUMNS if col in df.columns]
+            df = type_report(df[available_columns].rename(columns=REPORT_COLUMNS))
+            prepared = PreparedReport(df, depot_index, fallback_rows, headings)
+            if digest:
+                save_prepared_snapshot(digest, prepared)
+            return prepared, None
+
+        except Exception as e:
+            logger.error(f"Error processing data: {str(e)}")
+            return None, f"Data processing error: {str(e)}"
+
+    @metrics.stage('finalize')
+    def finalize_data(self, prepared, depot=DEFAULT_DEPOT, strict=False):
+        """Select one depot's rows from a prepared report and shape the output
+
+        With strict=True only rows that name the depot are kept, without the
+        empty-last-column rows every report carries. A depot the report
+        never names is an error, not a report of those rows alone.
+        """
+        try:
+            depot = normalize_depot(depot)
+            rows = prepared.rows_for(depot)
+            if not len(rows):
+                return None, missing_depot_message(prepared, depot)
+            mask = np.zeros(len(prepared.df), dtype=bool)
+            mask[rows] = True
+            if not strict:
+                mask |= prepared.fallback_rows
+            df = prepared.df[mask]
+
+            # Keep only the first occurrence of each heading
+            headings = prepared.headings[mask]
+            repeated = headings.notna() & headings.duplicated()
+            if repeated.any():
+                df = df[~repeated.to_numpy()]
+            # Categories of other depots' products and BDCs would show up in groupbys
+            df = df.apply(lambda values: values.cat.remove_unused_categories()
+                          if isinstance(values.dtype, pd.CategoricalDtype) else values)
+            metrics.observe_rows('out', len(df))
             
             return df, None
             
@@ -146,20 +311,216 @@ class DataFetcher:
             logger.error(f"Error processing data: {str(e)}")
             return None, f"Data processing error: {str(e)}"
 
+class PreparedReport:
+    """A typed report with its rows indexed by depot"""
+
+    def __init__(self, df, depot_index, fallback_rows, headings):
+        self.df = df
+        # Normalized depot name -> positions of the rows naming it
+        self.depot_index = depot_index
+        self.fallback_rows = fallback_rows
+        # Heading text for heading rows, NaN for the rest
+        self.headings = headings
+        # report_fingerprint of df; set by fingerprint_prepared
+        self.fingerprint = None
+
+    def depots(self):
+        return sorted(self.depot_index)
+
+    @classmethod
+    def merge(cls, reports, key_column=ORDER_NUMBER_COLUMN):
+        """Concatenate prepared reports in order, keeping the first copy of each order"""
+        df = conform(pd.concat([report.df for report in reports], ignore_index=True))
+        headings = pd.concat([report.headings for report in reports], ignore_index=True).astype('category')
+        fallback_rows = np.concatenate([report.fallback_rows for report in reports])
+
+        # Shift each report's depot positions past the reports before it
+        depot_index = {}
+        offset = 0
+        for report in reports:
+            for depot, positions in report.depot_index.items():
+                depot_index.setdefault(depot, []).append(positions + offset)
+            offset += len(report.df)
+        depot_index = {depot: np.concatenate(positions) for depot, positions in depot_index.items()}
+
+        if key_column in df.columns:
+            orders = df[key_column]
+            keep = (orders.isna() | ~orders.duplicated()).to_numpy()
+            df = df[keep].reset_index(drop=True)
+            headings = headings[keep].reset_index(drop=True)
+            fallback_rows = fallback_rows[keep]
+            new_positions = np.cumsum(keep) - 1
+            depot_index = {
+                depot: new_positions[positions[keep[positions]]] for depot, positions in depot_index.items()
+            }
+        return cls(df, depot_index, fallback_rows, headings)
+
+    def rows_for(self, depot):
+        return self.depot_index.get(normalize_depot(depot), np.empty(0, dtype=np.intp))
+
+class RangeFetcher(DataFetcher):
+    """Fetches a long date range as daily or weekly chunks in parallel
+
+    Each chunk covers whole days, from its start day to its end day, and
+    the next one starts the day after, so no day is downloaded twice.
+    Orders a report repeats are still removed by ORDER NUMBER when the
+    chunks are merged back in date order.
+    """
+
+    chunk_days = {'day': 1, 'week': 7}
+
+    def __init__(self, start_date, end_date, chunk='day', max_workers=None, retries=None):
+        super().__init__(start_date, end_date)
+        if chunk not in self.chunk_days:
+            raise ValueError(f"Unknown chunk size: {chunk}")
+        self.chunk = chunk
+        self.max_workers = max_workers or settings.BACKFILL_WORKERS
+        self.retries = settings.BACKFILL_RETRIES if retries is None else retries
+
+    def cache_key(self):
+        return report_cache.make_key(super().cache_key(), 'range', self.chunk)
+
+    def chunks(self):
+        """One DataFetcher per chunk of the window, in date order"""
+        day = datetime.timedelta(days=1)
+        start = self.start_date
+        while start <= self.end_date:
+            end = min(start + day * (self.chunk_days[self.chunk] - 1), self.end_date)
+            yield DataFetcher(start, end)
+            start = end + day
+
+    def load_prepared(self):
+        """Fetch and prepare every chunk on a bounded pool, then merge them"""
+        chunks = list(self.chunks())
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(chunks))) as pool:
+            # Each chunk keeps the caller's context so its stages count towards the request
+            futures = [pool.submit(contextvars.copy_context().run, self._load_chunk, chunk) for chunk in chunks]
+            results = [future.result() for future in futures]
+
+        prepared = []
+        for fetcher, (report, error) in zip(chunks, results):
+            window = f"{fetcher.start_date:%d-%m-%Y}..{fetcher.end_date:%d-%m-%Y}"
+            if error and error[0] == 'fetch':
+                return None, ('fetch', f"Chunk {window} failed: {error[1]}")
+            if error:
+                # A chunk with nothing left after cleaning is simply an empty day
+                logger.info(f"Range chunk {window} has no data: {error[1]}")
+                continue
+            prepared.append(report)
+
+        if not prepared:
+            return None, ('process', "No data in the requested date range")
+        return run_step(lambda: PreparedReport.merge(prepared), "Error merging date range")
+
+    async def aload_prepared(self):
+        return await run_blocking(self.load_prepared)
+
+    def _load_chunk(self, fetcher):
+        """Load one chunk, retrying upstream failures with exponential backoff"""
+        for attempt in range(self.retries + 1):
+            prepared, error = fetcher.load_prepared()
+            if error is None or error[0] != 'fetch' or attempt == self.retries:
+                return prepared, error
+            delay = settings.BACKFILL_RETRY_DELAY * 2 ** attempt
+            logger.warning(f"Retrying chunk {fetcher.start_date:%d-%m-%Y} in {delay:.1f}s: {error[1]}")
+            time.sleep(delay)
+
+def run_step(func, message):
+    """Call func, returning (result, None) or (None, ('process', error))"""
+    try:
+        return func(), None
+    except Exception as e:
+        logger.error(f"{message}: {str(e)}")
+        return None, ('process', f"{message}: {str(e)}")
+
+def read_snapshotted(content):
+    """read_report, answered from the snapshot store for downloads seen before
+
+    Returns the PreparedReport itself when one was saved for the download,
+    leaving prepare_data nothing to do.
+    """
+    if not snapshot_store.enabled:
+        return read_report(content)
+    digest = content_digest(content)
+    stored = snapshot_store.load_prepared(digest)
+    if stored is not None:
+        metrics.observe_snapshot('hit')
+        return PreparedReport(*stored)
+    df = snapshot_store.load(digest)
+    metrics.observe_snapshot('miss' if df is None else 'hit')
+
+    if df is None:
+        df = read_report(content)
+        if df is not None:
+            try:
+                snapshot_store.save(content, df, digest)
+            except Exception as e:
+                logger.error(f"Snapshot error: {str(e)}")
+    if df is not None:
+        df.attrs[DIGEST_ATTR] = digest
+    return df
+
+def save_prepared_snapshot(digest, prepared):
+    """Keep a prepared report with the download it came from, without failing the request"""
+    try:
+        snapshot_store.save_prepared(
+            digest, prepared.df, prepared.depot_index, prepared.fallback_rows, prepared.headings)
+    except Exception as e:
+        logger.error(f"Prepared snapshot error: {str(e)}")
+
+def parse_report_date(value):
+    """Parse a dd-mm-yyyy or yyyy-mm-dd query date"""
+    for date_format in ("%d-%m-%Y", "%Y-%m-%d"):
+        try:
+            return datetime.datetime.strptime(value.strip(), date_format)
+        except ValueError:
+            pass
+    raise ValueError(f"Invalid date '{value}', expected DD-MM-YYYY")
+
+def normalize_depot(name):
+    """Canonical depot key: 'BOST - Kumasi', 'bost-kumasi' and 'kumasi' all give 'KUMASI'"""
+    return ' '.join(DEPOT_PREFIX.sub('', name.strip().upper()).split())
+
+def missing_depot_message(prepared, depot):
+    """Error for a depot the report never names, listing the ones it does"""
+    depots = ', '.join(f"BOST-{name}" for name in prepared.depots()) or 'none'
+    return f"No BOST-{normalize_depot(depot)} records found; depots in this report: {depots}"
+
+def build_depot_index(df):
+    """Map each depot named anywhere in df to the positions of its rows"""
+    codes, uniques = _factorize_cells(df)
+    names = uniques.str.extract(DEPOT_PATTERN, expand=False)
+    name_codes, depot_names = pd.factorize(names)
+    cell_depots = name_codes[codes].reshape(df.shape)
+    return {
+        normalize_depot(name): np.flatnonzero((cell_depots == code).any(axis=1))
+        for code, name in enumerate(depot_names)
+    }
+
 class PDFGenerator:
     """Handles PDF generation from DataFrame"""
+
+    row_height = 8
+    bottom_margin = 15
+    header_limit = 15
+    cell_limit = 20
     
     def __init__(self):
         self.font = "Arial"  # Use Arial which is more reliable
         
-    def generate(self, df, title):
-        """Generate PDF from DataFrame"""
+    @metrics.stage('render_pdf')
+    def generate(self, df, title, summary=None):
+        """Generate PDF from DataFrame, with a closing summary page if a summarize() frame is given"""
+        # fpdf is only loaded by the first render: it is slow to import and most workers never need it
+        from fpdf import FPDF
+
         try:
             if df is None or df.empty:
                 return None, "No data available for PDF generation"
+            df = display_frame(df)
                     
             pdf = FPDF(orientation='L', unit='mm', format='A4')
-            pdf.set_auto_page_break(auto=True, margin=15)
+            pdf.set_auto_page_break(auto=True, margin=self.bottom_margin)
             pdf.add_page()
                 
             # Title
@@ -175,26 +536,21 @@ class PDFGenerator:
             
             # Limit column width to reasonable size
             col_widths = [min(col_width, 40) for _ in df.columns]
+
+            # Truncate header and cell text once, column by column
+            headers = [truncate_text(str(col), self.header_limit) for col in df.columns]
+            columns = [self._column_text(df.iloc[:, i]) for i in range(num_cols)]
+            rows = list(zip(*columns))
                 
             # Header
-            pdf.set_font(self.font, 'B', 8)
-            for col, width in zip(df.columns, col_widths):
-                # Truncate long column names
-                col_text = str(col)[:15] + "..." if len(str(col)) > 15 else str(col)
-                pdf.cell(width, 8, col_text, border=1, align='C')
-            pdf.ln()
+            self._write_header(pdf, headers, col_widths)
                 
             # Rows
             pdf.set_font(self.font, size=7)
-            for _, row in df.iterrows():
-                if pdf.get_y() + 8 > pdf.h - 15:
-                    self._add_header_page(pdf, df, col_widths)
-                    
-                for col, width in zip(df.columns, col_widths):
-                    # Truncate long cell values
-                    cell_text = str(row[col])[:20] + "..." if len(str(row[col])) > 20 else str(row[col])
-                    pdf.cell(width, 8, cell_text, border=1)
-                pdf.ln()
+            self._write_rows(pdf, rows, headers, col_widths)
+
+            if summary is not None:
+                self._add_summary_page(pdf, summary)
                     
             # Use BytesIO to handle binary output properly
             pdf_output = BytesIO()
@@ -213,19 +569,347 @@ class PDFGenerator:
             logger.error(f"PDF generation error: {str(e)}")
             logger.error(f"PDF generation traceback: {traceback.format_exc()}")
             return None, f"PDF generation failed: {str(e)}"
+
+    def _column_text(self, values):
+        """Cell text for one column, truncated like truncate_text()"""
+        text = values.astype(str)
+        return text.where(text.str.len() <= self.cell_limit, text.str[:self.cell_limit] + "...").tolist()
+
+    def _write_rows(self, pdf, rows, headers, col_widths):
+        """Lay rows out a page at a time
+
+        The number of rows that fit is worked out once per page, and each
+        cell is drawn with the same border and text operators cell() would
+        emit, without its per-call line-breaking and styling work.
+        """
+        lefts = list(accumulate([pdf.l_margin] + col_widths[:-1]))
+        height = self.row_height
+        position = 0
+        while position < len(rows):
+            y = pdf.get_y()
+            capacity = int((pdf.h - self.bottom_margin - y) // height)
+            if capacity < 1:
+                self._add_header_page(pdf, headers, col_widths)
+                continue
+
+            baseline = 0.5 * height + 0.3 * pdf.font_size
+            for row in rows[position:position + capacity]:
+                for text, x, width in zip(row, lefts, col_widths):
+                    pdf.rect(x, y, width, height)
+                    if text:
+                        pdf.text(x + pdf.c_margin, y + baseline, text)
+                y += height
+            pdf.set_xy(pdf.l_margin, y)
+            position += capacity
+
+    def _write_header(self, pdf, headers, col_widths):
+        pdf.set_font(self.font, 'B', 8)
+        for col_text, width in zip(headers, col_widths):
+            pdf.cell(width, self.row_height, col_text, border=1, align='C')
+        pdf.ln()
             
-    def _add_header_page(self, pdf, df, col_widths):
+    def _add_header_page(self, pdf, headers, col_widths):
         """Add new page with headers"""
         pdf.add_page()
-        pdf.set_font(self.font, 'B', 8)
-        for col, width in zip(df.columns, col_widths):
-            col_text = str(col)[:15] + "..." if len(str(col)) > 15 else str(col)
-            pdf.cell(width, 8, col_text, border=1, align='C')
-        pdf.ln()
+        self._write_header(pdf, headers, col_widths)
         pdf.set_font(self.font, size=7)
 
+    def _add_summary_page(self, pdf, summary):
+        """Volume and order totals by product, then by BDC"""
+        pdf.add_page()
+        pdf.set_font(self.font, 'B', 12)
+        pdf.cell(0, 10, "SUMMARY", ln=True, align='C')
+        for column in ('PRODUCTS', 'BDC'):
+            if column not in summary.columns:
+                continue
+            totals = display_frame(rollup(summary, [column]))
+            headers = list(totals.columns)
+            col_widths = [80, 40, 30]
+            rows = list(zip(*(self._column_text(totals[header]) for header in headers)))
+            pdf.ln(4)
+            self._write_header(pdf, headers, col_widths)
+            pdf.set_font(self.font, size=7)
+            self._write_rows(pdf, rows, headers, col_widths)
+
+def truncate_text(text, limit):
+    """Shorten text to limit characters, marking the cut with an ellipsis"""
+    return text[:limit] + "..." if len(text) > limit else text
+
+def _fetch_and_process(fetcher):
+    """Download and prepare one report, tagging errors with the failing stage"""
+    prepared, error = fetcher.load_prepared()
+    if error is None:
+        fingerprint_prepared(prepared)
+        store_orders(fetcher, prepared)
+        record_changes(fetcher, prepared)
+    return prepared, error
+
+async def _afetch_and_process(fetcher):
+    """Async _fetch_and_process; orders are stored and changes recorded after the response goes out"""
+    prepared, error = await fetcher.aload_prepared()
+    if error is None:
+        await run_blocking(fingerprint_prepared, prepared)
+        schedule_ingest(fetcher, prepared)
+    return prepared, error
+
+# Ingests started by requests, kept so they are not garbage collected mid-run
+ingest_tasks = set()
+# Held while a report's orders are stored
+store_lock = threading.Lock()
+
+def schedule_ingest(fetcher, prepared):
+    """Store a report loaded for a request in a task of its own, off the request's path"""
+    loop = asyncio.get_running_loop()
+    task = contextvars.Context().run(loop.create_task, _aingest(fetcher, prepared))
+    ingest_tasks.add(task)
+    task.add_done_callback(ingest_tasks.discard)
+
+async def _aingest(fetcher, prepared):
+    # Let the request that loaded the report send its response first
+    await asyncio.sleep(0)
+    await sync_to_async(store_orders)(fetcher, prepared)
+    await run_blocking(record_changes, fetcher, prepared)
+
+def store_orders(fetcher, prepared):
+    """Upsert every depot's orders into OrderRecord without failing the request
+
+    A report whose fingerprint was stored already is skipped. A request
+    that needs the orders stored calls this too; the lock makes it wait
+    for, rather than repeat, the background ingest of the same report.
+    """
+    stored_key = f"bost:stored:{prepared.fingerprint}"
+    with store_lock:
+        if prepared.fingerprint and report_cache.meta_cache.get(stored_key):
+            return
+        for depot in prepared.depots():
+            try:
+                df, error = fetcher.finalize_data(prepared, depot, strict=True)
+                if error:
+                    continue
+                created, updated = OrderRecord.objects.upsert_frame(df, f"BOST-{depot}")
+                logger.info(f"Stored BOST-{depot} orders: {created} new, {updated} changed")
+            except Exception as e:
+                logger.error(f"Order snapshot error: {str(e)}")
+        if prepared.fingerprint:
+            report_cache.meta_cache.set(stored_key, True, FIRST_SEEN_TTL)
+
+def fingerprint_prepared(prepared):
+    """Fingerprint the report, so the fingerprint is cached along with it"""
+    try:
+        prepared.fingerprint = report_fingerprint(prepared.df)
+    except Exception as e:
+        logger.error(f"Report fingerprint error: {str(e)}")
+
+def order_index_for(fetcher, prepared, depot):
+    """The depot's OrderIndex, built once per worker for each report content; None if the depot is missing"""
+    depot = normalize_depot(depot)
+    if depot not in prepared.depot_index:
+        return None
+
+    def build():
+        df, error = fetcher.finalize_data(prepared, depot)
+        return None if error else OrderIndex(df)
+
+    fingerprint = prepared.fingerprint or report_fingerprint(prepared.df)
+    return order_indexes.get_or_build((fingerprint, depot), build)
+
+def record_changes(fetcher, prepared):
+    """Add each depot's new, changed and removed orders to the change feed
+
+    Only the latest report feeds it; other windows are not a refresh of it.
+    A depot whose rows are the ones recorded last time is skipped before
+    its OrderIndex is built or hashed.
+    """
+    if not fetcher.default_window:
+        return
+    for depot in prepared.depots():
+        try:
+            version = report_version(prepared, depot)
+            if change_feed.unchanged(depot, version):
+                continue
+            index = order_index_for(fetcher, prepared, depot)
+            if index is None:
+                continue
+            event = change_feed.record(depot, index, version)
+            if event:
+                logger.info(f"BOST-{depot} changes: {len(event['new'])} new, "
+                            f"{len(event['changed'])} changed, {len(event['removed'])} removed")
+        except Exception as e:
+            logger.error(f"Change feed error: {str(e)}")
+
+async def aload_prepared(fetcher, context):
+    """Return (prepared, error_response, age) for the whole report, every depot included"""
+    prepared, error, age = await report_cache.aget_or_stale(
+        fetcher.cache_key(), lambda: _afetch_and_process(fetcher), fetcher.last_good_key())
+    return prepared if error is None else None, _report_error_response(error, context), age
+
+async def aload_report(fetcher, context, depot=DEFAULT_DEPOT):
+    """Return (df, error_response, age, version) for one depot's report via the shared cache
+
+    age is how many seconds old a last good report served during a refresh
+    is, and 0 for a fresh one; version is its report_version.
+    """
+    prepared, error_response, age = await aload_prepared(fetcher, context)
+    if error_response:
+        return None, error_response, age, None
+    df, error_response = await afinalize_report(fetcher, prepared, context, depot)
+    return df, error_response, age, report_version(prepared, depot)
+
+async def afinalize_report(fetcher, prepared, context, depot=DEFAULT_DEPOT):
+    """Return (df, error_response) for one depot of a loaded report"""
+    df, error = await run_blocking(fetcher.finalize_data, prepared, depot)
+    error = error and ('process', error)
+    return df if error is None else None, _report_error_response(error, context)
+
+def report_fetcher(request):
+    """Fetcher for the ?start=&end= window, or the default yesterday-today one
+
+    Returns (fetcher, error_response). Windows longer than two days are
+    fetched in ?chunk=day|week pieces by RangeFetcher.
+    """
+    fetcher, error = fetcher_for(request.GET)
+    if error:
+        return None, HttpResponse(f"Error: {error}", status=400, content_type='text/plain')
+    return fetcher, None
+
+def report_window(params):
+    """(start_date, end_date) for the start and end values in params, yesterday-today by default
+
+    Raises ValueError for an unreadable date or a start after the end.
+    """
+    start, end = params.get('start'), params.get('end')
+    end_date = parse_report_date(end) if end else datetime.datetime.now()
+    start_date = parse_report_date(start) if start else end_date - datetime.timedelta(days=1)
+    if start_date > end_date:
+        raise ValueError("start date is after end date")
+    return start_date, end_date
+
+def fetcher_for(params):
+    """Fetcher for the start, end and chunk values in params; returns (fetcher, error)"""
+    if not params.get('start') and not params.get('end'):
+        return DataFetcher(), None
+    try:
+        start_date, end_date = report_window(params)
+    except ValueError as e:
+        return None, str(e)
+
+    days = (end_date - start_date).days
+    if days > settings.REPORT_MAX_RANGE_DAYS:
+        return None, f"date range is limited to {settings.REPORT_MAX_RANGE_DAYS} days"
+    if days <= 1:
+        return DataFetcher(start_date, end_date), None
+
+    chunk = params.get('chunk') or 'day'
+    if chunk not in RangeFetcher.chunk_days:
+        return None, "chunk must be 'day' or 'week'"
+    return RangeFetcher(start_date, end_date, chunk=chunk), None
+
+def wants_stored(request):
+    """Read the report from stored orders when asked to with ?source=stored"""
+    return request.GET.get('source') == 'stored'
+
+def stored_report(request, depot):
+    """Return (df, error_response) for the depot's stored orders dated in the ?start=&end= window
+
+    Reads the indexed OrderRecord table instead of downloading the report,
+    so any window of the stored history can be served, with no range limit.
+    Stored reports have only the rows that name the depot, and no group
+    heading rows.
+    """
+    try:
+        start_date, end_date = report_window(request.GET)
+    except ValueError as e:
+        return None, HttpResponse(f"Error: {str(e)}", status=400, content_type='text/plain')
+    orders = OrderRecord.objects.filter(
+        depot=f"BOST-{depot}", order_date__range=(start_date.date(), end_date.date()))
+    df = orders.to_report_frame()
+    if df.empty:
+        message = (f"No stored BOST-{depot} orders dated {start_date.strftime('%d-%m-%Y')} "
+                   f"to {end_date.strftime('%d-%m-%Y')}")
+        return None, HttpResponse(f"Error: {message}", status=404, content_type='text/plain')
+    return df, None
+
+def stored_summaries(depot, date_from=None, date_to=None):
+    """The depot's OrderSummary rows with ORDER DATE from date_from to date_to, either bound optional
+
+    The summary API and the PDF summary page both read through here, so
+    their totals cover the same stored orders.
+    """
+    summaries = OrderSummary.objects.filter(depot=f"BOST-{normalize_depot(depot)}")
+    if date_from is not None:
+        summaries = summaries.filter(order_date__gte=date_from)
+    if date_to is not None:
+        summaries = summaries.filter(order_date__lte=date_to)
+    return summaries
+
+def report_summary(df, depot):
+    """summarize() frame of the depot's stored orders dated within the report's ORDER DATE span
+
+    Gives the totals /api/summary/ gives for the same depot and dates.
+    """
+    if 'ORDER DATE' not in df.columns or df['ORDER DATE'].isna().all():
+        return OrderSummary.objects.none().to_summary_frame()
+    return stored_summaries(depot, df['ORDER DATE'].min().date(), df['ORDER DATE'].max().date()).to_summary_frame()
+
+def requested_depot(request):
+    """Depot named by the ?depot= query parameter, BOST-KUMASI by default"""
+    return normalize_depot(request.GET.get('depot', '')) or DEFAULT_DEPOT
+
+def _report_error_response(error, context):
+    if error is None:
+        return None
+    stage, message = error if isinstance(error, tuple) else ('fetch', error)
+    logger.error(f"{context} {stage} error: {message}")
+    if stage == 'fetch' and npa_breaker.state != CircuitBreaker.CLOSED:
+        # Nothing cached to fall back on and NPA is known to be down
+        response = HttpResponse(f"Error: {message}", status=503, content_type='text/plain')
+        response['Retry-After'] = str(max(int(npa_breaker.retry_after()), 1))
+        return response
+    status = 404 if stage == 'process' else 500
+    return HttpResponse(f"Error: {message}", status=status, content_type='text/plain')
+
+def report_fingerprint(df, *variant):
+    """Fingerprint of a processed report plus whatever else shapes its rendering"""
+    digest = hashlib.sha1(repr((list(df.columns), variant)).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+def report_version(prepared, depot):
+    """Identifies one depot's rows of a loaded report, from the fingerprint cached with it"""
+    fingerprint = prepared.fingerprint or report_fingerprint(prepared.df)
+    return f"{fingerprint}:{normalize_depot(depot)}"
+
+async def report_validators(version, fmt, *variant):
+    """(fingerprint, etag, last_modified) identifying one rendering of a report
+
+    version is a report_version, or a report_fingerprint of a report that
+    was not loaded through the cache; the rows are not hashed again here.
+    The ETag is weak: renderings of the same data are equivalent, but a
+    PDF's embedded creation date differs between workers.
+    """
+    fingerprint = hashlib.sha1(repr((version, fmt, variant)).encode('utf-8')).hexdigest()
+    return fingerprint, f'W/"{fingerprint}"', await report_cache.afirst_seen(fingerprint)
+
+def not_modified_response(request, fmt, etag, last_modified):
+    """304 when the client already holds this rendering, otherwise None"""
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        metrics.observe_artifact(fmt, 'not_modified')
+    return response
+
+def with_validators(response, etag, last_modified, age=0):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    # Browsers and proxies may keep a copy but must check back before reusing it
+    patch_cache_control(response, no_cache=True)
+    if age:
+        # A last good report served while NPA is refreshed or down
+        response['Age'] = str(int(age))
+    return response
+
+@ensure_csrf_cookie
 def home(request):
-    """Home view with error handling"""
+    """Home view with error handling; sets the CSRF cookie the jobs API needs"""
     try:
         return render(request, 'bostapp/index.html')
     except Exception as e:
@@ -234,90 +918,583 @@ def home(request):
         return HttpResponse("Application temporarily unavailable. Please try again later.", 
                           status=500, content_type='text/plain')
 
-def export_csv(request):
+def _query_list(request, name):
+    # ?by=date&by=product and ?by=date,product mean the same; only for names, which have no commas
+    return [value for raw in request.GET.getlist(name) for value in raw.split(',') if value.strip()]
+
+def _query_values(request, name):
+    # Report values such as 'Star Oil, Ltd' may hold commas, so each is a parameter of its own
+    return [value for value in request.GET.getlist(name) if value.strip()]
+
+def order_query(request, index):
+    """Filters, fields, cursor and limit of an orders API request
+
+    Returns (query, error_response).
+    """
+    def bad_request(message):
+        return None, HttpResponse(f"Error: {message}", status=400, content_type='text/plain')
+
+    query = {'filters': {name: _query_values(request, name) for name in FILTER_COLUMNS}}
+    try:
+        for bound in ('date_from', 'date_to'):
+            value = request.GET.get(bound)
+            query[bound] = parse_report_date(value).date() if value else None
+        query['after'] = decode_cursor(request.GET['cursor']) if request.GET.get('cursor') else None
+        limit = int(request.GET.get('limit', settings.ORDERS_API_PAGE_SIZE))
+    except ValueError as e:
+        return bad_request(str(e))
+    if not 1 <= limit <= settings.ORDERS_API_MAX_PAGE_SIZE:
+        return bad_request(f"limit must be between 1 and {settings.ORDERS_API_MAX_PAGE_SIZE}")
+    query['limit'] = limit
+
+    fields = _query_list(request, 'fields') or index.fields
+    unknown = [field for field in fields if field not in index.fields]
+    if unknown:
+        return bad_request(f"Unknown fields: {', '.join(unknown)}; available: {', '.join(index.fields)}")
+    query['fields'] = fields
+    return query, None
+
+def _orders_page(index, query):
+    """Compact JSON for one page of matching orders"""
+    positions = index.match(query['date_from'], query['date_to'], **query['filters'])
+    rows, next_cursor = index.page(positions, query['after'], query['limit'], query['fields'])
+    # Rows are arrays in field order rather than objects: keys are not repeated per order
+    return json.dumps(
+        {'count': len(positions), 'fields': query['fields'], 'rows': rows, 'next_cursor': next_cursor},
+        separators=(',', ':'), ensure_ascii=False,
+    )
+
+async def orders_api(request):
+    """Processed orders as paginated JSON, filtered through the report's column indexes
+
+    Filters: ?product=, ?bdc=, ?brv= (repeated for several values, matched
+    case-insensitively) and ?date_from=/?date_to= on ORDER DATE. ?fields=
+    picks columns, comma-separated, ?limit= sizes the page and ?cursor= continues from a
+    previous page's next_cursor. ?depot=, ?start= and ?end= choose the
+    report as for the CSV export.
+    """
+    try:
+        fetcher, error_response = report_fetcher(request)
+        if error_response:
+            return error_response
+        depot = requested_depot(request)
+        prepared, error_response, age = await aload_prepared(fetcher, "Orders API")
+        if error_response:
+            return error_response
+
+        index = await run_blocking(order_index_for, fetcher, prepared, depot)
+        if index is None:
+            return HttpResponse(f"Error: {missing_depot_message(prepared, depot)}", status=404,
+                                content_type='text/plain')
+        query, error_response = order_query(request, index)
+        if error_response:
+            return error_response
+        try:
+            body = await run_blocking(_orders_page, index, query)
+        except ValueError as e:
+            return HttpResponse(f"Error: {str(e)}", status=400, content_type='text/plain')
+
+        response = HttpResponse(body, content_type='application/json')
+        if age:
+            response['Age'] = str(int(age))
+        return response
+
+    except Exception as e:
+        logger.error(f"Orders API unexpected error: {str(e)}")
+        logger.error(f"Orders API traceback: {traceback.format_exc()}")
+        return HttpResponse(f"Unexpected error: {str(e)}", status=500, content_type='text/plain')
+
+async def read_change_feed(depot):
+    """The depot's change feed, refreshing the latest report first if the feed has gone quiet
+
+    Loading the report serves it from the cache and, once it has expired,
+    refreshes it, which records the next event in the background for a
+    later read to pick up. A failed load leaves the feed as it is.
+    """
+    feed = await change_feed.aread(depot)
+    if change_feed.due(depot, feed):
+        await aload_prepared(DataFetcher(), "Change feed")
+        feed = await change_feed.aread(depot)
+    return feed
+
+def _feed_position(request, feed):
+    """Sequence number a change feed client has seen, or the feed's current one"""
+    since = request.headers.get('Last-Event-ID') or request.GET.get('since')
+    return feed['seq'] if since is None else int(since)
+
+async def changes_api(request):
+    """Orders that are new, changed or removed since ?since=, as JSON
+
+    Each event is one report refresh: new and changed orders as rows of
+    fields, removed ones as order numbers. Without ?since= only the
+    current sequence number is returned, to start from. reset means
+    events after ?since= are gone and the report should be reloaded.
+    """
+    try:
+        depot = requested_depot(request)
+        feed = await read_change_feed(depot)
+        try:
+            since = _feed_position(request, feed)
+        except ValueError:
+            return HttpResponse("Error: since must be a whole number", status=400, content_type='text/plain')
+        events, reset = events_since(feed, since)
+        return JsonResponse({
+            'depot': f"BOST-{depot}",
+            'seq': feed['seq'],
+            'fields': feed['fields'],
+            'events': events,
+            'reset': reset,
+        })
+
+    except Exception as e:
+        logger.error(f"Changes API unexpected error: {str(e)}")
+        logger.error(f"Changes API traceback: {traceback.format_exc()}")
+        return HttpResponse(f"Unexpected error: {str(e)}", status=500, content_type='text/plain')
+
+async def changes_stream(request):
+    """The change feed as server-sent events
+
+    Sends a 'changes' event per refresh with changes, with the sequence
+    number as its id so a reconnecting browser resumes where it left off,
+    or 'reset' when it fell too far behind. The stream ends after
+    CHANGE_FEED_STREAM_SECONDS and EventSource reconnects by itself.
+    """
+    depot = requested_depot(request)
+    try:
+        since = _feed_position(request, await change_feed.aread(depot))
+    except ValueError:
+        return HttpResponse("Error: since must be a whole number", status=400, content_type='text/plain')
+
+    async def events(since):
+        deadline = time.monotonic() + settings.CHANGE_FEED_STREAM_SECONDS
+        yield f"retry: {int(settings.CHANGE_FEED_POLL_SECONDS * 1000)}\n\n"
+        while True:
+            try:
+                feed = await read_change_feed(depot)
+                changes, reset = events_since(feed, since)
+                if reset:
+                    since = feed['seq']
+                    yield f"id: {since}\nevent: reset\ndata: {json.dumps({'seq': since})}\n\n"
+                for event in changes:
+                    since = event['seq']
+                    data = json.dumps({'fields': feed['fields'], **event}, separators=(',', ':'), ensure_ascii=False)
+                    yield f"id: {since}\nevent: changes\ndata: {data}\n\n"
+                if not reset and not changes:
+                    # Keeps proxies from closing an idle connection
+                    yield ": keepalive\n\n"
+            except Exception as e:
+                logger.error(f"Change stream error: {str(e)}")
+                return
+            if time.monotonic() >= deadline:
+                return
+            await asyncio.sleep(settings.CHANGE_FEED_POLL_SECONDS)
+
+    response = StreamingHttpResponse(events(since), content_type='text/event-stream')
+    patch_cache_control(response, no_cache=True)
+    # Tell nginx not to buffer the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+def summary_api(request):
+    """Order volume and count totals from the stored summary, as JSON
+
+    ?by= groups by any of date, product and bdc (comma-separated, product
+    by default); ?depot= picks the depot and ?date_from=/?date_to= bound
+    ORDER DATE. Totals cover every order stored so far, whichever report
+    brought it in, and are read from OrderSummary rather than the orders,
+    as the PDF summary page is.
+    """
+    try:
+        by = _query_list(request, 'by') or ['product']
+        unknown = [name for name in by if name not in SUMMARY_GROUPS]
+        if unknown:
+            return HttpResponse(
+                f"Error: Unknown groups: {', '.join(unknown)}; available: {', '.join(SUMMARY_GROUPS)}",
+                status=400, content_type='text/plain')
+
+        depot = requested_depot(request)
+        try:
+            date_from, date_to = (
+                parse_report_date(request.GET[bound]).date() if request.GET.get(bound) else None
+                for bound in ('date_from', 'date_to')
+            )
+        except ValueError as e:
+            return HttpResponse(f"Error: {str(e)}", status=400, content_type='text/plain')
+        summaries = stored_summaries(depot, date_from, date_to)
+
+        fields = [SUMMARY_GROUPS[name] for name in by]
+        rows = [
+            [*(group[field] or None for field in fields), float(group['total_volume']), group['total_orders']]
+            for group in summaries.totals(fields)
+        ]
+        return JsonResponse({
+            'depot': f"BOST-{depot}",
+            'fields': [*by, 'volume', 'orders'],
+            'rows': rows,
+            'total': {'volume': sum(row[-2] for row in rows), 'orders': sum(row[-1] for row in rows)},
+        })
+
+    except Exception as e:
+        logger.error(f"Summary API unexpected error: {str(e)}")
+        logger.error(f"Summary API traceback: {traceback.format_exc()}")
+        return HttpResponse(f"Unexpected error: {str(e)}", status=500, content_type='text/plain')
+
+def wants_summary(request):
+    """Add a summary page to the PDF when asked to with ?summary=1"""
+    return request.GET.get('summary', '0') not in ('0', 'false', '')
+
+def wants_streaming(request, df):
+    """Stream when asked to with ?stream=1 or when the report is large"""
+    if 'stream' in request.GET:
+        return request.GET['stream'] not in ('0', 'false', '')
+    return len(df) > settings.CSV_STREAM_THRESHOLD_ROWS
+
+async def iter_csv_chunks(df, chunk_rows=None):
+    """Yield the report as CSV text, a block of rows at a time
+
+    Nothing is kept once sent: streamed reports are the large ones, so
+    they skip the artifact cache rather than build a second full copy.
+    """
+    chunk_rows = chunk_rows or settings.CSV_STREAM_CHUNK_ROWS
+    try:
+        for start in [None, *range(0, len(df), chunk_rows)]:
+            if start is None:
+                chunk = display_frame(df.iloc[:0]).to_csv(index=False)
+            else:
+                chunk = await run_blocking(_csv_rows, df.iloc[start:start + chunk_rows])
+            yield chunk
+    except Exception as e:
+        # Headers are already sent, so all we can do is log and stop
+        logger.error(f"CSV stream error: {str(e)}")
+        logger.error(f"CSV stream traceback: {traceback.format_exc()}")
+
+@metrics.stage('render_csv')
+def _csv_rows(df):
+    return display_frame(df).to_csv(index=False, header=False)
+
+async def export_csv(request):
     """Export CSV with comprehensive error handling"""
     try:
-        fetcher = DataFetcher()
-        df, error = fetcher.fetch_data()
+        if wants_stored(request):
+            age = 0
+            df, error_response = await sync_to_async(stored_report)(request, requested_depot(request))
+            if error_response:
+                return error_response
+            # Read per request anyway, so hashing the rows costs little more
+            version = await run_blocking(report_fingerprint, df)
+        else:
+            fetcher, error_response = report_fetcher(request)
+            if error_response:
+                return error_response
+            df, error_response, age, version = await aload_report(fetcher, "CSV export", requested_depot(request))
+        if error_response:
+            return error_response
         
-        if error:
-            logger.error(f"CSV export fetch error: {error}")
-            return HttpResponse(f"Error: {error}", status=500, content_type='text/plain')
-            
-        df, error = fetcher.process_data(df)
-        
-        if error:
-            logger.error(f"CSV export process error: {error}")
-            return HttpResponse(f"Error: {error}", status=404, content_type='text/plain')
-        
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="omc_report.csv"'
-        df.to_csv(response, index=False)
-        return response
+        fingerprint, etag, last_modified = await report_validators(version, 'csv')
+        response = not_modified_response(request, 'csv', etag, last_modified)
+        if response is None:
+            content = artifact_cache.get(fingerprint)
+            if content is not None:
+                metrics.observe_artifact('csv', 'hit')
+                response = HttpResponse(content, content_type='text/csv')
+            elif wants_streaming(request, df):
+                metrics.observe_artifact('csv', 'miss')
+                response = StreamingHttpResponse(iter_csv_chunks(df), content_type='text/csv')
+            else:
+                metrics.observe_artifact('csv', 'miss')
+                content = (await run_blocking(_csv_text, df)).encode('utf-8')
+                artifact_cache.put(fingerprint, content)
+                response = HttpResponse(content, content_type='text/csv')
+            response['Content-Disposition'] = 'attachment; filename="omc_report.csv"'
+        return with_validators(response, etag, last_modified, age)
         
     except Exception as e:
         logger.error(f"CSV export unexpected error: {str(e)}")
         logger.error(f"CSV export traceback: {traceback.format_exc()}")
         return HttpResponse(f"Unexpected error: {str(e)}", status=500, content_type='text/plain')
 
-def generate_pdf_response(request, disposition='inline'):
+@metrics.stage('render_csv')
+def _csv_text(df):
+    return display_frame(df).to_csv(index=False)
+
+async def export_parquet(request):
+    """Export the report as Parquet, for analysts loading it into dataframes"""
+    try:
+        fetcher, error_response = report_fetcher(request)
+        if error_response:
+            return error_response
+        df, error_response, age, version = await aload_report(fetcher, "Parquet export", requested_depot(request))
+        if error_response:
+            return error_response
+
+        fingerprint, etag, last_modified = await report_validators(version, 'parquet')
+        response = not_modified_response(request, 'parquet', etag, last_modified)
+        if response is None:
+            content = artifact_cache.get(fingerprint)
+            if content is not None:
+                metrics.observe_artifact('parquet', 'hit')
+            else:
+                metrics.observe_artifact('parquet', 'miss')
+                content = await run_blocking(_parquet_bytes, df)
+                artifact_cache.put(fingerprint, content)
+            response = HttpResponse(content, content_type='application/vnd.apache.parquet')
+            response['Content-Disposition'] = 'attachment; filename="omc_report.parquet"'
+        return with_validators(response, etag, last_modified, age)
+
+    except Exception as e:
+        logger.error(f"Parquet export unexpected error: {str(e)}")
+        logger.error(f"Parquet export traceback: {traceback.format_exc()}")
+        return HttpResponse(f"Unexpected error: {str(e)}", status=500, content_type='text/plain')
+
+@metrics.stage('render_parquet')
+def _parquet_bytes(df):
+    buffer = BytesIO()
+    df.to_parquet(buffer, index=False)
+    return buffer.getvalue()
+
+async def export_xlsx(request):
+    """Export the report as an Excel workbook with typed, formatted cells and product subtotals
+
+    The workbook is written row by row to a temporary file and streamed
+    from it, so a long report is never held in memory as one document.
+    """
+    try:
+        fetcher, error_response = report_fetcher(request)
+        if error_response:
+            return error_response
+        df, error_response, age, version = await aload_report(fetcher, "XLSX export", requested_depot(request))
+        if error_response:
+            return error_response
+
+        _, etag, last_modified = await report_validators(version, 'xlsx')
+        response = not_modified_response(request, 'xlsx', etag, last_modified)
+        if response is None:
+            workbook, size = await run_blocking(_xlsx_file, df)
+            response = StreamingHttpResponse(iter_file_chunks(workbook), content_type=XLSX_CONTENT_TYPE)
+            response['Content-Length'] = str(size)
+            response['Content-Disposition'] = 'attachment; filename="omc_report.xlsx"'
+        return with_validators(response, etag, last_modified, age)
+
+    except Exception as e:
+        logger.error(f"XLSX export unexpected error: {str(e)}")
+        logger.error(f"XLSX export traceback: {traceback.format_exc()}")
+        return HttpResponse(f"Unexpected error: {str(e)}", status=500, content_type='text/plain')
+
+@metrics.stage('render_xlsx')
+def _xlsx_file(df):
+    """(file, size) of the report written as a workbook to an anonymous temporary file"""
+    workbook = tempfile.TemporaryFile()
+    try:
+        write_report(df, workbook)
+        size = workbook.tell()
+        workbook.seek(0)
+    except Exception:
+        workbook.close()
+        raise
+    return workbook, size
+
+async def iter_file_chunks(file, block_size=FILE_CHUNK_BYTES):
+    """Yield an open file's bytes a block at a time, closing it once done or abandoned"""
+    try:
+        while True:
+            chunk = await run_blocking(file.read, block_size)
+            if not chunk:
+                return
+            yield chunk
+    finally:
+        file.close()
+
+async def generate_pdf_response(request, disposition='inline'):
     """Generate PDF response with comprehensive error handling"""
     try:
-        fetcher = DataFetcher()
         generator = PDFGenerator()
         
-        # Fetch data
-        df, error = fetcher.fetch_data()
-        if error:
-            logger.error(f"PDF generation fetch error: {error}")
-            return HttpResponse(f"Error: {error}", status=500, content_type='text/plain')
-            
-        # Process data
-        df, error = fetcher.process_data(df)
-        if error:
-            logger.error(f"PDF generation process error: {error}")
-            return HttpResponse(f"Error: {error}", status=404, content_type='text/plain')
-        
-        # Generate PDF
-        pdf_content, error = generator.generate(df, "DEPOT: BOST - KUMASI")
-        if error:
-            logger.error(f"PDF generation error: {error}")
-            return HttpResponse(f"Error: {error}", status=500, content_type='text/plain')
+        depot = requested_depot(request)
+
+        if wants_stored(request):
+            age = 0
+            df, error_response = await sync_to_async(stored_report)(request, depot)
+            if error_response:
+                return error_response
+            version = await run_blocking(report_fingerprint, df)
+        else:
+            fetcher, error_response = report_fetcher(request)
+            if error_response:
+                return error_response
+            # Fetch and process data, sharing cached results with other requests
+            prepared, error_response, age = await aload_prepared(fetcher, "PDF generation")
+            if error_response:
+                return error_response
+            df, error_response = await afinalize_report(fetcher, prepared, "PDF generation", depot)
+            if error_response:
+                return error_response
+            version = report_version(prepared, depot)
+            if wants_summary(request):
+                # The summary page counts this report's orders, so they must be stored first
+                await sync_to_async(store_orders)(fetcher, prepared)
+
+        summary, summary_version = None, None
+        if wants_summary(request):
+            # Read from the stored summary, as /api/summary/ is; it changes as other reports are stored
+            summary = await sync_to_async(report_summary)(df, depot)
+            summary_version = await run_blocking(report_fingerprint, summary)
+
+        title = f"DEPOT: BOST - {depot}"
+        fingerprint, etag, last_modified = await report_validators(version, 'pdf', title, summary_version)
+        response = not_modified_response(request, 'pdf', etag, last_modified)
+        if response is not None:
+            return with_validators(response, etag, last_modified, age)
+
+        # Unchanged data is rendered once per worker
+        pdf_content = artifact_cache.get(fingerprint)
+        if pdf_content is not None:
+            metrics.observe_artifact('pdf', 'hit')
+        else:
+            metrics.observe_artifact('pdf', 'miss')
+            # Generate PDF off the event loop
+            pdf_content, error = await run_blocking(generator.generate, df, title, summary)
+            if error:
+                logger.error(f"PDF generation error: {error}")
+                return HttpResponse(f"Error: {error}", status=500, content_type='text/plain')
+            artifact_cache.put(fingerprint, pdf_content)
         
         # Return response
         response = HttpResponse(pdf_content, content_type='application/pdf')
         filename = "omc_report.pdf"
         response['Content-Disposition'] = f'{disposition}; filename="{filename}"'
-        return response
+        return with_validators(response, etag, last_modified, age)
         
     except Exception as e:
         logger.error(f"PDF response unexpected error: {str(e)}")
         logger.error(f"PDF response traceback: {traceback.format_exc()}")
         return HttpResponse(f"Unexpected error: {str(e)}", status=500, content_type='text/plain')
 
-def preview_pdf(request):
+async def preview_pdf(request):
     """Preview PDF with error handling"""
     try:
-        return generate_pdf_response(request, disposition='inline')
+        return await generate_pdf_response(request, disposition='inline')
     except Exception as e:
         logger.error(f"PDF preview error: {str(e)}")
         return HttpResponse(f"PDF preview error: {str(e)}", status=500, content_type='text/plain')
 
-def download_pdf(request):
+async def download_pdf(request):
     """Download PDF with error handling"""
     try:
-        return generate_pdf_response(request, disposition='attachment')
+        return await generate_pdf_response(request, disposition='attachment')
     except Exception as e:
         logger.error(f"PDF download error: {str(e)}")
         return HttpResponse(f"PDF download error: {str(e)}", status=500, content_type='text/plain')
 
+def _job_json(request, job):
+    body = {
+        'id': str(job.id),
+        'status': job.status,
+        'progress': round(job.progress, 2),
+        'message': job.message,
+        'format': job.format,
+        'depot': job.depot,
+        'start': job.start_date.strftime('%d-%m-%Y'),
+        'end': job.end_date.strftime('%d-%m-%Y'),
+        'created_at': job.created_at.isoformat(),
+        'finished_at': job.finished_at and job.finished_at.isoformat(),
+        'status_url': request.build_absolute_uri(reverse('bostapp:report_job', args=[job.id])),
+    }
+    if job.status == ReportJob.DONE:
+        body['download_url'] = request.build_absolute_uri(reverse('bostapp:report_job_download', args=[job.id]))
+    if job.error:
+        body['error'] = job.error
+    return body
+
+@require_POST
+def submit_report_job(request):
+    """Queue a report for manage.py run_report_jobs to render, for ranges too slow to render in a request
+
+    Takes start, end, chunk and depot as the exports do, plus format
+    (pdf, csv, parquet or xlsx), as form fields or JSON. Answers 202 with the
+    new job, or 200 with the job already queued or done for the same
+    parameters. Like any POST it needs the csrftoken cookie, which the home
+    page sets, echoed in an X-CSRFToken header.
+    """
+    try:
+        if request.content_type == 'application/json':
+            try:
+                params = json.loads(request.body or b'{}')
+            except ValueError:
+                return HttpResponse("Error: Invalid JSON body", status=400, content_type='text/plain')
+        else:
+            params = request.POST
+        fmt = params.get('format') or 'pdf'
+        if fmt not in ReportJob.FORMATS:
+            return HttpResponse(f"Error: format must be one of {', '.join(ReportJob.FORMATS)}",
+                                status=400, content_type='text/plain')
+        fetcher, error = fetcher_for(params)
+        if error:
+            return HttpResponse(f"Error: {error}", status=400, content_type='text/plain')
+
+        # The default window is pinned to today's dates, so a job keeps meaning what was asked for
+        job, created = ReportJob.objects.submit(
+            start_date=fetcher.start_date.date(),
+            end_date=fetcher.end_date.date(),
+            depot=normalize_depot(params.get('depot') or '') or DEFAULT_DEPOT,
+            format=fmt,
+            chunk=getattr(fetcher, 'chunk', ''),
+        )
+        response = JsonResponse(_job_json(request, job), status=202 if created else 200)
+        response['Location'] = reverse('bostapp:report_job', args=[job.id])
+        return response
+
+    except Exception as e:
+        logger.error(f"Report job submit error: {str(e)}")
+        logger.error(f"Report job submit traceback: {traceback.format_exc()}")
+        return HttpResponse(f"Unexpected error: {str(e)}", status=500, content_type='text/plain')
+
+def report_job(request, job_id):
+    """Status and progress of a report job"""
+    job = ReportJob.objects.filter(pk=job_id).first()
+    if job is None:
+        return HttpResponse("Error: No such job", status=404, content_type='text/plain')
+    return JsonResponse(_job_json(request, job))
+
+def report_job_download(request, job_id):
+    """The finished file of a report job"""
+    job = ReportJob.objects.filter(pk=job_id).first()
+    if job is None:
+        return HttpResponse("Error: No such job", status=404, content_type='text/plain')
+    if job.status == ReportJob.EXPIRED:
+        return HttpResponse("Error: The report has expired; submit the job again",
+                            status=410, content_type='text/plain')
+    if job.status != ReportJob.DONE:
+        return HttpResponse(f"Error: The job is {job.status}", status=409, content_type='text/plain')
+    try:
+        artifact = open(job.artifact, 'rb')
+    except FileNotFoundError:
+        return HttpResponse("Error: The report has expired; submit the job again",
+                            status=410, content_type='text/plain')
+    return FileResponse(artifact, as_attachment=True, filename=f"omc_report.{job.extension}",
+                        content_type=job.content_type)
+
+def metrics_view(request):
+    """Prometheus metrics, summed over every gunicorn worker"""
+    try:
+        body, content_type = metrics.render()
+        return HttpResponse(body, content_type=content_type)
+    except Exception as e:
+        logger.error(f"Metrics error: {str(e)}")
+        return HttpResponse(f"Metrics error: {str(e)}", status=500, content_type='text/plain')
+
 def health_check(request):
-    """Health check endpoint for debugging"""
+    """Health check endpoint for debugging, with NPA breaker state and report staleness"""
     try:
+        age = report_cache.age(DataFetcher().last_good_key())
         return JsonResponse({
-            'status': 'ok',
+            'status': 'ok' if npa_breaker.state == CircuitBreaker.CLOSED else 'degraded',
             'timestamp': datetime.datetime.now().isoformat(),
-            'message': 'Application is running'
+            'message': 'Application is running',
+            'upstream': npa_breaker.status(),
+            'report': {
+                'age_seconds': None if age is None else round(age),
+                'stale': age is None or age > report_cache.ttl,
+            },
         })
     except Exception as e:
         logger.error(f"Health check error: {str(e)}")
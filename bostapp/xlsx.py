@@ -0,0 +1,127 @@
+"""Excel rendering of a processed report, written row by row
+
+write_report() uses openpyxl's write-only workbook, which serializes each
+appended row to a temporary file straight away, so memory stays flat
+however long the report is. Dates, volumes and prices are written as
+typed cells with number formats rather than text, the header row is
+frozen, and a second sheet holds volume and order subtotals per product.
+"""
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+from openpyxl.utils import get_column_letter
+import pandas as pd
+
+from .schema import AUXILIARY_COLUMNS, HEADING, TEXT_COLUMNS
+from .summary import rollup, summarize
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+# Excel number formats of the typed columns
+NUMBER_FORMATS = {
+    'ORDER DATE': 'yyyy-mm-dd',
+    'VOLUME': '#,##0',
+    'EX REF PRICE': '#,##0.0000',
+    'ORDERS': '#,##0',
+}
+COLUMN_WIDTHS = {
+    'ORDER DATE': 14,
+    'ORDER NUMBER': 18,
+    'PRODUCTS': 24,
+    'VOLUME': 12,
+    'EX REF PRICE': 14,
+    'BRV NUMBER': 14,
+    'BDC': 36,
+    'ORDERS': 10,
+}
+CHUNK_ROWS = 1000
+
+
+def write_report(df, target, chunk_rows=CHUNK_ROWS):
+    """Write a typed report as an Excel workbook to target, a path or a binary file"""
+    workbook = Workbook(write_only=True)
+    columns = [column for column in df.columns if column not in AUXILIARY_COLUMNS]
+    sheet = _add_sheet(workbook, 'Report', columns)
+    # One styled cell per formatted column, refilled for every row: the
+    # write-only sheet serializes a row as soon as it is appended
+    styled = {column: _number_cell(sheet, fmt) for column, fmt in NUMBER_FORMATS.items() if column in columns}
+    for start in range(0, len(df), chunk_rows):
+        values = _column_values(df.iloc[start:start + chunk_rows], columns)
+        for row in zip(*values):
+            sheet.append([_fill(styled.get(column), value) for column, value in zip(columns, row)])
+
+    if 'PRODUCTS' in df.columns:
+        _write_product_totals(workbook, rollup(summarize(df), ['PRODUCTS']))
+    workbook.save(target)
+
+
+def _add_sheet(workbook, title, columns):
+    """A write-only sheet with sized columns and a bold, frozen header row"""
+    sheet = workbook.create_sheet(title)
+    for index, column in enumerate(columns, 1):
+        sheet.column_dimensions[get_column_letter(index)].width = COLUMN_WIDTHS.get(column, 14)
+    # Sheet properties must be set before the first row is written
+    sheet.freeze_panes = 'A2'
+    header = []
+    for column in columns:
+        cell = WriteOnlyCell(sheet, value=column)
+        cell.font = Font(bold=True)
+        header.append(cell)
+    sheet.append(header)
+    return sheet
+
+
+def _number_cell(sheet, fmt):
+    cell = WriteOnlyCell(sheet)
+    cell.number_format = fmt
+    return cell
+
+
+def _fill(cell, value):
+    if cell is None or value is None:
+        return value
+    cell.value = value
+    return cell
+
+
+def _column_values(df, columns):
+    """Python values of each column, None for blanks, with headings back in ORDER DATE
+
+    Cells that did not parse ('TBD' in VOLUME) are written as their text.
+    """
+    values = []
+    for column in columns:
+        series = df[column].astype(object)
+        if column == 'ORDER DATE' and HEADING in df.columns:
+            series = series.where(df[column].notna(), df[HEADING].astype(object))
+        if TEXT_COLUMNS.get(column) in df.columns:
+            series = series.where(series.notna(), df[TEXT_COLUMNS[column]].astype(object))
+        values.append(series.where(series.notna(), None).tolist())
+    return values
+
+
+def _write_product_totals(workbook, totals):
+    """Subtotal sheet: VOLUME and ORDERS per product, then the grand total"""
+    columns = ['PRODUCTS', 'VOLUME', 'ORDERS']
+    sheet = _add_sheet(workbook, 'Product totals', columns)
+    for product, volume, orders in totals[columns].itertuples(index=False, name=None):
+        sheet.append([
+            None if pd.isna(product) else product,
+            _valued(sheet, 'VOLUME', volume),
+            _valued(sheet, 'ORDERS', orders),
+        ])
+    total = WriteOnlyCell(sheet, value='TOTAL')
+    total.font = Font(bold=True)
+    sheet.append([
+        total,
+        _valued(sheet, 'VOLUME', totals['VOLUME'].sum(), bold=True),
+        _valued(sheet, 'ORDERS', totals['ORDERS'].sum(), bold=True),
+    ])
+
+
+def _valued(sheet, column, value, bold=False):
+    cell = _number_cell(sheet, NUMBER_FORMATS[column])
+    # numpy scalars from the summary frame; openpyxl writes plain numbers
+    cell.value = value.item() if hasattr(value, 'item') else value
+    if bold:
+        cell.font = Font(bold=True)
+    return cell
@@ -36,6 +36,7 @@ INSTALLED_APPS = DJANGO_APPS + LOCAL_APPS
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'bostapp.middleware.ServerTimingMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -72,6 +73,34 @@ DATABASES = {
     )
 }
 
+# Cache
+# File-based by default so every gunicorn worker on the host shares one cache. FileBasedCache
+# add() is a check then a write, not atomic, so the cross-worker report and change-feed locks
+# built on it are best-effort: two workers can occasionally both take one. Use Redis or
+# memcached where that matters.
+# 'default' holds the reports, their last good copies and locks: a handful of keys per date
+# window. Past MAX_ENTRIES a set deletes 1/CULL_FREQUENCY of the files at random, reports
+# included, so the limit is kept well above what the windows in use need.
+# 'meta' holds the many small keys (first-seen times of report fingerprints, kept a week, and
+# the change feeds) so that they never push reports out of 'default'.
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': config('CACHE_LOCATION', default=str(BASE_DIR / '.cache')),
+        'OPTIONS': {
+            'MAX_ENTRIES': config('CACHE_MAX_ENTRIES', default=1000, cast=int),
+            'CULL_FREQUENCY': config('CACHE_CULL_FREQUENCY', default=4, cast=int),
+        },
+    },
+    'meta': {
+        'BACKEND': config('META_CACHE_BACKEND', default='django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': config('META_CACHE_LOCATION', default=str(BASE_DIR / '.cache' / 'meta')),
+        'OPTIONS': {
+            'MAX_ENTRIES': config('META_CACHE_MAX_ENTRIES', default=5000, cast=int),
+        },
+    },
+}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -161,4 +190,62 @@ LOGGING = {
 }
 
 # Request timeout settings
-REQUEST_TIMEOUT = 30
\ No newline at end of file
+REQUEST_TIMEOUT = 30
+
+# NPA daily order report export; point it at manage.py fake_npa for load tests
+NPA_EXPORT_URL = config(
+    'NPA_EXPORT_URL', default='https://iml.npa-enterprise.com/NPAAPILIVE/Home/ExportDailyOrderReport')
+
+# Seconds a processed NPA report is reused before it is fetched again
+REPORT_CACHE_TTL = config('REPORT_CACHE_TTL', default=300, cast=int)
+# How long the last good report is kept to serve, marked with its age, when NPA is slow or down
+REPORT_STALE_TTL = config('REPORT_STALE_TTL', default=24 * 3600, cast=int)
+# CSV exports above this many rows are streamed in chunks instead of buffered
+CSV_STREAM_THRESHOLD_ROWS = config('CSV_STREAM_THRESHOLD_ROWS', default=5000, cast=int)
+CSV_STREAM_CHUNK_ROWS = config('CSV_STREAM_CHUNK_ROWS', default=1000, cast=int)
+# Orders per page of /api/orders/, by default and at most
+ORDERS_API_PAGE_SIZE = config('ORDERS_API_PAGE_SIZE', default=100, cast=int)
+ORDERS_API_MAX_PAGE_SIZE = config('ORDERS_API_MAX_PAGE_SIZE', default=5000, cast=int)
+# Change feed (/api/changes/): events kept per depot, and how often a server-sent
+# event stream checks for new ones and how long it stays open before the browser reconnects
+CHANGE_FEED_EVENTS = config('CHANGE_FEED_EVENTS', default=50, cast=int)
+CHANGE_FEED_POLL_SECONDS = config('CHANGE_FEED_POLL_SECONDS', default=5.0, cast=float)
+CHANGE_FEED_STREAM_SECONDS = config('CHANGE_FEED_STREAM_SECONDS', default=300, cast=int)
+# Orders API indexes kept per worker, one per depot of each report (bostapp.order_index)
+ORDER_INDEX_CACHE_ENTRIES = config('ORDER_INDEX_CACHE_ENTRIES', default=32, cast=int)
+# Rendered PDF/CSV bytes kept per worker, keyed by report fingerprint
+ARTIFACT_CACHE_MAX_BYTES = config('ARTIFACT_CACHE_MAX_BYTES', default=64 * 1024 * 1024, cast=int)
+# Raw downloads with their parsed frames and prepared reports, saved once per distinct
+# download (bostapp.snapshots) and pruned by the prefetch_reports worker;
+# an empty REPORT_SNAPSHOT_DIR turns snapshots off
+REPORT_SNAPSHOT_DIR = config('REPORT_SNAPSHOT_DIR', default=str(BASE_DIR / '.cache' / 'snapshots'))
+REPORT_SNAPSHOT_RETENTION_DAYS = config('REPORT_SNAPSHOT_RETENTION_DAYS', default=7, cast=int)
+REPORT_SNAPSHOT_MAX_BYTES = config('REPORT_SNAPSHOT_MAX_BYTES', default=1024 * 1024 * 1024, cast=int)
+# 'streaming' parses the export with bostapp.ingest; 'pandas' falls back to pd.read_excel
+REPORT_EXCEL_READER = config('REPORT_EXCEL_READER', default='streaming')
+
+# Background report jobs (manage.py run_report_jobs): pool processes, queue polling,
+# where finished files go, how long they are kept and reused, and when a running job is given up on
+REPORT_JOB_WORKERS = config('REPORT_JOB_WORKERS', default=2, cast=int)
+REPORT_JOB_POLL_SECONDS = config('REPORT_JOB_POLL_SECONDS', default=2.0, cast=float)
+REPORT_JOB_DIR = config('REPORT_JOB_DIR', default=str(BASE_DIR / '.cache' / 'jobs'))
+REPORT_JOB_RESULT_TTL = config('REPORT_JOB_RESULT_TTL', default=3600, cast=int)
+REPORT_JOB_TIMEOUT = config('REPORT_JOB_TIMEOUT', default=1800, cast=int)
+
+# NPA circuit breaker: failures in a row that open it, and seconds before a trial call
+UPSTREAM_FAILURE_THRESHOLD = config('UPSTREAM_FAILURE_THRESHOLD', default=3, cast=int)
+UPSTREAM_RESET_TIMEOUT = config('UPSTREAM_RESET_TIMEOUT', default=60, cast=int)
+# Upstream connection pool and the thread pool for Excel parsing / PDF rendering
+UPSTREAM_POOL_SIZE = config('UPSTREAM_POOL_SIZE', default=10, cast=int)
+BLOCKING_POOL_SIZE = config('BLOCKING_POOL_SIZE', default=4, cast=int)
+
+# Background prefetch worker (manage.py prefetch_reports)
+PREFETCH_INTERVAL = config('PREFETCH_INTERVAL', default=240, cast=int)
+PREFETCH_JITTER = config('PREFETCH_JITTER', default=0.1, cast=float)
+PREFETCH_MAX_BACKOFF = config('PREFETCH_MAX_BACKOFF', default=1800, cast=int)
+
+# Date-range reports: longest window the views accept, and chunk fetching
+REPORT_MAX_RANGE_DAYS = config('REPORT_MAX_RANGE_DAYS', default=31, cast=int)
+BACKFILL_WORKERS = config('BACKFILL_WORKERS', default=4, cast=int)
+BACKFILL_RETRIES = config('BACKFILL_RETRIES', default=2, cast=int)
+BACKFILL_RETRY_DELAY = config('BACKFILL_RETRY_DELAY', default=2.0, cast=float)
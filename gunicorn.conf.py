@@ -0,0 +1,53 @@
+"""Gunicorn settings for the web process
+
+The app is loaded once in the master and the workers are forked from it,
+so the pandas/numpy pipeline is imported once and its pages are shared
+copy-on-write instead of every worker importing its own copy at boot.
+"""
+import gc
+import os
+import shutil
+
+# Imported under another name: gunicorn would read `config` as its own setting
+from decouple import config as env
+
+# Workers write their metrics here so /metrics/ can add them up across the pool
+metrics_dir = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/bost-metrics')
+# A preloaded app registers its metrics as it loads, which happens before on_starting
+os.makedirs(metrics_dir, exist_ok=True)
+
+worker_class = 'uvicorn.workers.UvicornWorker'
+# Each uvicorn worker is one event loop; gunicorn's threads setting does not apply to it.
+# Blocking work (Excel parsing, PDF rendering) runs in BLOCKING_POOL_SIZE threads per worker instead
+workers = env('WEB_CONCURRENCY', default=2, cast=int)
+preload_app = env('GUNICORN_PRELOAD', default=True, cast=bool)
+# Recycle workers now and then so fragmentation from large frames does not build up;
+# the jitter keeps them from all restarting at once
+max_requests = env('GUNICORN_MAX_REQUESTS', default=1000, cast=int)
+max_requests_jitter = env('GUNICORN_MAX_REQUESTS_JITTER', default=100, cast=int)
+timeout = env('GUNICORN_TIMEOUT', default=60, cast=int)
+
+
+def on_starting(server):
+    # Samples left over from a previous run would be counted again
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+
+
+def when_ready(server):
+    if not server.cfg.preload_app:
+        return
+    # Django imports the URLconf, and the views with it, on the first request, and
+    # fpdf on the first PDF; load them here so the workers share them from the start.
+    # pandas, numpy and pyarrow come in with the models at setup, preloaded or not.
+    from django.urls import get_resolver
+    import fpdf  # noqa: F401
+
+    get_resolver().url_patterns
+    # Keep the collector from writing to the shared objects and unsharing their pages
+    gc.freeze()
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)